@@ -0,0 +1,280 @@
+"""
+Running many programs, or one program with many inputs, in parallel.
+
+A manifest (JSON) lists the jobs, each a program (see loader.py) or a save
+state plus memory patches and a stop condition:
+
+    {
+        "Defaults": {"Image": "example3/main.bin", "MaxCycles": 10000000},
+        "Jobs": [
+            {"Name": "plain"},
+            {"Name": "patched", "Patches": {"$10": 5, "0x4000": "DEADBEEF"}},
+            {"Name": "tables", "Load": ["tables.bin@0x4000"]},
+            {"Name": "sweep", "Sweep": {"$10": [1, 2, 3], "$11": [0, 255]}}
+        ]
+    }
+
+Job fields (Defaults apply to every job, a list of jobs alone is fine too):
+    Name            label in the results
+    Image           program file, Address its load address, Load more
+                    "file@address" pieces, Reset the reset vector
+    Snapshot        save state to start from instead (see snapshot.py)
+    Patches         address -> byte, hex string or list of bytes, stored
+                    after loading
+    Sweep           address -> list of bytes, one job per combination
+    MaxInstructions, MaxCycles, TimeLimit
+                    stop conditions besides the halt (0xFE == 127), and a
+                    spin loop without instruction or cycle limit, nothing else
+                    can write the memory it waits for. A job without any of
+                    them gets TIME_LIMIT seconds (--time-limit) so a program
+                    that never halts can't block its worker, it is reported
+                    as TimedOut
+    Engine, Memory  CPU engine and memory backend
+Paths are relative to the manifest.
+
+The jobs are fanned out over a ProcessPoolExecutor with a worker per core.
+The workers are reused across jobs and keep the generated interpreters and
+the AOT modules of the jobs before. Every result (printer output, registers,
+SHA-256 of the framebuffer, instructions, cycles) is written as a JSON line
+or CSV row as soon as its job finishes.
+
+    python batch.py manifest.json --output results.jsonl
+    python batch.py manifest.json --output results.csv --workers 8
+"""
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import sys
+import time
+
+from bus import bus
+from engines import create
+from framebuffer import HEIGHT, START, WIDTH
+from headless import BATCH
+from loader import boot, number
+from memory import memory
+from printer import printer
+
+# seconds a job without any stop condition runs at most
+TIME_LIMIT = 60.0
+
+# columns of the CSV output
+COLUMNS = (
+    "Index",
+    "Name",
+    "Halted",
+    "Spinning",
+    "TimedOut",
+    "Instructions",
+    "Cycles",
+    "Seconds",
+    "PC",
+    "A",
+    "X",
+    "Y",
+    "SP",
+    "P",
+    "Framebuffer",
+    "Output",
+    "Error",
+)
+
+
+def _bytes(Value) -> bytes:
+    """
+    The bytes of a patch: a byte, a hex string or a list of bytes.
+    """
+    if isinstance(Value, int):
+        return bytes([Value & 0xFF])
+    if isinstance(Value, str):
+        return bytes.fromhex(Value)
+    return bytes(Value)
+
+
+def jobs(Manifest, Directory: str = "", TimeLimit: float = TIME_LIMIT) -> list:
+    """
+    The jobs of a manifest with the defaults applied, the sweeps expanded
+    and the paths made absolute.
+
+    Args:
+        Manifest: The parsed manifest, a dict with Defaults and Jobs or a list
+            of jobs.
+        Directory (str): Where relative paths start.
+        TimeLimit (float): TimeLimit of jobs without any stop condition.
+
+    Returns:
+        list: Job dicts.
+    """
+    if isinstance(Manifest, list):
+        Manifest = {"Jobs": Manifest}
+    Defaults = Manifest.get("Defaults", {})
+    Jobs = []
+    for i, Entry in enumerate(Manifest["Jobs"]):
+        Job = {**Defaults, **Entry}
+        Job.setdefault("Name", f"job{i}")
+        if all(Job.get(Key) is None for Key in ("MaxInstructions", "MaxCycles", "TimeLimit")):
+            Job["TimeLimit"] = TimeLimit
+        for Key in ("Image", "Snapshot"):
+            if Job.get(Key):
+                Job[Key] = os.path.join(Directory, Job[Key])
+        Job["Load"] = [os.path.join(Directory, Load) for Load in Job.get("Load", [])]
+        Sweep = Job.pop("Sweep", None)
+        if not Sweep:
+            Jobs.append(Job)
+            continue
+        for Values in itertools.product(*Sweep.values()):
+            Variant = dict(Job, Patches={**Job.get("Patches", {}), **dict(zip(Sweep, Values))})
+            Variant["Name"] = Job["Name"] + "[" + ",".join(f"{Address}={Value}" for Address, Value in zip(Sweep, Values)) + "]"
+            Jobs.append(Variant)
+    return Jobs
+
+
+def run(Job: dict) -> dict:
+    """
+    Run one job, in a worker process.
+
+    Args:
+        Job (dict): See the module docstring.
+
+    Returns:
+        dict: Name, Halted, Spinning (stopped in a spin loop), TimedOut
+            (stopped by TimeLimit), Instructions,
+            Cycles, Seconds, the registers (PC, A, X, Y, SP, P), Framebuffer
+            (SHA-256 of 0x200 - 0x5FF), Output (printer text) and Error
+            (None, or the exception that ended the job).
+    """
+    Result = {"Name": Job["Name"], "Error": None}
+    Memory = memory(Job.get("Memory", "bytearray"))
+    try:
+        State = None
+        if Job.get("Snapshot"):
+            import snapshot
+
+            State = snapshot.load(Job["Snapshot"], Memory)
+        else:
+            Images = [(Job["Image"], None if Job.get("Address") is None else number(str(Job["Address"])))]
+            for Load in Job["Load"]:
+                Path, _, Address = Load.partition("@")
+                Images.append((Path, number(Address) if Address else None))
+            boot(Memory, Images, None if Job.get("Reset") is None else number(str(Job["Reset"])))
+        for Address, Value in Job.get("Patches", {}).items():
+            Data = _bytes(Value)
+            Address = number(str(Address))
+            Memory[Address : Address + len(Data)] = Data
+        Bus = bus(Memory)
+        Output = io.StringIO()
+        Printer = printer(Bus, Buffered=True, Output=Output)
+        Cpu = create(Job.get("Engine", "table"), Bus)
+        if State is not None:
+            snapshot.restore(Cpu, State)
+        Result.update(_execute(Cpu, Job))
+        Printer.flush()
+        Result["Output"] = Output.getvalue()
+        Result.update({Name: getattr(Cpu, Name) for Name in ("PC", "A", "X", "Y", "SP", "P")})
+        Result["Framebuffer"] = hashlib.sha256(bytes(Memory[START : START + WIDTH * HEIGHT])).hexdigest()
+    except Exception as Error:
+        Result["Error"] = f"{type(Error).__name__}: {Error}"
+    finally:
+        Memory.close()
+    return Result
+
+
+def _execute(Cpu, Job: dict) -> dict:
+    """
+    Run a CPU until the program halts, spins without a limit to reach or a
+    limit is reached.
+    """
+    MaxInstructions, MaxCycles, TimeLimit = Job.get("MaxInstructions"), Job.get("MaxCycles"), Job.get("TimeLimit")
+    M = Cpu.Memory
+    Instructions = Cycles = 0
+    TimedOut = False
+    Start = time.perf_counter()
+    while M[0xFE] != 127:
+        Budget = BATCH if MaxInstructions is None else min(BATCH, MaxInstructions - Instructions)
+        CycleBudget = None if MaxCycles is None else MaxCycles - Cycles
+        if Budget <= 0 or (CycleBudget is not None and CycleBudget <= 0):
+            break
+        n, c = Cpu.run(MaxInstructions=Budget, MaxCycles=CycleBudget)
+        Instructions += n
+        Cycles += c
+        if not n or (Cpu.Spin is not None and MaxInstructions is None and MaxCycles is None):
+            break
+        if TimeLimit is not None and time.perf_counter() - Start >= TimeLimit:
+            TimedOut = M[0xFE] != 127
+            break
+    return {
+        "Halted": M[0xFE] == 127,
+        "Spinning": Cpu.Spin is not None,
+        "TimedOut": TimedOut,
+        "Instructions": Instructions,
+        "Cycles": Cycles,
+        "Seconds": time.perf_counter() - Start,
+    }
+
+
+def workers() -> int:
+    """
+    The cores this process may run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def runAll(Jobs: list, Workers: int = None):
+    """
+    Run jobs on a pool of worker processes.
+
+    Args:
+        Jobs (list): Job dicts (see jobs()).
+        Workers (int): Worker processes, one per core if None.
+
+    Yields:
+        dict: The result of every job (see run()) plus its Index in Jobs, in
+            the order the jobs finish.
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=Workers or workers()) as Pool:
+        Futures = {Pool.submit(run, Job): i for i, Job in enumerate(Jobs)}
+        for Future in concurrent.futures.as_completed(Futures):
+            yield {"Index": Futures[Future], **Future.result()}
+
+
+def _main():
+    Parser = argparse.ArgumentParser(description="Run the jobs of a manifest in parallel.")
+    Parser.add_argument("manifest", help="JSON manifest of the jobs")
+    Parser.add_argument("--output", help="results file, .csv for CSV, JSON lines otherwise (stdout if not given)")
+    Parser.add_argument("--format", choices=("json", "csv"), help="output format, by the extension of --output by default")
+    Parser.add_argument("--workers", type=int, help="worker processes, one per core by default")
+    Parser.add_argument("--time-limit", type=float, default=TIME_LIMIT, help=f"seconds for jobs without MaxInstructions, MaxCycles or TimeLimit ({TIME_LIMIT:g} by default)")
+    Args = Parser.parse_args()
+    with open(Args.manifest) as f:
+        Jobs = jobs(json.load(f), os.path.dirname(os.path.abspath(Args.manifest)), Args.time_limit)
+    Format = Args.format or ("csv" if Args.output and Args.output.endswith(".csv") else "json")
+    Output = open(Args.output, "w", newline="") if Args.output else sys.stdout
+    Writer = None
+    if Format == "csv":
+        Writer = csv.DictWriter(Output, COLUMNS, extrasaction="ignore")
+        Writer.writeheader()
+    Start = time.perf_counter()
+    Failed = TimedOut = 0
+    for Result in runAll(Jobs, Args.workers):
+        Failed += Result["Error"] is not None
+        TimedOut += bool(Result.get("TimedOut"))
+        if Writer is not None:
+            Writer.writerow(Result)
+        else:
+            Output.write(json.dumps(Result) + "\n")
+        Output.flush()
+    if Output is not sys.stdout:
+        Output.close()
+    print(f"{len(Jobs)} jobs, {Failed} failed, {TimedOut} timed out in {time.perf_counter() - Start:.2f} s", file=sys.stderr)
+    sys.exit(1 if Failed else 0)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,299 @@
+"""
+Benchmark suite of the CPU engines and memory backends.
+
+Every workload is a 64 KiB image run headless for a fixed instruction budget:
+the example binaries with the printer writing into a string (no window, no
+timing of their own) and synthetic kernels stressing one part of the engines
+each. They are run on every engine (plus the reference step() loop) and memory
+backend, best of a few repeats, and the instructions and cycles per second of
+the wall clock and the host CPU time are reported and written as JSON.
+
+Spin loop detection is off, so every instruction counted is executed.
+
+    python benchmark.py --output new.json
+    python benchmark.py --output new.json --compare old.json --threshold 0.05
+    python benchmark.py --results new.json --compare old.json
+
+--compare lists the change of MIPS against an earlier result file and exits
+with status 1 if any workload got slower by more than the threshold.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from bus import bus
+from engines import ENGINES, create
+from memory import BACKENDS, memory
+from printer import printer
+
+# engines measured, "step" is a loop of the reference cpu6502.step()
+BENCHMARK_ENGINES = ("step",) + ENGINES
+# instructions per step() loop between two halt checks
+_STEPS = 1000
+# where the kernels are assembled, the reset vector points there
+_ORIGIN = 0x200
+
+# name -> machine code of the synthetic kernels, all of them loop forever
+KERNELS = {
+    # arithmetic and logic on the zeropage:
+    #   loop: CLC / LDA $10 / ADC #$37 / STA $10 / EOR $11 / ROL A / STA $11 / AND #$F0
+    #         ORA $12 / LSR A / SBC #$05 / STA $12 / INX / JMP loop
+    "alu": "18 A510 6937 8510 4511 2A 8511 29F0 0512 4A E905 8512 E8 4C0002",
+    # data dependent branches:
+    #   loop: LDX #0 / next: TXA / AND #3 / BEQ skip / INY / BNE cont / skip: DEY
+    #   cont: CPX #$80 / BCC low / INC $20 / low: INX / BNE next / JMP loop
+    "branch": "A200 8A 2903 F003 C8 D001 88 E080 9002 E620 E8 D0EE 4C0002",
+    # two pages copied with absolute,X:
+    #   loop: LDX #0 / next: LDA $1000,X / STA $2000,X / LDA $1100,X / STA $2100,X
+    #         INX / BNE next / JMP loop
+    "copy": "A200 BD0010 9D0020 BD0011 9D0021 E8 D0F1 4C0002",
+    # 4 KiB transformed through zeropage pointers:
+    #   init: LDA #0 / STA $F0 / STA $F2 / LDA #$10 / STA $F1 / LDA #$30 / STA $F3 / LDY #0
+    #   next: LDA ($F0),Y / EOR #$5A / STA ($F2),Y / INY / BNE next
+    #         INC $F1 / INC $F3 / LDA $F3 / CMP #$40 / BNE next / JMP init
+    "indirect": "A900 85F0 85F2 A910 85F1 A930 85F3 A000 B1F0 495A 91F2 C8 D0F7 E6F1 E6F3 A5F3 C940 D0ED 4C0002",
+    # pushes, pulls and nested subroutine calls:
+    #   loop: LDA #$11 / PHA / TXA / PHA / JSR sub / PLA / TAX / PLA / PHP / PLP / JMP loop
+    #   sub:  INX / PHA / JSR leaf / PLA / RTS
+    #   leaf: INY / RTS
+    "stack": "A911 48 8A 48 201002 68 AA 68 08 28 4C0002 E8 48 201702 68 60 C8 60",
+    # decimal mode counters (the engines add in binary, D is only kept):
+    #   loop: SED / CLC / LDA $30 / ADC #1 / STA $30 / LDA $31 / ADC #0 / STA $31
+    #         SEC / LDA $32 / SBC #7 / STA $32 / CLD / JMP loop
+    "bcd": "F8 18 A530 6901 8530 A531 6900 8531 38 A532 E907 8532 D8 4C0002",
+}
+
+# the example programs, run with the printer output discarded
+EXAMPLES = ("example1", "example2", "example3")
+
+WORKLOADS = EXAMPLES + tuple(KERNELS)
+
+
+def image(Workload: str) -> bytes:
+    """
+    The memory image of a workload.
+
+    Args:
+        Workload (str): One of WORKLOADS.
+
+    Returns:
+        bytes: 64 KiB image.
+    """
+    if Workload in EXAMPLES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), Workload, "main.bin"), "rb") as f:
+            return f.read()
+    Image = bytearray(0x10000)
+    Code = bytes.fromhex(KERNELS[Workload])
+    Image[_ORIGIN : _ORIGIN + len(Code)] = Code
+    # source data of the copy kernels
+    Image[0x1000:0x2000] = bytes(range(256)) * 16
+    Image[0xFFFC] = _ORIGIN & 0xFF
+    Image[0xFFFD] = _ORIGIN >> 8
+    return bytes(Image)
+
+
+def measure(Workload: str, Engine: str, Backend: str, Instructions: int, CacheDirectory: str = None) -> dict:
+    """
+    Run one workload once.
+
+    Args:
+        Workload (str): One of WORKLOADS.
+        Engine (str): One of BENCHMARK_ENGINES.
+        Backend (str): One of memory.BACKENDS.
+        Instructions (int): Instructions to run (fewer if the program halts,
+            the JIT engines may overshoot to the end of a block).
+        CacheDirectory (str): Module cache of the AOT engine.
+
+    Returns:
+        dict: Instructions, Cycles, Seconds (wall clock) and CpuSeconds (host
+            process time) of the run.
+    """
+    Memory = memory(Backend)
+    try:
+        Memory.load(image(Workload))
+        Bus = bus(Memory)
+        if Workload in EXAMPLES:
+            printer(Bus, Output=io.StringIO())
+        if Engine == "step":
+            from cpu6502 import cpu6502
+
+            Cpu = cpu6502(Bus)
+        elif Engine == "aot":
+            from cpu6502aot import cpu6502aot
+
+            Cpu = cpu6502aot(Bus, CacheDirectory=CacheDirectory)
+        else:
+            Cpu = create(Engine, Bus)
+        Cpu.SpinDetection = False
+        M = Cpu.Memory
+        n = c = 0
+        Start, CpuStart = time.perf_counter(), time.process_time()
+        if Engine == "step":
+            while n < Instructions and M[0xFE] != 127:
+                for _ in range(min(_STEPS, Instructions - n)):
+                    Cpu.step()
+                    c += Cpu.Cycles
+                    n += 1
+        else:
+            while n < Instructions and M[0xFE] != 127:
+                i, k = Cpu.run(MaxInstructions=Instructions - n)
+                n += i
+                c += k
+                if not i:
+                    break
+        return {
+            "Instructions": n,
+            "Cycles": c,
+            "Seconds": time.perf_counter() - Start,
+            "CpuSeconds": time.process_time() - CpuStart,
+        }
+    finally:
+        Memory.close()
+
+
+def benchmark(
+    Workloads=WORKLOADS,
+    Engines=BENCHMARK_ENGINES,
+    Backends=BACKENDS,
+    Instructions: int = 200000,
+    Repeat: int = 3,
+    Progress=None,
+) -> dict:
+    """
+    Run every workload on every engine and memory backend.
+
+    Args:
+        Workloads: Names of the workloads.
+        Engines: Names of the engines.
+        Backends: Names of the memory backends, unavailable ones are skipped.
+        Instructions (int): Instruction budget of a run.
+        Repeat (int): Runs per combination, the fastest counts.
+        Progress: Text stream the rows are printed to as they finish, None
+            for silence.
+
+    Returns:
+        dict: The host (Python, Platform), the settings and Results, one dict
+            per combination (Workload, Engine, Memory, Instructions, Cycles,
+            Seconds, CpuSeconds, MIPS, MHz and the Seconds of every Run).
+    """
+    Results = []
+    Available = []
+    for Backend in Backends:
+        try:
+            memory(Backend).close()
+            Available.append(Backend)
+        except ImportError:
+            if Progress is not None:
+                print(f"memory backend {Backend} not available", file=Progress)
+    if Progress is not None:
+        print(_header(), file=Progress)
+    with tempfile.TemporaryDirectory() as CacheDirectory:
+        for Workload in Workloads:
+            for Engine in Engines:
+                for Backend in Available:
+                    Runs = [measure(Workload, Engine, Backend, Instructions, CacheDirectory) for _ in range(Repeat)]
+                    Best = min(Runs, key=lambda Run: Run["Seconds"])
+                    Seconds = Best["Seconds"] or 1e-9
+                    Result = {
+                        "Workload": Workload,
+                        "Engine": Engine,
+                        "Memory": Backend,
+                        **Best,
+                        "MIPS": Best["Instructions"] / Seconds / 1e6,
+                        "MHz": Best["Cycles"] / Seconds / 1e6,
+                        "Runs": [Run["Seconds"] for Run in Runs],
+                    }
+                    Results.append(Result)
+                    if Progress is not None:
+                        print(_row(Result), file=Progress, flush=True)
+    return {
+        "Python": platform.python_version(),
+        "Implementation": platform.python_implementation(),
+        "Platform": platform.platform(),
+        "Instructions": Instructions,
+        "Repeat": Repeat,
+        "Results": Results,
+    }
+
+
+def _header() -> str:
+    return f"{'workload':10} {'engine':6} {'memory':10} {'instructions':>12} {'MIPS':>8} {'MHz':>8} {'CPU s':>8}"
+
+
+def _row(Result: dict) -> str:
+    return (
+        f"{Result['Workload']:10} {Result['Engine']:6} {Result['Memory']:10} {Result['Instructions']:12}"
+        f" {Result['MIPS']:8.3f} {Result['MHz']:8.3f} {Result['CpuSeconds']:8.3f}"
+    )
+
+
+def compare(Old: dict, New: dict, Threshold: float = 0.05) -> tuple:
+    """
+    Compare the MIPS of two benchmark results.
+
+    Args:
+        Old (dict): The baseline, as returned by benchmark() (or loaded from
+            its JSON).
+        New (dict): The result to check.
+        Threshold (float): Relative slowdown that counts as a regression.
+
+    Returns:
+        tuple: (report (str), regressions (list of (workload, engine, memory)
+            that got slower by more than the threshold)).
+    """
+    Baseline = {(Row["Workload"], Row["Engine"], Row["Memory"]): Row for Row in Old["Results"]}
+    Lines = [f"{'workload':10} {'engine':6} {'memory':10} {'old MIPS':>9} {'new MIPS':>9} {'change':>8}"]
+    Regressions = []
+    for Row in New["Results"]:
+        Key = (Row["Workload"], Row["Engine"], Row["Memory"])
+        if Key not in Baseline:
+            continue
+        Before = Baseline[Key]["MIPS"]
+        Change = Row["MIPS"] / Before - 1 if Before else 0.0
+        Flag = ""
+        if Change < -Threshold:
+            Flag = "  REGRESSION"
+            Regressions.append(Key)
+        elif Change > Threshold:
+            Flag = "  faster"
+        Lines.append(f"{Key[0]:10} {Key[1]:6} {Key[2]:10} {Before:9.3f} {Row['MIPS']:9.3f} {Change:+8.1%}{Flag}")
+    Lines.append(f"{len(Regressions)} regressions beyond {Threshold:.0%}")
+    return "\n".join(Lines), Regressions
+
+
+def _main():
+    Parser = argparse.ArgumentParser(description="Benchmark the CPU engines and memory backends.")
+    Parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=WORKLOADS, help="workloads to run")
+    Parser.add_argument("--engines", nargs="+", choices=BENCHMARK_ENGINES, default=BENCHMARK_ENGINES, help="engines to run")
+    Parser.add_argument("--memory", nargs="+", choices=BACKENDS, default=BACKENDS, help="memory backends to run")
+    Parser.add_argument("--instructions", type=int, default=200000, help="instruction budget of a run")
+    Parser.add_argument("--repeat", type=int, default=3, help="runs per combination, the fastest counts")
+    Parser.add_argument("--output", help="write the results to this JSON file")
+    Parser.add_argument("--results", help="load the results from this JSON file instead of running")
+    Parser.add_argument("--compare", metavar="BASELINE", help="compare the MIPS with this earlier JSON result file")
+    Parser.add_argument("--threshold", type=float, default=0.05, help="relative slowdown flagged as a regression")
+    Args = Parser.parse_args()
+    if Args.results:
+        with open(Args.results) as f:
+            Results = json.load(f)
+    else:
+        Results = benchmark(Args.workloads, Args.engines, Args.memory, Args.instructions, Args.repeat, sys.stdout)
+    if Args.output:
+        with open(Args.output, "w") as f:
+            json.dump(Results, f, indent=2)
+    if Args.compare:
+        with open(Args.compare) as f:
+            Baseline = json.load(f)
+        Report, Regressions = compare(Baseline, Results, Args.threshold)
+        print(Report)
+        if Regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,123 @@
+"""
+Memory bus with memory-mapped devices.
+
+The bus keeps a 256-entry page table over the memory. RAM pages have no entry,
+so the engines store to them with a single page table lookup and no hook. A
+page holding a device maps each of the device's addresses (its ports) to the
+device, and every store to a port is passed to the device right after the value
+landed in memory, so the host reacts the moment the guest writes.
+
+A device is any object with a write(Address, Value) method. Its registers live
+in the memory: reading a port reads the memory, a device presents input by
+storing it there.
+"""
+from memory import SIZE, store
+
+
+class bus:
+    """
+    Page-granular dispatch of stores to devices.
+
+    Attributes:
+        Memory: The memory the devices are mapped into.
+        Data: The raw store the engines index.
+        Pages (list): Page -> None for RAM, or a dict port -> device.
+        IO (bytearray): 1 for pages holding a device (the engines' fast check).
+        Ports (bytearray): 1 for every address claimed by a device.
+        Generation (int): Incremented when the mapping changes, so engines
+            that translated code with the old mapping know to drop it.
+        Writes (int): Stores passed to devices so far.
+    """
+
+    def __init__(self, Memory):
+        """
+        Creates a bus without devices.
+
+        Args:
+            Memory (memory): The memory (or any store indexable by address).
+        """
+        self.Memory = Memory
+        self.Data = store(Memory)
+        self.Pages = [None] * 256
+        self.IO = bytearray(256)
+        self.Ports = bytearray(SIZE)
+        self.Devices = []
+        self.Generation = 0
+        self.Writes = 0
+
+    def attach(self, Device, Start: int, End: int):
+        """
+        Map a device to the addresses Start .. End - 1.
+
+        Args:
+            Device: Object with a write(Address, Value) method.
+            Start (int): First port.
+            End (int): Address after the last port.
+        """
+        if not 0 <= Start < End <= SIZE:
+            raise ValueError(f"invalid device range 0x{Start:04X} - 0x{End:04X}")
+        if Start < 0x200 and End > 0x100:
+            # pushes and pulls never go through the bus
+            raise ValueError("devices can't be mapped into the stack page")
+        for Address in range(Start, End):
+            if self.Ports[Address]:
+                raise ValueError(f"0x{Address:04X} is already mapped")
+        for Address in range(Start, End):
+            Page = Address >> 8
+            if self.Pages[Page] is None:
+                self.Pages[Page] = {}
+                self.IO[Page] = 1
+            self.Pages[Page][Address] = Device
+            self.Ports[Address] = 1
+        self.Devices.append(Device)
+        self.Generation += 1
+
+    def detach(self, Device):
+        """
+        Remove a device, its ports become plain RAM.
+
+        Args:
+            Device: A device attached before.
+        """
+        for Page in range(256):
+            Ports = self.Pages[Page]
+            if Ports is None:
+                continue
+            for Address in [Address for Address, Owner in Ports.items() if Owner is Device]:
+                del Ports[Address]
+                self.Ports[Address] = 0
+            if not Ports:
+                self.Pages[Page] = None
+                self.IO[Page] = 0
+        self.Devices.remove(Device)
+        self.Generation += 1
+
+    def write(self, Address: int):
+        """
+        Pass a store to the device owning the address, called by the engines
+        after the value was written to memory.
+
+        Args:
+            Address (int): The written address.
+        """
+        Ports = self.Pages[Address >> 8]
+        if Ports is not None and Address in Ports:
+            self.Writes += 1
+            Ports[Address].write(Address, self.Data[Address])
+
+    def __getitem__(self, Address):
+        return self.Memory[Address]
+
+    def __setitem__(self, Address, Value):
+        self.Memory[Address] = Value
+        if isinstance(Address, int) and self.Ports[Address & 0xFFFF]:
+            self.write(Address & 0xFFFF)
+
+    def __len__(self) -> int:
+        return len(self.Memory)
+
+    def __iter__(self):
+        return iter(self.Memory)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.Memory)
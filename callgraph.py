@@ -0,0 +1,161 @@
+"""
+Call graph of the guest program with inclusive and exclusive cycles.
+
+The traced batch interpreter (see codegen.runSource()) reports every JSR, RTS,
+BRK and RTI to event(), which keeps a shadow call stack. Frames are not popped
+by counting returns but by the stack pointer: a return pops every frame whose
+return address is now above SP. So code that drops return addresses itself
+(the cc65 runtime adjusting the stack, PLA PLA JMP ...) is unwound by the next
+call or return at its level, an RTS used as a computed jump (pushed address) pops
+nothing and code that JMPs out of a subroutine stays in its frame until that
+frame returns.
+"""
+from symbols import describe
+
+# opcodes that push a frame and how many bytes they push
+_PUSHES = {0x20: 2, 0x00: 3}
+
+
+class callgraph:
+    """
+    Shadow call stack and per-callee totals.
+
+    Attributes:
+        Clock (int): Cycles the CPU ran, advanced by cpu6502.run().
+        Calls (dict): Callee address -> calls.
+        Inclusive (dict): Callee address -> cycles inside it and its callees
+            (recursive calls counted once).
+        Exclusive (dict): Callee address -> cycles inside it only.
+        Stacks (dict): (callee addresses, root first) -> exclusive cycles.
+    """
+
+    def __init__(self, Root: int):
+        """
+        Args:
+            Root (int): Address the program runs from, the root frame.
+        """
+        self.Clock = 0
+        self.Calls = {Root: 1}
+        self.Inclusive = {}
+        self.Exclusive = {}
+        self.Stacks = {}
+        # frames: [callee, SP before the call, clock at the call], the root
+        # frame is above any SP and never popped
+        self.Frames = [[Root, 0x100, 0]]
+        self._Path = (Root,)
+        # callee -> frames of it on the stack
+        self._Active = {Root: 1}
+        # clock of the last event
+        self._Last = 0
+
+    def event(self, Opcode: int, PC: int, SP: int, Cycles: int):
+        """
+        Called by the traced interpreter after a call or return.
+
+        Args:
+            Opcode (int): JSR, RTS, BRK or RTI.
+            PC (int): The PC after the instruction (callee or return address).
+            SP (int): The stack pointer after the instruction.
+            Cycles (int): Cycles of the current batch including the instruction.
+        """
+        Clock = self.Clock + Cycles
+        self._charge(Clock)
+        if Opcode in _PUSHES:
+            Base = (SP + _PUSHES[Opcode]) & 0xFF
+            # frames at or below the new one had their return address dropped
+            self._unwind(Base, Clock)
+            self.Frames.append([PC, Base, Clock])
+            self._Path += (PC,)
+            self.Calls[PC] = self.Calls.get(PC, 0) + 1
+            self._Active[PC] = self._Active.get(PC, 0) + 1
+        else:
+            self._unwind(SP, Clock)
+
+    def _charge(self, Clock: int):
+        """
+        Charge the cycles since the last event to the frame on top.
+        """
+        Elapsed = Clock - self._Last
+        if Elapsed:
+            Callee = self.Frames[-1][0]
+            self.Exclusive[Callee] = self.Exclusive.get(Callee, 0) + Elapsed
+            self.Stacks[self._Path] = self.Stacks.get(self._Path, 0) + Elapsed
+            self._Last = Clock
+
+    def _unwind(self, SP: int, Clock: int):
+        """
+        Pop the frames whose return address the stack pointer moved past.
+        """
+        Frames = self.Frames
+        while Frames[-1][1] <= SP:
+            Callee, _, Start = Frames.pop()
+            self._Path = self._Path[:-1]
+            self._Active[Callee] -= 1
+            # recursive calls are inside the outermost one
+            if not self._Active[Callee]:
+                self.Inclusive[Callee] = self.Inclusive.get(Callee, 0) + Clock - Start
+
+    def totals(self) -> list:
+        """
+        Per-callee totals, the frames still on the stack counted up to now.
+
+        Returns:
+            list: (callee address, calls, inclusive cycles, exclusive cycles)
+                tuples, highest inclusive first.
+        """
+        self._charge(self.Clock)
+        Inclusive = dict(self.Inclusive)
+        Counted = set()
+        for Callee, _, Start in self.Frames:
+            # outermost open frame of each callee
+            if Callee not in Counted:
+                Counted.add(Callee)
+                Inclusive[Callee] = Inclusive.get(Callee, 0) + self.Clock - Start
+        Rows = [
+            (Callee, Calls, Inclusive.get(Callee, 0), self.Exclusive.get(Callee, 0))
+            for Callee, Calls in self.Calls.items()
+        ]
+        return sorted(Rows, key=lambda Row: Row[2], reverse=True)
+
+    def report(self, Symbols=None, Top: int = 30) -> str:
+        """
+        Per-callee calls, inclusive and exclusive cycles.
+
+        Args:
+            Symbols (symbols): Names of the callees, None for addresses only.
+            Top (int): Number of callees listed.
+
+        Returns:
+            str: The report.
+        """
+        Total = self.Clock or 1
+        Lines = [
+            f"{self.Clock} cycles, {sum(self.Calls.values()) - 1} calls",
+            "",
+            f"{'callee':28} {'calls':>10} {'inclusive':>12} {'%':>6} {'exclusive':>12} {'%':>6} {'per call':>10}",
+        ]
+        for Callee, Calls, Inclusive, Exclusive in self.totals()[:Top]:
+            Name = describe(Symbols, Callee)
+            Lines.append(
+                f"{Name:28} {Calls:10} {Inclusive:12} {Inclusive / Total:6.1%}"
+                f" {Exclusive:12} {Exclusive / Total:6.1%} {Inclusive / Calls:10.1f}"
+            )
+        return "\n".join(Lines)
+
+    def collapsed(self, Path: str, Symbols=None):
+        """
+        Write the exclusive cycles per call stack in the collapsed format of
+        flame graph tools: one "outer;...;inner cycles" line per stack.
+
+        Args:
+            Path (str): The output file.
+            Symbols (symbols): Names of the callees.
+        """
+        self._charge(self.Clock)
+        Collapsed = {}
+        for Stack, Cycles in self.Stacks.items():
+            Line = ";".join(describe(Symbols, Callee) for Callee in Stack)
+            Collapsed[Line] = Collapsed.get(Line, 0) + Cycles
+        with open(Path, "w") as f:
+            for Line in sorted(Collapsed):
+                f.write(f"{Line} {Collapsed[Line]}\n")
@@ -0,0 +1,739 @@
+"""
+Generates Python source for 6502 instructions from the table in opcodes.py.
+
+The generated snippets work on plain local variables:
+    M                           memory
+    A, X, Y, SP                 registers
+    PC                          program counter
+    C, V, I, D                  flags (0 or 1)
+    NZ                          last result holding N and Z (see flags.py)
+    cyc                         cycles of the current instruction
+so the same source can be wrapped into per-opcode handlers (cpu6502table),
+inlined into a batch loop or concatenated into compiled blocks. Generated
+source has to start with IMPORTS for the flag tables.
+
+Every wrapper has a counted variant that also fills the histogram of a stats
+object (see stats.py) held in the local Counts, and the batch loop has a traced
+variant reporting calls and returns to a callgraph object (see callgraph.py).
+The plain variants contain no trace of either.
+"""
+
+import re
+
+from opcodes import CONTROL, MODES, decode
+
+# registers and flags the generated code keeps in locals (PC is handled separately)
+REGISTERS = ("A", "X", "Y", "SP", "C", "NZ", "V", "I", "D")
+
+# first line of every generated source
+IMPORTS = "from flags import FLAGS_NZ, NZ_FROM_P, OVERFLOW"
+
+_NAME = re.compile(r"\b(A|X|Y|SP|C|NZ|V|I|D)\b")
+_ASSIGN = re.compile(r"^(A|X|Y|SP|C|NZ|V|I|D) (=|\+=|-=|&=|\|=|\^=) ")
+
+# branch -> condition under which it is taken
+BRANCHES = {
+    "BCC": "not C",
+    "BCS": "C",
+    "BEQ": "not NZ & 0xFF",
+    "BNE": "NZ & 0xFF",
+    "BMI": "NZ & 0x180",
+    "BPL": "not NZ & 0x180",
+    "BVC": "not V",
+    "BVS": "V",
+}
+
+# status register with B and bit 5 set, as pushed by PHP and BRK
+STATUS = "FLAGS_NZ[NZ] | V << 6 | 0x30 | D << 3 | I << 2 | C"
+
+
+def _nz(Value: str) -> list:
+    """
+    Lines updating N and Z from an 8-bit value held in a local.
+    """
+    return [f"NZ = {Value}"]
+
+
+def _unpack(Value: str) -> list:
+    """
+    Lines loading the flags from a pulled status byte (B is ignored like in step()).
+    """
+    return [
+        f"C = {Value} & 1",
+        f"NZ = NZ_FROM_P[{Value}]",
+        f"I = ({Value} >> 2) & 1",
+        f"D = ({Value} >> 3) & 1",
+        f"V = ({Value} >> 6) & 1",
+    ]
+
+
+def _push(Value: str) -> list:
+    return [f"M[0x100 | SP] = {Value}", "SP = (SP - 1) & 0xFF"]
+
+
+def _pull(Into: str) -> list:
+    return ["SP = (SP + 1) & 0xFF", f"{Into} = M[0x100 | SP]"]
+
+
+# operations reading an operand {v}
+_READ = {
+    "ADC": [
+        "r = A + {v} + C",
+        "V = OVERFLOW[A ^ {v} ^ r]",
+        "C = r >> 8",
+        "A = r & 0xFF",
+        *_nz("A"),
+    ],
+    # subtraction is addition of the inverted operand
+    "SBC": [
+        "r = A + ({v} ^ 0xFF) + C",
+        "V = OVERFLOW[A ^ {v} ^ 0xFF ^ r]",
+        "C = r >> 8",
+        "A = r & 0xFF",
+        *_nz("A"),
+    ],
+    "AND": ["A &= {v}", *_nz("A")],
+    "ORA": ["A |= {v}", *_nz("A")],
+    "EOR": ["A ^= {v}", *_nz("A")],
+    "CMP": ["r = A - {v} + 0x100", "C = r >> 8", "NZ = r & 0xFF"],
+    "CPX": ["r = X - {v} + 0x100", "C = r >> 8", "NZ = r & 0xFF"],
+    "CPY": ["r = Y - {v} + 0x100", "C = r >> 8", "NZ = r & 0xFF"],
+    # Z from v & A, N from bit 7 of v kept in bit 8
+    "BIT": ["V = ({v} >> 6) & 1", "NZ = ({v} & A) | ({v} & 0x80) << 1"],
+    "LDA": ["A = {v}", *_nz("A")],
+    "LDX": ["X = {v}", *_nz("X")],
+    "LDY": ["Y = {v}", *_nz("Y")],
+}
+
+# operations storing a register
+_STORE = {"STA": "A", "STX": "X", "STY": "Y"}
+
+# operations pushing onto the stack -> number of bytes pushed
+_PUSHES = {"PHA": 1, "PHP": 1, "JSR": 2, "BRK": 3}
+
+# read-modify-write operations turning v into r
+_MODIFY = {
+    "ASL": ["r = v << 1", "C = r >> 8", "r &= 0xFF", *_nz("r")],
+    "LSR": ["C = v & 1", "r = v >> 1", *_nz("r")],
+    "ROL": ["r = v << 1 | C", "C = r >> 8", "r &= 0xFF", *_nz("r")],
+    "ROR": ["r = v >> 1 | C << 7", "C = v & 1", *_nz("r")],
+    "INC": ["r = (v + 1) & 0xFF", *_nz("r")],
+    "DEC": ["r = (v - 1) & 0xFF", *_nz("r")],
+}
+
+# implied operations that just fall through to the next instruction
+_IMPLIED = {
+    "CLC": ["C = 0"],
+    "CLD": ["D = 0"],
+    "CLI": ["I = 0"],
+    "CLV": ["V = 0"],
+    "SEC": ["C = 1"],
+    "SED": ["D = 1"],
+    "SEI": ["I = 1"],
+    "DEX": ["X = (X - 1) & 0xFF", *_nz("X")],
+    "DEY": ["Y = (Y - 1) & 0xFF", *_nz("Y")],
+    "INX": ["X = (X + 1) & 0xFF", *_nz("X")],
+    "INY": ["Y = (Y + 1) & 0xFF", *_nz("Y")],
+    "TAX": ["X = A", *_nz("X")],
+    "TAY": ["Y = A", *_nz("Y")],
+    "TSX": ["X = SP", *_nz("X")],
+    "TXA": ["A = X", *_nz("A")],
+    "TXS": ["SP = X"],
+    "TYA": ["A = Y", *_nz("A")],
+    "NOP": [],
+    "PHA": _push("A"),
+    "PHP": _push(STATUS),
+    "PLA": [*_pull("A"), *_nz("A")],
+    "PLP": [*_pull("s"), *_unpack("s")],
+}
+
+
+def _address(Mode: str, Penalty: bool, Operands) -> tuple:
+    """
+    Source computing the effective address of an instruction.
+
+    Args:
+        Mode (str): Addressing mode.
+        Penalty (bool): Whether a page crossing adds a cycle.
+        Operands: (lo, hi) operand bytes when they are known at translation time,
+            None when they have to be fetched through PC.
+
+    Returns:
+        tuple: (lines, expression holding the address).
+    """
+    if Operands is None:
+        Lo, Hi = "M[(PC + 1) & 0xFFFF]", "M[(PC + 2) & 0xFFFF]"
+        Word = "(M[(PC + 1) & 0xFFFF] | M[(PC + 2) & 0xFFFF] << 8)"
+    else:
+        Lo, Hi = f"0x{Operands[0]:02X}", f"0x{Operands[1]:02X}"
+        Word = f"0x{Operands[0] | Operands[1] << 8:04X}"
+    match Mode:
+        case "zp":
+            if Operands is not None:
+                return [], Lo
+            return [f"p = {Lo}"], "p"
+        case "zpx" | "zpy":
+            Index = "X" if Mode == "zpx" else "Y"
+            return [f"p = ({Lo} + {Index}) & 0xFF"], "p"
+        case "abs":
+            if Operands is not None:
+                return [], Word
+            return [f"p = {Word}"], "p"
+        case "abx" | "aby":
+            Index = "X" if Mode == "abx" else "Y"
+            Lines = [f"p = ({Word} + {Index}) & 0xFFFF"]
+            if Penalty:
+                # the high byte changes exactly when the low byte overflows
+                Lines.append(f"cyc += ({Lo} + {Index}) >> 8")
+            return Lines, "p"
+        case "izx":
+            return [
+                f"z = ({Lo} + X) & 0xFF",
+                "p = M[z] | M[(z + 1) & 0xFF] << 8",
+            ], "p"
+        case "izy":
+            if Operands is None:
+                Lines = [f"z = {Lo}", "o = M[z] | M[(z + 1) & 0xFF] << 8"]
+            else:
+                Next = f"0x{(Operands[0] + 1) & 0xFF:02X}"
+                Lines = [f"o = M[{Lo}] | M[{Next}] << 8"]
+            if Penalty:
+                Lines.append("cyc += ((o & 0xFF) + Y) >> 8")
+            Lines.append("p = (o + Y) & 0xFFFF")
+            return Lines, "p"
+        case "izy16":
+            return [
+                f"z = {Lo}",
+                "p = ((M[z] | M[(z + 1) & 0xFFFF] << 8) + Y) & 0xFFFF",
+            ], "p"
+    raise ValueError(f"no effective address in mode {Mode}")
+
+
+def instructionSource(Opcode: int, Address: int = None, Memory=None) -> list:
+    """
+    Generate the source of one instruction.
+
+    Without an address the code fetches its operands through the PC local, so it
+    works for any location. With an address (and the memory to read the operand
+    bytes from) the operands, branch targets and the next PC are folded into
+    constants.
+
+    The returned lines do not set the base cycle count, they only add the
+    variable part (page crossings, taken branches) to cyc.
+
+    Args:
+        Opcode (int): The opcode byte.
+        Address (int): Address of the instruction when translating statically.
+        Memory: Memory to read operands from when translating statically.
+
+    Returns:
+        list: Lines of source code (not indented).
+    """
+    Operation, Mode, _, Penalty = decode(Opcode)
+    Length = MODES[Mode]
+    if Address is None:
+        Operands = None
+        Next = f"PC = (PC + {Length}) & 0xFFFF"
+    else:
+        Operands = (Memory[(Address + 1) & 0xFFFF], Memory[(Address + 2) & 0xFFFF])
+        Next = f"PC = 0x{(Address + Length) & 0xFFFF:04X}"
+
+    if Operation in _IMPLIED:
+        return [*_IMPLIED[Operation], Next]
+
+    if Operation in BRANCHES:
+        Lines = [f"if {BRANCHES[Operation]}:"]
+        if Operands is None:
+            Lines += [
+                "    t = PC + 2 + (M[(PC + 1) & 0xFFFF] ^ 0x80) - 0x80",
+                "    cyc += 2 if PC & 0xFF00 != t & 0xFF00 else 1",
+                "    PC = t & 0xFFFF",
+            ]
+        else:
+            Target = Address + 2 + (Operands[0] ^ 0x80) - 0x80
+            Extra = 2 if Address & 0xFF00 != Target & 0xFF00 else 1
+            Lines += [f"    cyc += {Extra}", f"    PC = 0x{Target & 0xFFFF:04X}"]
+        return Lines + ["else:", "    " + Next]
+
+    match Operation:
+        case "JMP" if Mode == "abs":
+            if Operands is None:
+                return ["PC = M[(PC + 1) & 0xFFFF] | M[(PC + 2) & 0xFFFF] << 8"]
+            return [f"PC = 0x{Operands[0] | Operands[1] << 8:04X}"]
+        case "JMP":
+            # the pointer does not cross a page (6502 bug)
+            if Operands is None:
+                return [
+                    "l = M[(PC + 1) & 0xFFFF]",
+                    "h = M[(PC + 2) & 0xFFFF] << 8",
+                    "PC = M[l | h] | M[((l + 1) & 0xFF) | h] << 8",
+                ]
+            l, h = Operands
+            return [
+                f"PC = M[0x{l | h << 8:04X}] | M[0x{((l + 1) & 0xFF) | h << 8:04X}] << 8"
+            ]
+        case "JSR":
+            if Operands is None:
+                return [
+                    "r = PC + 2",
+                    *_push("(r >> 8) & 0xFF"),
+                    *_push("r & 0xFF"),
+                    "PC = M[(PC + 1) & 0xFFFF] | M[(PC + 2) & 0xFFFF] << 8",
+                ]
+            Return = (Address + 2) & 0xFFFF
+            return [
+                *_push(f"0x{Return >> 8:02X}"),
+                *_push(f"0x{Return & 0xFF:02X}"),
+                f"PC = 0x{Operands[0] | Operands[1] << 8:04X}",
+            ]
+        case "RTS":
+            return [*_pull("l"), *_pull("h"), "PC = ((l | h << 8) + 1) & 0xFFFF"]
+        case "RTI":
+            return [*_pull("s"), *_unpack("s"), *_pull("l"), *_pull("h"), "PC = l | h << 8"]
+        case "BRK":
+            Lines = ["r = PC + 2"] if Operands is None else [f"r = 0x{Address + 2:04X}"]
+            return Lines + [
+                *_push("(r >> 8) & 0xFF"),
+                *_push("r & 0xFF"),
+                *_push(STATUS),
+                "I = 1",
+                "PC = M[0xFFFE] | M[0xFFFF] << 8",
+            ]
+
+    if Operation in _READ:
+        if Mode == "imm" and Operands is None:
+            Lines, Value = ["v = M[(PC + 1) & 0xFFFF]"], "v"
+        elif Mode == "imm":
+            Lines, Value = [], f"0x{Operands[0]:02X}"
+        else:
+            Lines, Where = _address(Mode, Penalty, Operands)
+            Lines.append(f"v = M[{Where}]")
+            Value = "v"
+        return Lines + [Line.format(v=Value) for Line in _READ[Operation]] + [Next]
+
+    if Operation in _STORE:
+        Lines, Where = _address(Mode, Penalty, Operands)
+        return Lines + [f"M[{Where}] = {_STORE[Operation]}", Next]
+
+    if Operation in _MODIFY:
+        if Mode == "acc":
+            return ["v = A", *_MODIFY[Operation], "A = r", Next]
+        Lines, Where = _address(Mode, Penalty, Operands)
+        return Lines + [f"v = M[{Where}]", *_MODIFY[Operation], f"M[{Where}] = r", Next]
+
+    raise ValueError(f"unknown operation {Operation}")
+
+
+def _tally(Opcode: int, Extra: str) -> str:
+    """
+    Line counting an executed instruction in the Counts histogram, indexed by
+    opcode << 2 | cycles above the base count.
+
+    Args:
+        Opcode (int): The opcode byte.
+        Extra (str): Expression holding the extra cycles the instruction took,
+            only used for opcodes that can take any.
+
+    Returns:
+        str: The line.
+    """
+    Operation, _, _, Penalty = decode(Opcode)
+    if Operation in BRANCHES or Penalty:
+        return f"Counts[0x{Opcode << 2:03X} + {Extra}] += 1"
+    return f"Counts[0x{Opcode << 2:03X}] += 1"
+
+
+def registers(Lines: list) -> tuple:
+    """
+    Find out which registers generated code reads and which it assigns.
+
+    A register only counts as read if it may be read before it is assigned at
+    the top level, so e.g. LDA does not need A loaded.
+
+    Args:
+        Lines (list): Generated source lines.
+
+    Returns:
+        tuple: (set of read registers, set of assigned registers).
+    """
+    Reads, Writes, Defined = set(), set(), set()
+    for Line in Lines:
+        Stripped = Line.lstrip()
+        Nested = Stripped != Line
+        Assign = _ASSIGN.match(Stripped)
+        Used = Stripped
+        if Assign:
+            Writes.add(Assign.group(1))
+            if Assign.group(2) == "=":
+                Used = Stripped[Assign.end():]
+        Reads |= set(_NAME.findall(Used)) - Defined
+        if Assign and not Nested:
+            Defined.add(Assign.group(1))
+    return Reads, Writes
+
+
+def handlerSource(Opcode: int, Watched: bool = False, Counted: bool = False) -> str:
+    """
+    Source of a specialized handler executing one opcode on a cpu6502 object.
+
+    The handler loads only the registers the opcode uses into locals, runs the
+    instruction and writes back only the registers it changed.
+
+    Stores to device ports are passed to cpu.Bus.
+
+    Args:
+        Opcode (int): The opcode byte.
+        Watched (bool): Report stores into pages marked in cpu.Watch (translated
+            code or devices) to cpu._stored() instead, for engines that keep
+            translated code.
+        Counted (bool): Count the instruction in cpu.Counts.
+
+    Returns:
+        str: Source defining the function op<XX>(cpu).
+    """
+    Body = instructionSource(Opcode)
+    if Counted:
+        Body += ["Counts = cpu.Counts", _tally(Opcode, f"cyc - {decode(Opcode)[2]}")]
+    if Watched and writesMemory(Opcode):
+        Body += ["if cpu.Watch[p >> 8]:", "    cpu._stored(p)"]
+    elif writesMemory(Opcode):
+        Body += ["if cpu.IO[p >> 8] and cpu.Ports[p]:", "    cpu.Bus.write(p)"]
+    elif Watched and decode(Opcode)[0] in _PUSHES:
+        Body += ["if cpu.Watch[0x01] & 1:"]
+        Body += [
+            f"    cpu._stored(0x100 | ((SP + {k}) & 0xFF))"
+            for k in range(1, _PUSHES[decode(Opcode)[0]] + 1)
+        ]
+    Reads, Writes = registers(Body)
+    Lines = [f"def op{Opcode:02X}(cpu):", "    M = cpu.Memory", "    PC = cpu.PC"]
+    Lines += [f"    {R} = cpu.{R}" for R in REGISTERS if R in Reads]
+    Lines.append(f"    cyc = {decode(Opcode)[2]}")
+    Lines += ["    " + Line for Line in Body]
+    Lines += [f"    cpu.{R} = {R}" for R in REGISTERS if R in Writes]
+    Lines += ["    cpu.PC = PC", "    cpu.Cycles = cyc"]
+    return "\n".join(Lines) + "\n"
+
+
+def buildHandlers(Watched: bool = False, Counted: bool = False) -> list:
+    """
+    Compile one handler per opcode.
+
+    Args:
+        Watched (bool): Generate handlers reporting stores into translated code.
+        Counted (bool): Generate handlers counting into cpu.Counts.
+
+    Returns:
+        list: 256 functions indexed by opcode.
+    """
+    Source = "\n".join([IMPORTS] + [handlerSource(Opcode, Watched, Counted) for Opcode in range(256)])
+    Namespace = {}
+    exec(compile(Source, "<cpu6502 handlers>", "exec"), Namespace)
+    return [Namespace[f"op{Opcode:02X}"] for Opcode in range(256)]
+
+
+def writesMemory(Opcode: int) -> bool:
+    """
+    Whether an opcode stores to its effective address p (stack writes excluded).
+
+    Args:
+        Opcode (int): The opcode byte.
+
+    Returns:
+        bool: True for stores and read-modify-write on memory.
+    """
+    Operation, Mode, _, _ = decode(Opcode)
+    return Operation in _STORE or (Operation in _MODIFY and Mode != "acc")
+
+
+def _ioCheck() -> list:
+    """
+    Lines run after an instruction stored to p, syncing the registers back to
+    the cpu object and passing the store to the bus when p is a device port,
+    and ending the batch if the program asked to terminate or an interrupt
+    it can take is pending (run() takes it).
+    """
+    return [
+        "if IO[p >> 8] and Ports[p]:",
+        *[f"    cpu.{R} = {R}" for R in REGISTERS],
+        "    cpu.PC = PC",
+        "    cpu.Cycles = cyc",
+        "    Bus.write(p)",
+        "    if M[0xFE] == 127 or cpu.NMIPending or cpu.IRQPending and not I:",
+        "        Limit = 0",
+    ]
+
+
+# opcodes that may clear I: CLI, PLP, RTI
+UNMASKS = (0x58, 0x28, 0x40)
+
+
+def _dispatch(Segments: list, Indent: str) -> list:
+    """
+    Binary decision tree over opcode ranges.
+
+    Args:
+        Segments (list): Sorted (first opcode, lines) pairs covering 0 - 255.
+        Indent (str): Indentation of the tree.
+
+    Returns:
+        list: Indented lines.
+    """
+    if len(Segments) == 1:
+        return [Indent + Line for Line in Segments[0][1]]
+    Middle = len(Segments) // 2
+    return [
+        f"{Indent}if op < 0x{Segments[Middle][0]:02X}:",
+        *_dispatch(Segments[:Middle], Indent + "    "),
+        f"{Indent}else:",
+        *_dispatch(Segments[Middle:], Indent + "    "),
+    ]
+
+
+# opcodes reported by the traced batch loop: JSR, RTS, BRK, RTI
+CALLS = (0x20, 0x60, 0x00, 0x40)
+
+
+def runSource(Counted: bool = False, Traced: bool = False) -> str:
+    """
+    Source of the batch interpreter used by cpu6502.run().
+
+    All registers and flags live in locals for the whole batch, the opcode is
+    dispatched through a binary if-tree and the state is written back to the
+    cpu object at the end of the batch or when an instruction stores to a
+    device port.
+
+    Args:
+        Counted (bool): Count every instruction in cpu.Counts.
+        Traced (bool): Pass every call and return to cpu.Calls.event() with
+            the new PC, SP and the cycles of the batch so far.
+
+    Returns:
+        str: Source defining run(cpu, Limit, CycleLimit).
+    """
+    Segments = []
+    for Opcode in range(256):
+        Body = [f"cyc = {decode(Opcode)[2]}", *instructionSource(Opcode)]
+        if Counted:
+            Body.append(_tally(Opcode, f"cyc - {decode(Opcode)[2]}"))
+        if Traced and Opcode in CALLS:
+            Body.append(f"Event(0x{Opcode:02X}, PC, SP, total + cyc)")
+        if writesMemory(Opcode):
+            Body += _ioCheck()
+        if Opcode in UNMASKS:
+            # a pending IRQ is taken by run() as soon as I is clear
+            Body += ["if cpu.IRQPending and not I:", "    Limit = 0"]
+        # consecutive unknown opcodes share one branch of the tree
+        if Segments and Segments[-1][1] == Body:
+            continue
+        Segments.append((Opcode, Body))
+
+    Lines = [IMPORTS, "", "def run(cpu, Limit, CycleLimit):", "    M = cpu.Memory", "    PC = cpu.PC"]
+    Lines += ["    Bus = cpu.Bus", "    IO = Bus.IO", "    Ports = Bus.Ports"]
+    if Counted:
+        Lines.append("    Counts = cpu.Counts")
+    if Traced:
+        Lines.append("    Event = cpu.Calls.event")
+    Lines += [f"    {R} = cpu.{R}" for R in REGISTERS]
+    Lines += [
+        "    cyc = cpu.Cycles",
+        "    n = 0",
+        "    total = 0",
+        "    if M[0xFE] == 127:",
+        "        Limit = 0",
+        "    while n < Limit and total < CycleLimit:",
+        "        op = M[PC]",
+        *_dispatch(Segments, "        "),
+        "        n += 1",
+        "        total += cyc",
+    ]
+    Lines += [f"    cpu.{R} = {R}" for R in REGISTERS]
+    Lines += ["    cpu.PC = PC", "    cpu.Cycles = cyc", "    return n, total"]
+    return "\n".join(Lines) + "\n"
+
+
+def buildRun(Counted: bool = False, Traced: bool = False):
+    """
+    Compile the batch interpreter.
+
+    Args:
+        Counted (bool): Compile the variant counting into cpu.Counts.
+        Traced (bool): Compile the variant reporting calls to cpu.Calls.
+
+    Returns:
+        function: run(cpu, Limit, CycleLimit) -> (instructions, cycles).
+    """
+    Namespace = {}
+    exec(compile(runSource(Counted, Traced), "<cpu6502 run>", "exec"), Namespace)
+    return Namespace["run"]
+
+
+# flags whose dead assignments a block may drop
+_FLAGS = {"C", "NZ", "V"}
+
+# longest block the translator generates
+BLOCK_LIMIT = 64
+
+
+def _statements(Lines: list) -> list:
+    """
+    Group lines into top-level statements (a compound statement with its body).
+    """
+    Statements = []
+    for Line in Lines:
+        if Line.startswith((" ", "else:")) and Statements:
+            Statements[-1].append(Line)
+        else:
+            Statements.append([Line])
+    return Statements
+
+
+def _dropDeadFlags(Lines: list) -> list:
+    """
+    Remove flag assignments that are overwritten before anything reads them.
+
+    Everything is live at the end, compound statements (branches, exits) only
+    read, so only plain top-level "flag = expression" lines are ever removed.
+    """
+    Live = set(REGISTERS)
+    Kept = []
+    for Statement in reversed(_statements(Lines)):
+        Assign = _ASSIGN.match(Statement[0])
+        if len(Statement) == 1 and Assign:
+            Name = Assign.group(1)
+            if Name in _FLAGS and Assign.group(2) == "=" and Name not in Live:
+                continue
+            if Assign.group(2) == "=":
+                Live.discard(Name)
+                Live |= set(_NAME.findall(Statement[0][Assign.end():]))
+            else:
+                Live |= set(_NAME.findall(Statement[0]))
+        else:
+            for Line in Statement:
+                Live |= set(_NAME.findall(Line))
+        Kept.append(Statement)
+    return [Line for Statement in reversed(Kept) for Line in Statement]
+
+
+def _successors(Memory, Address: int) -> list:
+    """
+    Statically known addresses where execution continues after the last
+    instruction of a block.
+    """
+    Opcode = Memory[Address]
+    Operation, Mode, _, _ = decode(Opcode)
+    Next = (Address + MODES[Mode]) & 0xFFFF
+    Lo, Hi = Memory[(Address + 1) & 0xFFFF], Memory[(Address + 2) & 0xFFFF]
+    if Operation in BRANCHES:
+        return [(Address + 2 + (Lo ^ 0x80) - 0x80) & 0xFFFF, Next]
+    match Operation:
+        case "JMP" if Mode == "abs":
+            return [Lo | Hi << 8]
+        case "JSR":
+            # RTS comes back right after the JSR
+            return [Lo | Hi << 8, Next]
+        case "BRK":
+            # the return address is not followed, BRK mostly means running into
+            # zeroed memory, and neither is an unset (zero) vector
+            Vector = Memory[0xFFFE] | Memory[0xFFFF] << 8
+            return [Vector] if Vector else []
+        case "JMP" | "RTS" | "RTI":
+            return []
+    return [Next]
+
+
+def blockSource(Memory, Address: int, Name: str, Ports=None, Counted: bool = False) -> tuple:
+    """
+    Translate the basic block starting at an address into a Python function.
+
+    The block runs until (and including) the first instruction that changes PC,
+    or BLOCK_LIMIT instructions. Operands are folded into constants and flag
+    updates nobody reads are dropped. After every store (and push) the function
+    checks the Watch page table (bit 0: page holds translated code, bit 1: page
+    holds devices) and on a hit it writes the state back, reports the store
+    through cpu._stored() and returns early. Stores to an address that is a
+    device port at translation time always end the block.
+
+    The generated function is called as Name(cpu, M, Watch) and returns
+    (cycles, instructions) after setting cpu.PC.
+
+    Args:
+        Memory: Memory holding the code.
+        Address (int): Entry address.
+        Name (str): Name of the generated function.
+        Ports (bytearray): The bus' port map, None without devices.
+        Counted (bool): Count every instruction in cpu.Counts.
+
+    Returns:
+        tuple: (source, address after the block (above 0xFFFF if the last
+            instruction wraps around), number of instructions, addresses where
+            execution may continue that are known statically).
+    """
+    Body = []
+    Successors = []
+    Cycles = 0
+    Count = 0
+    PC = Address
+    while True:
+        Opcode = Memory[PC]
+        Operation, Mode, Base, _ = decode(Opcode)
+        Lines = instructionSource(Opcode, PC, Memory)
+        if Counted:
+            # cyc only holds the extra cycles of the block so far
+            Tally = _tally(Opcode, "cyc - c0")
+            if "c0" in Tally:
+                Lines.insert(0, "c0 = cyc")
+            Lines.insert(len(Lines) - Lines[-1].startswith("PC = "), Tally)
+        Next = (PC + MODES[Mode]) & 0xFFFF
+        Cycles += Base
+        Count += 1
+        Last = (
+            Operation in CONTROL
+            or Count >= BLOCK_LIMIT
+            or Next < PC  # wrapped around the address space
+        )
+        # addresses the instruction stores to and when they need checking
+        Stored, Condition = [], None
+        if writesMemory(Opcode):
+            Store = next(L for L in Lines if L.startswith("M[") and "] = " in L)
+            Where = Store[2 : Store.index("] = ")]
+            Stored.append(Where)
+            if Where != "p" and Ports is not None and Ports[int(Where, 16)]:
+                Last = True
+            elif Where != "p":
+                Condition = f"Watch[0x{int(Where, 16) >> 8:02X}] & 1"
+            else:
+                Condition = "Watch[p >> 8]"
+        elif Operation in _PUSHES:
+            # code may also live in the stack page
+            Stored = [f"0x100 | ((SP + {k}) & 0xFF)" for k in range(1, _PUSHES[Operation] + 1)]
+            Condition = "Watch[0x01] & 1"
+        Report = [f"cpu._stored({Where})" for Where in Stored]
+        if Stored and not Last:
+            Lines.pop()  # constant PC only needed when leaving
+            _, Written = registers(Body + Lines)
+            Exit = [f"cpu.{R} = {R}" for R in REGISTERS if R in Written]
+            Exit += [f"cpu.PC = 0x{Next:04X}", *Report, f"return cyc + {Cycles}, {Count}"]
+            Successors.append(Next)
+            Lines += [f"if {Condition}:", *["    " + L for L in Exit]]
+        elif Stored and Condition is not None:
+            Lines += [f"if {Condition}:", *["    " + L for L in Report]]
+        elif Stored:
+            Lines += Report
+        elif not Last and Lines[-1].startswith("PC = "):
+            Lines.pop()
+        Body += Lines
+        if Last:
+            Successors += _successors(Memory, PC)
+            break
+        PC = Next
+    Body = _dropDeadFlags(Body)
+    Reads, Writes = registers(Body)
+    Source = [f"def {Name}(cpu, M, Watch):"]
+    if Counted:
+        Source.append("    Counts = cpu.Counts")
+    Source += [f"    {R} = cpu.{R}" for R in REGISTERS if R in Reads]
+    Source.append("    cyc = 0")
+    Source += ["    " + Line for Line in Body]
+    Source += [f"    cpu.{R} = {R}" for R in REGISTERS if R in Writes]
+    Source += ["    cpu.PC = PC", f"    return cyc + {Cycles}, {Count}"]
+    return "\n".join(Source) + "\n", PC + MODES[Mode], Count, Successors
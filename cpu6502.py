@@ -1,3 +1,25 @@
+import time
+
+from codegen import BRANCHES, CALLS, buildRun
+from flags import CARRY, FLAGS_NZ, NZ_FROM_P, OVERFLOW
+from bus import bus
+from callgraph import callgraph
+from opcodes import decode
+from stats import stats
+
+# longest spin loop iteration (in instructions) run() looks for
+SPIN_LIMIT = 64
+# run() calls skipped at most before looking for a spin loop again after a miss
+SPIN_BACKOFF = 16
+# seconds between the checks of wait()
+SPIN_POLL = 0.001
+# opcode -> base cycles if it can take extra ones, for counting the
+# instructions the spin probe steps like the counted code does
+_TALLIED = [
+    Cycles if Operation in BRANCHES or Penalty else None for Operation, _, Cycles, Penalty in map(decode, range(256))
+]
+
+
 def unsignedToSigned8bit(Value: int) -> int:
     return (Value - 256) if Value & 0x80 else Value
 
@@ -6,15 +28,51 @@ def signedToUnsigned8bit(Value: int) -> int:
     return Value & 0xFF
 
 
+class _recorder:
+    """
+    Memory stand-in recording what one iteration of a possible spin loop reads
+    and writes.
+    """
+
+    def __init__(self, Memory):
+        self.Memory = Memory
+        # address -> value, for addresses read before the iteration wrote them
+        self.Reads = {}
+        # address -> value before the iteration first wrote it
+        self.Writes = {}
+
+    def __getitem__(self, Address):
+        Value = self.Memory[Address]
+        if Address not in self.Writes and Address not in self.Reads:
+            self.Reads[Address] = Value
+        return Value
+
+    def __setitem__(self, Address, Value):
+        if Address not in self.Writes:
+            self.Writes[Address] = self.Memory[Address]
+        self.Memory[Address] = Value
+
+
 class cpu6502:
-    def __init__(self, memory: list):
+    # (counted, traced) -> batch interpreter variant, generated on first use
+    _Runs = {}
+    # whether step() counts into Stats.Counts itself once statistics are on
+    StepCounted = False
+
+    def __init__(self, memory):
         """
         Creates a 6502 CPU
 
         Args:
-            memory (list): A reference to a list of integers.
+            memory (bus): The bus with the devices, or just a memory (or any store
+                indexable by address, like a list of integers).
         """
-        self.Memory = memory
+        self.Bus = memory if isinstance(memory, bus) else bus(memory)
+        # the engines index the raw store, addresses and values are wrapped by the CPU
+        self.Memory = self.Bus.Data
+        # stores are passed to the bus when IO[page] and Ports[address] are set
+        self.IO = self.Bus.IO
+        self.Ports = self.Bus.Ports
         # cycles measure how many cycles to wait
         self.Cycles = 0
         # Accumulator
@@ -33,8 +91,8 @@ class cpu6502:
         # Program counter(defaultly set reser vector)
         self.PC = self._readShort(self.RES)
         # Flags
-        # N	Negative
-        self.N = 0
+        # N	Negative and Z Zero are kept lazily as the last result (see flags.py)
+        self.NZ = 1
         # V	Overflow
         self.V = 0
         # B	Break
@@ -43,10 +101,71 @@ class cpu6502:
         self.D = 0
         # I	Interrupt (IRQ disable)
         self.I = 0
-        # Z	Zero
-        self.Z = 0
         # C	Carry
         self.C = 0
+        # interrupt requests from outside, taken by run() between instructions
+        # (see irq() and nmi()), Pending while there is either
+        self.IRQPending = False
+        self.NMIPending = False
+        self.Pending = False
+        # spin loops are detected by run() and fast-forwarded (see run())
+        self.SpinDetection = True
+        # the loop the CPU sits in: (registers, instructions and cycles per
+        # iteration, address -> value of the bytes it reads), or None
+        self.Spin = None
+        self.SpinCycles = 0
+        self._SpinBackoff = 0
+        self._SpinSkip = 0
+        # execution statistics, None until enableStats()
+        self.Stats = None
+        # call graph, None until enableCalls()
+        self.Calls = None
+
+    @property
+    def N(self) -> int:
+        """
+        N Negative flag, computed from the last result.
+        """
+        return 1 if self.NZ & 0x180 else 0
+
+    @N.setter
+    def N(self, Value: int):
+        self.NZ = NZ_FROM_P[(0x80 if Value else 0) | (FLAGS_NZ[self.NZ] & 0x02)]
+
+    @property
+    def Z(self) -> int:
+        """
+        Z Zero flag, computed from the last result.
+        """
+        return 0 if self.NZ & 0xFF else 1
+
+    @Z.setter
+    def Z(self, Value: int):
+        self.NZ = NZ_FROM_P[(FLAGS_NZ[self.NZ] & 0x80) | (0x02 if Value else 0)]
+
+    @property
+    def P(self) -> int:
+        """
+        The packed status register NV1BDIZC.
+        """
+        return (
+            FLAGS_NZ[self.NZ]
+            | self.V << 6
+            | 0x20
+            | self.B << 4
+            | self.D << 3
+            | self.I << 2
+            | self.C
+        )
+
+    @P.setter
+    def P(self, Value: int):
+        # B is not a real flag, pulling the status does not change it
+        self.NZ = NZ_FROM_P[Value]
+        self.V = (Value >> 6) & 1
+        self.D = (Value >> 3) & 1
+        self.I = (Value >> 2) & 1
+        self.C = Value & 1
 
     # reads 16bits
     def _readShort(self, Address: int, zeropage: int = 0) -> int:
@@ -86,6 +205,18 @@ class cpu6502:
             self.Memory[Address & 0xFF] = Value & 0xFF
             self.Memory[(Address + 1) & 0xFF] = (Value >> 8) & 0xFF
 
+    def _write(self, Address: int, Value: int):
+        """
+        Store a byte, passing it to the device if the address is a port.
+
+        Args:
+            Address (int): The address to write to.
+            Value (int): The 8-bit value.
+        """
+        self.Memory[Address] = Value
+        if self.IO[Address >> 8] and self.Ports[Address]:
+            self.Bus.write(Address)
+
     def _push(self, Value: int):
         """
         Push a 8-bit integer onto the stack
@@ -93,7 +224,7 @@ class cpu6502:
         Args:
             Value (int): Integer to push.
         """
-        self.Memory[self.SP + 0x100] = Value
+        self.Memory[self.SP + 0x100] = Value & 0xFF
         self.SP = (self.SP - 1) & 0xFF
 
     def _pull(self) -> int:
@@ -117,7 +248,7 @@ class cpu6502:
         Returns:
             int: Final effective address.
         """
-        p = self.Memory[Address] + self.X  # address in zeropage + X
+        p = self.Memory[Address & 0xFFFF] + self.X  # address in zeropage + X
         return p & 0xFF
 
     def _addressingZeropageY(self, Address: int):
@@ -130,7 +261,7 @@ class cpu6502:
         Returns:
             int: Final effective address.
         """
-        p = self.Memory[Address] + self.Y  # address in zeropage + Y
+        p = self.Memory[Address & 0xFFFF] + self.Y  # address in zeropage + Y
         return p & 0xFF
 
     def _addressingAbsoluteX(self, Address: int):
@@ -175,7 +306,7 @@ class cpu6502:
         Returns:
             int: Effective address after dereferencing.
         """
-        pp = self.Memory[Address] + self.X
+        pp = self.Memory[Address & 0xFFFF] + self.X
         pp = pp & 0xFF
         return self._readShort(pp, zeropage=1)
 
@@ -189,23 +320,12 @@ class cpu6502:
         Returns:
             int: Effective address after dereferencing and adding Y.
         """
-        orig = self._readShort(self.Memory[Address], zeropage=1)
+        orig = self._readShort(self.Memory[Address & 0xFFFF], zeropage=1)
         p = orig + self.Y
         if orig & 0xFF00 != p & 0xFF00:  # if the high byte increases add 1 to cycle
             self.Cycles += 1
         return p & 0xFFFF
 
-    # updates flags N,Z based on value operated on
-    def _updateNZ(self, Value: int):
-        """
-        Update N (negative) and Z (zero) flags based on a result.
-
-        Args:
-            Value (int): The result to evaluate.
-        """
-        self.Z = 1 if (Value & 0xFF == 0) else 0
-        self.N = 1 if (Value & 0x80 != 0) else 0
-
     def _ADCFlags(self, Original: int, Operand: int, Result: int):
         """
         Set flags for the ADC instruction result.
@@ -215,12 +335,11 @@ class cpu6502:
             Operand (int): Operand added.
             Result (int): Result after addition.
         """
-        self._updateNZ(Result)
+        self.NZ = Result & 0xFF
         # unsigned overflow 255 + 1 = 0
-        self.C = 1 if Result > 0xFF else 0
+        self.C = CARRY[Result]
         # signed overflow 127 + 1 = -128
-        # idk chat did it
-        self.V = ((Original ^ Result) & (Operand ^ Result) & 0x80) != 0
+        self.V = OVERFLOW[Original ^ Operand ^ Result]
 
     def _SBCFlags(self, Original: int, Operand: int, Result: int):
         """
@@ -231,9 +350,11 @@ class cpu6502:
             Operand (int): Operand subtracted.
             Result (int): Result after subtraction.
         """
-        self._updateNZ(Result)
-        self.C = 1 if Result >= 0 else 0
-        self.V = ((Original ^ Operand) & (Original ^ Result) & 0x80) != 0
+        # subtraction is addition of the inverted operand, which adds 0x100
+        Result += 0x100
+        self.NZ = Result & 0xFF
+        self.C = CARRY[Result]
+        self.V = OVERFLOW[Original ^ Operand ^ 0xFF ^ Result]
 
     def _ASLFLags(self, Value: int):
         """
@@ -242,8 +363,8 @@ class cpu6502:
         Args:
             Value (int): Result of the ASL operation.
         """
-        self._updateNZ(Value)
-        self.C = 1 if Value & 0x100 != 0 else 0
+        self.NZ = Value & 0xFF
+        self.C = CARRY[Value]
 
     def cycle(self):
         """
@@ -254,6 +375,302 @@ class cpu6502:
             self.step()
         self.Cycles -= 1
 
+    def run(self, MaxInstructions: int = None, MaxCycles: int = None) -> tuple:
+        """
+        Execute a batch of instructions inside one call.
+
+        The batch ends when Memory[0xFE] is 127 or a budget is used up.
+
+        Interrupts requested with irq() and nmi() are taken between
+        instructions: before the first one and wherever the batch interpreter
+        stops for them (see irq()). Entering the handler takes 7 cycles and no
+        instruction.
+
+        With SpinDetection on, a batch first checks whether the CPU sits in a
+        spin loop: one iteration that stores nothing to a device and leaves the
+        registers and every byte it wrote as they were, like waiting for a
+        port to change or a JMP to itself. Such a loop repeats identically
+        until something else writes one of the bytes it reads, so its
+        iterations are not executed but accounted at once (the whole iterations
+        fitting into the budgets, so the batch may end before them), the host
+        can block in wait() meanwhile.
+        After a miss the check is skipped for a growing number of batches.
+
+        Args:
+            MaxInstructions (int): Maximum number of instructions, None for no limit.
+            MaxCycles (int): Maximum number of cycles (the last instruction may
+                overshoot it), None for no limit.
+
+        Returns:
+            tuple: (instructions executed, cycles taken).
+        """
+        if MaxInstructions is None:
+            MaxInstructions = 1 << 62
+        if MaxCycles is None:
+            MaxCycles = 1 << 62
+        if self.Stats is not None:
+            Start = time.perf_counter()
+        # a pending interrupt is taken first, the spin check then sees its handler
+        n, c = 0, self._service()
+        if self.Calls is not None:
+            self.Calls.Clock += c
+        if self.SpinDetection and self.Memory[0xFE] != 127:
+            Instructions, Cycles = self._spin(MaxInstructions, MaxCycles - c)
+            n += Instructions
+            c += Cycles
+            if self.Calls is not None:
+                self.Calls.Clock += Cycles
+            # the probe stops at an interrupt that became takeable
+            if self.Spin is None and self.Pending:
+                Taken = self._service()
+                c += Taken
+                if self.Calls is not None:
+                    self.Calls.Clock += Taken
+        # a spinning CPU stays at the start of the loop, unless the budgets
+        # are too small for one iteration
+        while (self.Spin is None or n == 0) and n < MaxInstructions and c < MaxCycles:
+            Instructions, Cycles = self._batch(MaxInstructions - n, MaxCycles - c)
+            n += Instructions
+            c += Cycles
+            if self.Calls is not None:
+                self.Calls.Clock += Cycles
+            # the batch ends early for an interrupt it can't take itself
+            Taken = self._service()
+            if not Taken:
+                break
+            c += Taken
+            if self.Calls is not None:
+                self.Calls.Clock += Taken
+        if self.Stats is not None:
+            self.Stats.Seconds += time.perf_counter() - Start
+            self.Stats.Instructions += n
+            self.Stats.Cycles += c
+        return n, c
+
+    def irq(self):
+        """
+        Request a maskable interrupt (IRQ). run() takes it before the next
+        instruction once I is clear, until then the request stays pending.
+        Safe to call from another thread, the running batch ends at the next
+        store to a device port or instruction clearing I, or block for the
+        JIT and AOT engines, and the interrupt is taken right after it.
+        """
+        self.IRQPending = self.Pending = True
+
+    def nmi(self):
+        """
+        Request a non-maskable interrupt (NMI), taken by run() before the next
+        instruction whatever I is (see irq()).
+        """
+        self.NMIPending = self.Pending = True
+
+    def _interrupt(self, Vector: int) -> int:
+        """
+        Enter an interrupt handler like the hardware does: push PC and the
+        status (B clear), set I and jump through the vector.
+
+        Args:
+            Vector (int): Address of the vector (NMI or IRQ).
+
+        Returns:
+            int: Cycles taken (7).
+        """
+        self._push(self.PC >> 8)
+        self._push(self.PC & 0xFF)
+        self._push(self.P & ~0x10)
+        self.I = 1
+        self.PC = self._readShort(Vector)
+        if self.Calls is not None:
+            self.Calls.event(0x00, self.PC, self.SP, 7)
+        return 7
+
+    def _service(self) -> int:
+        """
+        Take a pending interrupt if one can be taken, the NMI first.
+
+        Returns:
+            int: Cycles taken, 0 if none was.
+        """
+        # the requests themselves are checked, another thread may set one
+        # while Pending is updated
+        if not (self.NMIPending or self.IRQPending) or self.Memory[0xFE] == 127:
+            return 0
+        if self.NMIPending:
+            self.NMIPending = False
+            Vector = self.NMI
+        elif not self.I:
+            self.IRQPending = False
+            Vector = self.IRQ
+        else:
+            return 0
+        self.Pending = self.NMIPending or self.IRQPending
+        return self._interrupt(Vector)
+
+    def _batch(self, MaxInstructions: int, MaxCycles: int) -> tuple:
+        """
+        Execute instructions until a budget is used up or Memory[0xFE] is 127.
+
+        The registers and flags are kept in local variables during the batch and
+        written back when it ends or when an instruction stores to memory-mapped
+        I/O (0xFE, 0xFF, 0x200 - 0x5FF), so devices always see a consistent CPU.
+
+        Args:
+            MaxInstructions (int): Maximum number of instructions.
+            MaxCycles (int): Maximum number of cycles.
+
+        Returns:
+            tuple: (instructions executed, cycles taken).
+        """
+        Variant = (self.Stats is not None, self.Calls is not None)
+        Run = cpu6502._Runs.get(Variant)
+        if Run is None:
+            Run = cpu6502._Runs[Variant] = buildRun(*Variant)
+        return Run(self, MaxInstructions, MaxCycles)
+
+    def enableStats(self) -> stats:
+        """
+        Start collecting execution statistics. From now on run() uses the
+        counted variant of the generated code, the plain one has no counters
+        at all.
+
+        Returns:
+            stats: The counters (also in Stats).
+        """
+        if self.Stats is None:
+            self.Stats = stats()
+            self.Counts = self.Stats.Counts
+        return self.Stats
+
+    def invalidate(self):
+        """
+        Forget everything derived from the memory, after it was replaced
+        behind the CPU's back (a snapshot restored).
+        """
+        self.Spin = None
+        self._SpinBackoff = self._SpinSkip = 0
+
+    def enableCalls(self) -> callgraph:
+        """
+        Start recording the call graph. From now on run() uses the traced
+        variant of the batch interpreter, which reports every JSR, RTS, BRK
+        and RTI (JIT and AOT engines fall back to it).
+
+        Returns:
+            callgraph: The call graph (also in Calls).
+        """
+        if self.Calls is None:
+            self.Calls = callgraph(self.PC)
+        return self.Calls
+
+    def _registers(self) -> tuple:
+        return (self.PC, self.A, self.X, self.Y, self.SP, self.NZ, self.V, self.B, self.D, self.I, self.C)
+
+    def _spinning(self) -> bool:
+        """
+        Whether the CPU still sits in the detected spin loop: neither the
+        registers nor the bytes the loop reads changed since.
+        """
+        Registers, _, _, Reads = self.Spin
+        M = self.Memory
+        return self._registers() == Registers and all(M[Address] == Value for Address, Value in Reads.items())
+
+    def _spin(self, MaxInstructions: int, MaxCycles: int) -> tuple:
+        """
+        Fast-forward the spin loop the CPU sits in, looking for one first if
+        there is none yet. Leaves Spin set if the CPU spins.
+
+        Args:
+            MaxInstructions (int): Maximum number of instructions.
+            MaxCycles (int): Maximum number of cycles.
+
+        Returns:
+            tuple: (instructions executed or skipped, cycles taken).
+        """
+        if self.Spin is not None and not self._spinning():
+            self.Spin = None
+        n = c = 0
+        if self.Spin is None:
+            n, c = self._probe(MaxInstructions, MaxCycles)
+            if self.Spin is None:
+                return n, c
+        _, Instructions, Cycles, _ = self.Spin
+        Iterations = max(0, min((MaxInstructions - n) // Instructions, (MaxCycles - c) // Cycles))
+        self.SpinCycles += Iterations * Cycles
+        return n + Iterations * Instructions, c + Iterations * Cycles
+
+    def _probe(self, MaxInstructions: int, MaxCycles: int) -> tuple:
+        """
+        Step through one iteration of what may be a spin loop and set Spin if
+        it is one.
+
+        Args:
+            MaxInstructions (int): Maximum number of instructions.
+            MaxCycles (int): Maximum number of cycles.
+
+        Returns:
+            tuple: (instructions executed, cycles taken).
+        """
+        if self._SpinSkip:
+            self._SpinSkip -= 1
+            return 0, 0
+        # step through one iteration with the reference interpreter, recording
+        # the memory accesses, and count and trace the steps like run() does
+        Start = self._registers()
+        Memory = self.Memory
+        Recorder = _recorder(Memory)
+        Writes = self.Bus.Writes
+        Counts = self.Counts if self.Stats is not None and not self.StepCounted else None
+        Calls = self.Calls
+        n = c = 0
+        self.Memory = Recorder
+        try:
+            while n < min(SPIN_LIMIT, MaxInstructions) and c < MaxCycles:
+                Opcode = Memory[self.PC]
+                self.step()
+                n += 1
+                c += self.Cycles
+                if Counts is not None:
+                    Base = _TALLIED[Opcode]
+                    Counts[(Opcode << 2) + (0 if Base is None else self.Cycles - Base)] += 1
+                if Calls is not None and Opcode in CALLS:
+                    Calls.event(Opcode, self.PC, self.SP, c)
+                if self.PC == Start[0] or Memory[0xFE] == 127:
+                    break
+                if self.Pending and (self.NMIPending or not self.I):
+                    break
+        finally:
+            self.Memory = Memory
+        if (
+            self._registers() == Start
+            and self.Bus.Writes == Writes
+            and all(Memory[Address] == Value for Address, Value in Recorder.Writes.items())
+        ):
+            self.Spin = (Start, n, c, Recorder.Reads)
+            self._SpinBackoff = 0
+        else:
+            self._SpinBackoff = min(SPIN_BACKOFF, 2 * self._SpinBackoff or 1)
+            self._SpinSkip = self._SpinBackoff
+        return n, c
+
+    def wait(self, Timeout: float) -> bool:
+        """
+        Block while the CPU sits in a spin loop (see run()), until a device or
+        another thread writes one of the bytes the loop reads.
+
+        Args:
+            Timeout (float): Seconds to block at most.
+
+        Returns:
+            bool: False if the CPU still spins after the timeout.
+        """
+        End = time.perf_counter() + Timeout
+        while self.Spin is not None and not (self.Pending and (self.NMIPending or not self.I)) and self._spinning():
+            Left = End - time.perf_counter()
+            if Left <= 0:
+                return False
+            time.sleep(min(Left, SPIN_POLL))
+        return True
+
     def step(self):
         """
         Fetch and execute a single instruction.
@@ -263,14 +680,14 @@ class cpu6502:
             # ADC add with carry ---------------------------------
             case 0x69:  # ADC immediate
                 self.Cycles = 2
-                Operand = self.Memory[self.PC + 1]
+                Operand = self.Memory[(self.PC + 1) & 0xFFFF]
                 Result = self.A + Operand + self.C
                 self._ADCFlags(self.A, Operand, Result)
                 self.A = Result & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x65:  # ADC zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]  # address in zeropage
+                p = self.Memory[(self.PC + 1) & 0xFFFF]  # address in zeropage
                 Operand = self.Memory[p]
                 Result = self.A + Operand + self.C
                 self._ADCFlags(self.A, Operand, Result)
@@ -328,57 +745,57 @@ class cpu6502:
             # AND -------------------------------------------
             case 0x29:  # AND immediate
                 self.Cycles = 2
-                self.A = self.A & self.Memory[self.PC + 1]
-                self._updateNZ(self.A)
+                self.A = self.A & self.Memory[(self.PC + 1) & 0xFFFF]
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x25:  # AND zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 self.A = self.A & self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x35:  # AND zeropage,X
                 self.Cycles = 4
                 p = self._addressingZeropageX(self.PC + 1)
                 self.A = self.A & self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x2D:  # AND absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
                 self.A = self.A & self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
 
             case 0x3D:  # AND absolute,X
                 self.Cycles = 4
                 p = self._addressingAbsoluteX(self.PC + 1)
                 self.A = self.A & self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
 
             case 0x39:  # AND absolute,Y
                 self.Cycles = 4
                 p = self._addressingAbsoluteY(self.PC + 1)
                 self.A = self.A & self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
 
             case 0x21:  # AND indirect,X
                 self.Cycles = 6
                 p = self._addressingIndirectX(self.PC + 1)
                 self.A = self.A & self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x31:  # AND indirect,y
                 self.Cycles = 5
                 p = self._addressingIndirectY(self.PC + 1)
                 self.A = self.A & self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             # ASL Shift Left One Bit -----------------------
@@ -390,31 +807,31 @@ class cpu6502:
                 self.PC = (self.PC + 1) & 0xFFFF
             case 0x06:  # ASL zeropage
                 self.Cycles = 5
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 S = self.Memory[p] << 1
                 self._ASLFLags(S)
-                self.Memory[p] = S & 0xFF
+                self._write(p, S & 0xFF)
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x16:  # ASL zeropage,X
                 self.Cycles = 6
                 p = self._addressingZeropageX(self.PC + 1)
                 S = self.Memory[p] << 1
                 self._ASLFLags(S)
-                self.Memory[p] = S & 0xFF
+                self._write(p, S & 0xFF)
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x0E:  # ASL absolute
                 self.Cycles = 6
                 p = self._readShort(self.PC + 1)
                 S = self.Memory[p] << 1
                 self._ASLFLags(S)
-                self.Memory[p] = S & 0xFF
+                self._write(p, S & 0xFF)
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0x1E:  # ASL absolute,X
                 self.Cycles = 7
                 p = self._addressingAbsoluteX(self.PC + 1)
                 S = self.Memory[p] << 1
                 self._ASLFLags(S)
-                self.Memory[p] = S & 0xFF
+                self._write(p, S & 0xFF)
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # Branching ---------------------------------------------------
@@ -425,7 +842,7 @@ class cpu6502:
                 # on branch with cross page 4 cycles
                 if self.C == 0:
                     self.Cycles += 1
-                    ToJump = unsignedToSigned8bit(self.Memory[self.PC + 1])
+                    ToJump = unsignedToSigned8bit(self.Memory[(self.PC + 1) & 0xFFFF])
                     if self.PC & 0xFF00 != (self.PC + ToJump + 2) & 0xFF00:
                         self.Cycles += 1
                     self.PC += ToJump
@@ -437,7 +854,7 @@ class cpu6502:
                 # on branch with cross page 4 cycles
                 if self.C == 1:
                     self.Cycles += 1
-                    ToJump = unsignedToSigned8bit(self.Memory[self.PC + 1])
+                    ToJump = unsignedToSigned8bit(self.Memory[(self.PC + 1) & 0xFFFF])
                     if self.PC & 0xFF00 != (self.PC + ToJump + 2) & 0xFF00:
                         self.Cycles += 1
                     self.PC += ToJump
@@ -447,9 +864,9 @@ class cpu6502:
                 self.Cycles = 2
                 # on branch 3 cycles
                 # on branch with cross page 4 cycles
-                if self.Z == 1:
+                if not self.NZ & 0xFF:
                     self.Cycles += 1
-                    ToJump = unsignedToSigned8bit(self.Memory[self.PC + 1])
+                    ToJump = unsignedToSigned8bit(self.Memory[(self.PC + 1) & 0xFFFF])
                     if self.PC & 0xFF00 != (self.PC + ToJump + 2) & 0xFF00:
                         self.Cycles += 1
                     self.PC += ToJump
@@ -459,9 +876,9 @@ class cpu6502:
                 self.Cycles = 2
                 # on branch 3 cycles
                 # on branch with cross page 4 cycles
-                if self.N == 1:
+                if self.NZ & 0x180:
                     self.Cycles += 1
-                    ToJump = unsignedToSigned8bit(self.Memory[self.PC + 1])
+                    ToJump = unsignedToSigned8bit(self.Memory[(self.PC + 1) & 0xFFFF])
                     if self.PC & 0xFF00 != (self.PC + ToJump + 2) & 0xFF00:
                         self.Cycles += 1
                     self.PC += ToJump
@@ -471,9 +888,9 @@ class cpu6502:
                 self.Cycles = 2
                 # on branch 3 cycles
                 # on branch with cross page 4 cycles
-                if self.Z == 0:
+                if self.NZ & 0xFF:
                     self.Cycles += 1
-                    ToJump = unsignedToSigned8bit(self.Memory[self.PC + 1])
+                    ToJump = unsignedToSigned8bit(self.Memory[(self.PC + 1) & 0xFFFF])
                     if self.PC & 0xFF00 != (self.PC + ToJump + 2) & 0xFF00:
                         self.Cycles += 1
                     self.PC += ToJump
@@ -483,9 +900,9 @@ class cpu6502:
                 self.Cycles = 2
                 # on branch 3 cycles
                 # on branch with cross page 4 cycles
-                if self.N == 0:
+                if not self.NZ & 0x180:
                     self.Cycles += 1
-                    ToJump = unsignedToSigned8bit(self.Memory[self.PC + 1])
+                    ToJump = unsignedToSigned8bit(self.Memory[(self.PC + 1) & 0xFFFF])
                     if self.PC & 0xFF00 != (self.PC + ToJump + 2) & 0xFF00:
                         self.Cycles += 1
                     self.PC += ToJump
@@ -497,7 +914,7 @@ class cpu6502:
                 # on branch with cross page 4 cycles
                 if self.V == 0:
                     self.Cycles += 1
-                    ToJump = unsignedToSigned8bit(self.Memory[self.PC + 1])
+                    ToJump = unsignedToSigned8bit(self.Memory[(self.PC + 1) & 0xFFFF])
                     if self.PC & 0xFF00 != (self.PC + ToJump + 2) & 0xFF00:
                         self.Cycles += 1
                     self.PC += ToJump
@@ -509,7 +926,7 @@ class cpu6502:
                 # on branch with cross page 4 cycles
                 if self.V == 1:
                     self.Cycles += 1
-                    ToJump = unsignedToSigned8bit(self.Memory[self.PC + 1])
+                    ToJump = unsignedToSigned8bit(self.Memory[(self.PC + 1) & 0xFFFF])
                     if self.PC & 0xFF00 != (self.PC + ToJump + 2) & 0xFF00:
                         self.Cycles += 1
                     self.PC += ToJump
@@ -518,31 +935,23 @@ class cpu6502:
 
             case 0x24:  # BIT zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 M = self.Memory[p]
-                self.N = 1 if M & 0x80 else 0
                 self.V = 1 if M & 0x40 else 0
-                self.Z = 1 if M & self.A == 0 else 0
+                # Z from M & A, N from bit 7 of M (kept in bit 8)
+                self.NZ = (M & self.A) | (M & 0x80) << 1
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x2C:  # BIT absolute
                 self.Cycles = 4
                 M = self.Memory[self._readShort(self.PC + 1)]
-                self.N = 1 if M & 0x80 else 0
                 self.V = 1 if M & 0x40 else 0
-                self.Z = 1 if (M & self.A) == 0 else 0
+                # Z from M & A, N from bit 7 of M (kept in bit 8)
+                self.NZ = (M & self.A) | (M & 0x80) << 1
                 self.PC = (self.PC + 3) & 0xFFFF
 
             case 0x00:  # BRK
                 self.Cycles = 7
-                SR = 0
-                SR += self.N * (1 << 7)
-                SR += self.V * (1 << 6)
-                SR += 1 * (1 << 5)  # IDK chat said it's always 1 during break
-                SR += 1 * (1 << 4)  # self.B = 1
-                SR += self.D * (1 << 3)
-                SR += self.I * (1 << 2)
-                SR += self.Z * (1 << 1)
-                SR += self.C * (1 << 0)
+                SR = self.P | 0x10  # pushed with B set
                 self._push((self.PC + 2) >> 8)
                 self._push((self.PC + 2) & 0xFF)
                 self._push(SR)
@@ -571,144 +980,134 @@ class cpu6502:
             # CMP Compare Memory with Accumulator ------------------------------
             case 0xC9:  # CMP immediate
                 self.Cycles = 2
-                B = self.Memory[self.PC + 1]
+                B = self.Memory[(self.PC + 1) & 0xFFFF]
                 self.C = 1 if self.A >= B else 0
-                self.Z = 1 if self.A == B else 0
-                self.N = 1 if (self.A - B) & 0x80 else 0
+                self.NZ = (self.A - B) & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xC5:  # CMP zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 B = self.Memory[p]
                 self.C = 1 if self.A >= B else 0
-                self.Z = 1 if self.A == B else 0
-                self.N = 1 if (self.A - B) & 0x80 else 0
+                self.NZ = (self.A - B) & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xD5:  # CMP zeropage,x
                 self.Cycles = 4
                 p = self._addressingZeropageX(self.PC + 1)
                 B = self.Memory[p]
                 self.C = 1 if self.A >= B else 0
-                self.Z = 1 if self.A == B else 0
-                self.N = 1 if (self.A - B) & 0x80 else 0
+                self.NZ = (self.A - B) & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xCD:  # CMP absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
                 B = self.Memory[p]
                 self.C = 1 if self.A >= B else 0
-                self.Z = 1 if self.A == B else 0
-                self.N = 1 if (self.A - B) & 0x80 else 0
+                self.NZ = (self.A - B) & 0xFF
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0xDD:  # CMP absolute,X
                 self.Cycles = 4
                 p = self._addressingAbsoluteX(self.PC + 1)
                 B = self.Memory[p]
                 self.C = 1 if self.A >= B else 0
-                self.Z = 1 if self.A == B else 0
-                self.N = 1 if (self.A - B) & 0x80 else 0
+                self.NZ = (self.A - B) & 0xFF
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0xD9:  # CMP absolute,Y
                 self.Cycles = 4
                 p = self._addressingAbsoluteY(self.PC + 1)
                 B = self.Memory[p]
                 self.C = 1 if self.A >= B else 0
-                self.Z = 1 if self.A == B else 0
-                self.N = 1 if (self.A - B) & 0x80 else 0
+                self.NZ = (self.A - B) & 0xFF
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0xC1:  # CMP indirect,X
                 self.Cycles = 6
                 p = self._addressingIndirectX(self.PC + 1)
                 B = self.Memory[p]
                 self.C = 1 if self.A >= B else 0
-                self.Z = 1 if self.A == B else 0
-                self.N = 1 if (self.A - B) & 0x80 else 0
+                self.NZ = (self.A - B) & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xD1:  # CMP indirect,Y
                 self.Cycles = 5
                 p = self._addressingIndirectY(self.PC + 1)
                 B = self.Memory[p]
                 self.C = 1 if self.A >= B else 0
-                self.Z = 1 if self.A == B else 0
-                self.N = 1 if (self.A - B) & 0x80 else 0
+                self.NZ = (self.A - B) & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
 
             # CPX Compare Memory and X -------------------------
 
             case 0xE0:  # CPX immediate
                 self.Cycles = 2
-                B = self.Memory[self.PC + 1]
+                B = self.Memory[(self.PC + 1) & 0xFFFF]
                 self.C = 1 if self.X >= B else 0
-                self.Z = 1 if self.X == B else 0
-                self.N = 1 if (self.X - B) & 0x80 else 0
+                self.NZ = (self.X - B) & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xE4:  # CPX zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 B = self.Memory[p]
                 self.C = 1 if self.X >= B else 0
-                self.Z = 1 if self.X == B else 0
-                self.N = 1 if (self.X - B) & 0x80 else 0
+                self.NZ = (self.X - B) & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xEC:  # CPX absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
                 B = self.Memory[p]
                 self.C = 1 if self.X >= B else 0
-                self.Z = 1 if self.X == B else 0
-                self.N = 1 if (self.X - B) & 0x80 else 0
+                self.NZ = (self.X - B) & 0xFF
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # CPY Compare Memory and X -------------------------
             case 0xC0:  # CPY immediate
                 self.Cycles = 2
-                B = self.Memory[self.PC + 1]
+                B = self.Memory[(self.PC + 1) & 0xFFFF]
                 self.C = 1 if self.Y >= B else 0
-                self.Z = 1 if self.Y == B else 0
-                self.N = 1 if (self.Y - B) & 0x80 else 0
+                self.NZ = (self.Y - B) & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xC4:  # CPY zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 B = self.Memory[p]
                 self.C = 1 if self.Y >= B else 0
-                self.Z = 1 if self.Y == B else 0
-                self.N = 1 if (self.Y - B) & 0x80 else 0
+                self.NZ = (self.Y - B) & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xCC:  # CPY absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
                 B = self.Memory[p]
                 self.C = 1 if self.Y >= B else 0
-                self.Z = 1 if self.Y == B else 0
-                self.N = 1 if (self.Y - B) & 0x80 else 0
+                self.NZ = (self.Y - B) & 0xFF
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # DEC Decrement Memory by One -----------------
 
             case 0xC6:  # DEC zeropage
                 self.Cycles = 5
-                p = self.Memory[self.PC + 1]
-                self.Memory[p] = (self.Memory[p] - 1) & 0xFF
-                self._updateNZ(self.Memory[p])
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
+                Value = (self.Memory[p] - 1) & 0xFF
+                self._write(p, Value)
+                self.NZ = Value
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xD6:  # DEC zeropage,X
                 self.Cycles = 6
                 p = self._addressingZeropageX(self.PC + 1)
-                self.Memory[p] = (self.Memory[p] - 1) & 0xFF
-                self._updateNZ(self.Memory[p])
+                Value = (self.Memory[p] - 1) & 0xFF
+                self._write(p, Value)
+                self.NZ = Value
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xCE:  # DEC absolute
                 self.Cycles = 6
                 p = self._readShort(self.PC + 1)
-                self.Memory[p] = (self.Memory[p] - 1) & 0xFF
-                self._updateNZ(self.Memory[p])
+                Value = (self.Memory[p] - 1) & 0xFF
+                self._write(p, Value)
+                self.NZ = Value
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0xDE:  # DEC absolute,X
                 self.Cycles = 7
                 p = (self._readShort(self.PC + 1) + self.X) & 0xFFFF
-                self.Memory[p] = (self.Memory[p] - 1) & 0xFF
-                self._updateNZ(self.Memory[p])
+                Value = (self.Memory[p] - 1) & 0xFF
+                self._write(p, Value)
+                self.NZ = Value
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # --------------------------------------------------
@@ -716,69 +1115,69 @@ class cpu6502:
             case 0xCA:  # DEX Decreament X by one
                 self.Cycles = 2
                 self.X = (self.X - 1) & 0xFF
-                self._updateNZ(self.X)
+                self.NZ = self.X
                 self.PC = (self.PC + 1) & 0xFFFF
             case 0x88:  # DEY Decreament Y by one
                 self.Cycles = 2
                 self.Y = (self.Y - 1) & 0xFF
-                self._updateNZ(self.Y)
+                self.NZ = self.Y
                 self.PC = (self.PC + 1) & 0xFFFF
 
             # Copied 'AND' Section
             # EOR Exclusive-OR Memory with Accumulator -----------------
             case 0x49:  # EOR immediate
                 self.Cycles = 2
-                self.A = self.A ^ self.Memory[self.PC + 1]
-                self._updateNZ(self.A)
+                self.A = self.A ^ self.Memory[(self.PC + 1) & 0xFFFF]
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x45:  # EOR zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 self.A = self.A ^ self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x55:  # EOR zeropage,X
                 self.Cycles = 4
                 p = self._addressingZeropageX(self.PC + 1)
                 self.A = self.A ^ self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x4D:  # EOR absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
                 self.A = self.A ^ self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
 
             case 0x5D:  # EOR absolute,X
                 self.Cycles = 4
                 p = self._addressingAbsoluteX(self.PC + 1)
                 self.A = self.A ^ self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
 
             case 0x59:  # EOR absolute,Y
                 self.Cycles = 4
                 p = self._addressingAbsoluteY(self.PC + 1)
                 self.A = self.A ^ self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
 
             case 0x41:  # EOR indirect,X
                 self.Cycles = 6
                 p = self._addressingIndirectX(self.PC + 1)
                 self.A = self.A ^ self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x51:  # EOR indirect,y
                 self.Cycles = 5
                 p = self._addressingIndirectY(self.PC + 1)
                 self.A = self.A ^ self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             # Copied DEC section
@@ -786,27 +1185,31 @@ class cpu6502:
 
             case 0xE6:  # INC zeropage
                 self.Cycles = 5
-                p = self.Memory[self.PC + 1]
-                self.Memory[p] = (self.Memory[p] + 1) & 0xFF
-                self._updateNZ(self.Memory[p])
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
+                Value = (self.Memory[p] + 1) & 0xFF
+                self._write(p, Value)
+                self.NZ = Value
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xF6:  # INC zeropage,X
                 self.Cycles = 6
                 p = self._addressingZeropageX(self.PC + 1)
-                self.Memory[p] = (self.Memory[p] + 1) & 0xFF
-                self._updateNZ(self.Memory[p])
+                Value = (self.Memory[p] + 1) & 0xFF
+                self._write(p, Value)
+                self.NZ = Value
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xEE:  # INC absolute
                 self.Cycles = 6
                 p = self._readShort(self.PC + 1)
-                self.Memory[p] = (self.Memory[p] + 1) & 0xFF
-                self._updateNZ(self.Memory[p])
+                Value = (self.Memory[p] + 1) & 0xFF
+                self._write(p, Value)
+                self.NZ = Value
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0xFE:  # INC absolute,X
                 self.Cycles = 7
                 p = (self._readShort(self.PC + 1) + self.X) & 0xFFFF
-                self.Memory[p] = (self.Memory[p] + 1) & 0xFF
-                self._updateNZ(self.Memory[p])
+                Value = (self.Memory[p] + 1) & 0xFF
+                self._write(p, Value)
+                self.NZ = Value
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # --------------------------------------------------
@@ -814,12 +1217,12 @@ class cpu6502:
             case 0xE8:  # INX Increament X by one
                 self.Cycles = 2
                 self.X = (self.X + 1) & 0xFF
-                self._updateNZ(self.X)
+                self.NZ = self.X
                 self.PC = (self.PC + 1) & 0xFFFF
             case 0xC8:  # INY Increament Y by one
                 self.Cycles = 2
                 self.Y = (self.Y + 1) & 0xFF
-                self._updateNZ(self.Y)
+                self.NZ = self.Y
                 self.PC = (self.PC + 1) & 0xFFFF
 
             # JMP -------------------------------------------
@@ -830,8 +1233,8 @@ class cpu6502:
                 self.Cycles = 5
                 # p address of value where to jmp
                 # some hardware bug said by chat
-                pL = self.Memory[self.PC + 1]
-                pH = self.Memory[self.PC + 2]
+                pL = self.Memory[(self.PC + 1) & 0xFFFF]
+                pH = self.Memory[(self.PC + 2) & 0xFFFF]
                 PCL = self.Memory[pL + pH * (1 << 8)]
                 PCH = self.Memory[((pL + 1) & 0xFF) + pH * (1 << 8)]
                 self.PC = PCL + PCH * (1 << 8)
@@ -847,114 +1250,114 @@ class cpu6502:
             # LDA Load A with Memory
             case 0xA9:  # LDA immediate
                 self.Cycles = 2
-                self.A = self.Memory[self.PC + 1]
-                self._updateNZ(self.A)
+                self.A = self.Memory[(self.PC + 1) & 0xFFFF]
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xA5:  # LDA zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 self.A = self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xB5:  # LDA zeropage,X
                 self.Cycles = 4
                 p = self._addressingZeropageX(self.PC + 1)
                 self.A = self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xAD:  # LDA absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
                 self.A = self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0xBD:  # LDA absolute,X
                 self.Cycles = 4
                 p = self._addressingAbsoluteX(self.PC + 1)
                 self.A = self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0xB9:  # LDA absolute,Y
                 self.Cycles = 4
                 p = self._addressingAbsoluteY(self.PC + 1)
                 self.A = self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0xA1:  # LDA indirect,X
                 self.Cycles = 6
                 p = self._addressingIndirectX(self.PC + 1)
                 self.A = self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xB1:  # LDA indirect,Y
                 self.Cycles = 5
                 p = self._addressingIndirectY(self.PC + 1)
                 self.A = self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             # Copied LDA
             # LDX Load X with Memory
             case 0xA2:  # LDX immediate
                 self.Cycles = 2
-                self.X = self.Memory[self.PC + 1]
-                self._updateNZ(self.X)
+                self.X = self.Memory[(self.PC + 1) & 0xFFFF]
+                self.NZ = self.X
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xA6:  # LDX zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 self.X = self.Memory[p]
-                self._updateNZ(self.X)
+                self.NZ = self.X
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xB6:  # LDX zeropage,Y
                 self.Cycles = 4
                 p = self._addressingZeropageY(self.PC + 1)
                 self.X = self.Memory[p]
-                self._updateNZ(self.X)
+                self.NZ = self.X
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xAE:  # LDX absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
                 self.X = self.Memory[p]
-                self._updateNZ(self.X)
+                self.NZ = self.X
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0xBE:  # LDX absolute,Y
                 self.Cycles = 4
                 p = self._addressingAbsoluteY(self.PC + 1)
                 self.X = self.Memory[p]
-                self._updateNZ(self.X)
+                self.NZ = self.X
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # Copied LDX
             # LDY Load Y with Memory
             case 0xA0:  # LDY immediate
                 self.Cycles = 2
-                self.Y = self.Memory[self.PC + 1]
-                self._updateNZ(self.Y)
+                self.Y = self.Memory[(self.PC + 1) & 0xFFFF]
+                self.NZ = self.Y
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xA4:  # LDY zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 self.Y = self.Memory[p]
-                self._updateNZ(self.Y)
+                self.NZ = self.Y
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xB4:  # LDY zeropage,X
                 self.Cycles = 4
                 p = self._addressingZeropageX(self.PC + 1)
                 self.Y = self.Memory[p]
-                self._updateNZ(self.Y)
+                self.NZ = self.Y
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xAC:  # LDY absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
                 self.Y = self.Memory[p]
-                self._updateNZ(self.Y)
+                self.NZ = self.Y
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0xBC:  # LDY absolute,X
                 self.Cycles = 4
                 p = self._addressingAbsoluteX(self.PC + 1)
                 self.Y = self.Memory[p]
-                self._updateNZ(self.Y)
+                self.NZ = self.Y
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # LSR Shift Right
@@ -962,16 +1365,16 @@ class cpu6502:
                 self.Cycles = 2
                 self.C = self.A & 0x01
                 self.A = (self.A >> 1) & 0xFF
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 1) & 0xFFFF
             case 0x46:  # LSR zeropage
                 self.Cycles = 5
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 M = self.Memory[p]
                 self.C = M & 0x01
                 M = (M >> 1) & 0xFF
-                self._updateNZ(M)
-                self.Memory[p] = M
+                self.NZ = M & 0xFF
+                self._write(p, M)
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x56:  # LSR zeropage,X
                 self.Cycles = 6
@@ -979,8 +1382,8 @@ class cpu6502:
                 M = self.Memory[p]
                 self.C = M & 0x01
                 M = (M >> 1) & 0xFF
-                self._updateNZ(M)
-                self.Memory[p] = M
+                self.NZ = M & 0xFF
+                self._write(p, M)
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x4E:  # LSR absolute
                 self.Cycles = 6
@@ -988,8 +1391,8 @@ class cpu6502:
                 M = self.Memory[p]
                 self.C = M & 0x01
                 M = (M >> 1) & 0xFF
-                self._updateNZ(M)
-                self.Memory[p] = M
+                self.NZ = M & 0xFF
+                self._write(p, M)
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0x5E:  # LSR absolute,X
                 self.Cycles = 7
@@ -997,8 +1400,8 @@ class cpu6502:
                 M = self.Memory[p]
                 self.C = M & 0x01
                 M = (M >> 1) & 0xFF
-                self._updateNZ(M)
-                self.Memory[p] = M
+                self.NZ = M & 0xFF
+                self._write(p, M)
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # --------------------------------------------------------
@@ -1010,57 +1413,57 @@ class cpu6502:
             # ORA OR Memory with Accumulator -----------------
             case 0x09:  # ORA immediate
                 self.Cycles = 2
-                self.A = self.A | self.Memory[self.PC + 1]
-                self._updateNZ(self.A)
+                self.A = self.A | self.Memory[(self.PC + 1) & 0xFFFF]
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x05:  # ORA zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 self.A = self.A | self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x15:  # ORA zeropage,X
                 self.Cycles = 4
                 p = self._addressingZeropageX(self.PC + 1)
                 self.A = self.A | self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x0D:  # ORA absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
                 self.A = self.A | self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
 
             case 0x1D:  # ORA absolute,X
                 self.Cycles = 4
                 p = self._addressingAbsoluteX(self.PC + 1)
                 self.A = self.A | self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
 
             case 0x19:  # ORA absolute,Y
                 self.Cycles = 4
                 p = self._addressingAbsoluteY(self.PC + 1)
                 self.A = self.A | self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 3) & 0xFFFF
 
             case 0x01:  # ORA indirect,X
                 self.Cycles = 6
                 p = self._addressingIndirectX(self.PC + 1)
                 self.A = self.A | self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x11:  # ORA indirect,y
                 self.Cycles = 5
                 p = self._addressingIndirectY(self.PC + 1)
                 self.A = self.A | self.Memory[p]
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 2) & 0xFFFF
 
             # Stack operations -----------------------------------
@@ -1071,33 +1474,19 @@ class cpu6502:
 
             case 0x08:  # PHP Push Processor Status on Stack
                 self.Cycles = 3
-                SR = 0
-                SR += self.N * (1 << 7)
-                SR += self.V * (1 << 6)
-                SR += 1 * (1 << 5)  # IDK chat said it's always 1 during break
-                SR += 1 * (1 << 4)  # self.B = 1
-                SR += self.D * (1 << 3)
-                SR += self.I * (1 << 2)
-                SR += self.Z * (1 << 1)
-                SR += self.C * (1 << 0)
+                SR = self.P | 0x10  # pushed with B set
                 self._push(SR)
                 self.PC = (self.PC + 1) & 0xFFFF
 
             case 0x68:  # PLA Pull A from Stack
                 self.Cycles = 4
                 self.A = self._pull()
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 1) & 0xFFFF
 
             case 0x28:  # PLP Pull Processor Status from Stack
                 self.Cycles = 4
-                SR = self._pull()
-                self.C = (SR >> 0) & 0x1
-                self.Z = (SR >> 1) & 0x1
-                self.I = (SR >> 2) & 0x1
-                self.D = (SR >> 3) & 0x1
-                self.V = (SR >> 6) & 0x1
-                self.N = (SR >> 7) & 0x1
+                self.P = self._pull()
                 self.PC = (self.PC + 1) & 0xFFFF
 
             # ROL Rotate One Bit Left ---------------------------------
@@ -1106,16 +1495,16 @@ class cpu6502:
                 M = (self.A << 1) + self.C
                 self.C = M >> 8
                 self.A = M & 0xFF
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 1) & 0xFFFF
             case 0x26:  # ROL zeropage
                 self.Cycles = 5
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 M = self.Memory[p]
                 M = (M << 1) + self.C
                 self.C = M >> 8
-                self.Memory[p] = M & 0xFF
-                self._updateNZ(M)
+                self._write(p, M & 0xFF)
+                self.NZ = M & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x36:  # ROL zeropage,X
                 self.Cycles = 6
@@ -1123,8 +1512,8 @@ class cpu6502:
                 M = self.Memory[p]
                 M = (M << 1) + self.C
                 self.C = M >> 8
-                self.Memory[p] = M & 0xFF
-                self._updateNZ(M)
+                self._write(p, M & 0xFF)
+                self.NZ = M & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x2E:  # ROL absolute
                 self.Cycles = 6
@@ -1132,8 +1521,8 @@ class cpu6502:
                 M = self.Memory[p]
                 M = (M << 1) + self.C
                 self.C = M >> 8
-                self.Memory[p] = M & 0xFF
-                self._updateNZ(M)
+                self._write(p, M & 0xFF)
+                self.NZ = M & 0xFF
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0x3E:  # ROL absolute,X
                 self.Cycles = 7
@@ -1141,8 +1530,8 @@ class cpu6502:
                 M = self.Memory[p]
                 M = (M << 1) + self.C
                 self.C = M >> 8
-                self.Memory[p] = M & 0xFF
-                self._updateNZ(M)
+                self._write(p, M & 0xFF)
+                self.NZ = M & 0xFF
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # Copied ROL
@@ -1152,16 +1541,16 @@ class cpu6502:
                 M = (self.A >> 1) + (self.C << 7)
                 self.C = self.A & 0x1
                 self.A = M & 0xFF
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 1) & 0xFFFF
             case 0x66:  # ROR zeropage
                 self.Cycles = 5
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 M = self.Memory[p]
                 NM = (M >> 1) + (self.C << 7)
                 self.C = M & 0x1
-                self.Memory[p] = NM & 0xFF
-                self._updateNZ(NM)
+                self._write(p, NM & 0xFF)
+                self.NZ = NM
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x76:  # ROR zeropage,X
                 self.Cycles = 6
@@ -1169,8 +1558,8 @@ class cpu6502:
                 M = self.Memory[p]
                 NM = (M >> 1) + (self.C << 7)
                 self.C = M & 0x1
-                self.Memory[p] = NM & 0xFF
-                self._updateNZ(NM)
+                self._write(p, NM & 0xFF)
+                self.NZ = NM
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x6E:  # ROR absolute
                 self.Cycles = 6
@@ -1178,8 +1567,8 @@ class cpu6502:
                 M = self.Memory[p]
                 NM = (M >> 1) + (self.C << 7)
                 self.C = M & 0x1
-                self.Memory[p] = NM & 0xFF
-                self._updateNZ(NM)
+                self._write(p, NM & 0xFF)
+                self.NZ = NM
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0x7E:  # ROR absolute,X
                 self.Cycles = 7
@@ -1187,21 +1576,15 @@ class cpu6502:
                 M = self.Memory[p]
                 NM = (M >> 1) + (self.C << 7)
                 self.C = M & 0x1
-                self.Memory[p] = NM & 0xFF
-                self._updateNZ(NM)
+                self._write(p, NM & 0xFF)
+                self.NZ = NM
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # -----------------------------------------------------------
 
             case 0x40:  # RTI Return from Interrupt
                 self.Cycles = 6
-                SR = self._pull()
-                self.C = (SR >> 0) & 0x1
-                self.Z = (SR >> 1) & 0x1
-                self.I = (SR >> 2) & 0x1
-                self.D = (SR >> 3) & 0x1
-                self.V = (SR >> 6) & 0x1
-                self.N = (SR >> 7) & 0x1
+                self.P = self._pull()
                 PCL = self._pull()
                 PCH = self._pull()
                 self.PC = PCL + (PCH << 8)
@@ -1217,14 +1600,14 @@ class cpu6502:
 
             case 0xE9:  # SBC immediate
                 self.Cycles = 2
-                M = self.Memory[self.PC + 1]
+                M = self.Memory[(self.PC + 1) & 0xFFFF]
                 R = self.A - M - (1 - self.C)
                 self._SBCFlags(self.A, M, R)
                 self.A = R & 0xFF
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0xE5:  # SBC zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
                 M = self.Memory[p]
                 R = self.A - M - (1 - self.C)
                 self._SBCFlags(self.A, M, R)
@@ -1298,59 +1681,59 @@ class cpu6502:
 
             case 0x85:  # STA zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
-                self.Memory[p] = self.A & 0xFF
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
+                self._write(p, self.A & 0xFF)
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x95:  # STA zeropage,X
                 self.Cycles = 4
                 p = self._addressingZeropageX(self.PC + 1)
-                self.Memory[p] = self.A & 0xFF
+                self._write(p, self.A & 0xFF)
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x8D:  # STA absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
-                self.Memory[p] = self.A & 0xFF
+                self._write(p, self.A & 0xFF)
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0x9D:  # STA absolute,X
                 self.Cycles = 5
                 p = (self._readShort(self.PC + 1) + self.X) & 0xFFFF
-                self.Memory[p] = self.A & 0xFF
+                self._write(p, self.A & 0xFF)
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0x99:  # STA absolute,Y
                 self.Cycles = 5
                 p = (self._readShort(self.PC + 1) + self.Y) & 0xFFFF
-                self.Memory[p] = self.A & 0xFF
+                self._write(p, self.A & 0xFF)
                 self.PC = (self.PC + 3) & 0xFFFF
             case 0x81:  # STA indirect,X
                 self.Cycles = 6
                 p = self._addressingIndirectX(self.PC + 1)
-                self.Memory[p] = self.A & 0xFF
+                self._write(p, self.A & 0xFF)
                 self.PC = (self.PC + 2) & 0xFFFF
             case 0x91:  # STA indirect,Y
                 self.Cycles = 6
-                pp = self.Memory[self.PC + 1]
+                pp = self.Memory[(self.PC + 1) & 0xFFFF]
                 p = (self._readShort(pp) + self.Y) & 0xFFFF
-                self.Memory[p] = self.A & 0xFF
+                self._write(p, self.A & 0xFF)
                 self.PC = (self.PC + 2) & 0xFFFF
 
             # STX Store X in Memory--------------------------------
 
             case 0x86:  # STX zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
-                self.Memory[p] = self.X & 0xFF
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
+                self._write(p, self.X & 0xFF)
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x96:  # STX zeropage,Y
                 self.Cycles = 4
                 p = self._addressingZeropageY(self.PC + 1)
-                self.Memory[p] = self.X & 0xFF
+                self._write(p, self.X & 0xFF)
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x8E:  # STX absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
-                self.Memory[p] = self.X & 0xFF
+                self._write(p, self.X & 0xFF)
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # Copied STX
@@ -1359,20 +1742,20 @@ class cpu6502:
 
             case 0x84:  # STY zeropage
                 self.Cycles = 3
-                p = self.Memory[self.PC + 1]
-                self.Memory[p] = self.Y & 0xFF
+                p = self.Memory[(self.PC + 1) & 0xFFFF]
+                self._write(p, self.Y & 0xFF)
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x94:  # STY zeropage,X
                 self.Cycles = 4
                 p = self._addressingZeropageX(self.PC + 1)
-                self.Memory[p] = self.Y & 0xFF
+                self._write(p, self.Y & 0xFF)
                 self.PC = (self.PC + 2) & 0xFFFF
 
             case 0x8C:  # STY absolute
                 self.Cycles = 4
                 p = self._readShort(self.PC + 1)
-                self.Memory[p] = self.Y & 0xFF
+                self._write(p, self.Y & 0xFF)
                 self.PC = (self.PC + 3) & 0xFFFF
 
             # Transfer operations --------------------------------------
@@ -1380,22 +1763,22 @@ class cpu6502:
             case 0xAA:  # TAX Transfer A to X
                 self.Cycles = 2
                 self.X = self.A
-                self._updateNZ(self.X)
+                self.NZ = self.X
                 self.PC = (self.PC + 1) & 0xFFFF
             case 0xA8:  # TAY Transfer A to Y
                 self.Cycles = 2
                 self.Y = self.A
-                self._updateNZ(self.Y)
+                self.NZ = self.Y
                 self.PC = (self.PC + 1) & 0xFFFF
             case 0xBA:  # TSX Transfer Stack Pointer to X
                 self.Cycles = 2
                 self.X = self.SP
-                self._updateNZ(self.X)
+                self.NZ = self.X
                 self.PC = (self.PC + 1) & 0xFFFF
             case 0x8A:  # TXA Transfer X to A
                 self.Cycles = 2
                 self.A = self.X
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 1) & 0xFFFF
             case 0x9A:  # TXS Transfer X to Stack Pointer
                 self.Cycles = 2
@@ -1404,7 +1787,7 @@ class cpu6502:
             case 0x98:  # TYA Transfer Y to A
                 self.Cycles = 2
                 self.A = self.Y
-                self._updateNZ(self.A)
+                self.NZ = self.A
                 self.PC = (self.PC + 1) & 0xFFFF
             case _:
                 self.Cycles = 2
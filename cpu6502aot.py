@@ -0,0 +1,206 @@
+import hashlib
+import importlib.util
+import os
+
+from cpu6502jit import cpu6502jit
+from codegen import IMPORTS, blockSource, buildHandlers
+
+# bump whenever the generated code changes so old cache entries are not reused
+FORMAT = 4
+
+# default directory for the generated modules
+CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "cpu6502aot")
+
+
+def discover(Memory, Entries: list, Ports=None, Counted: bool = False) -> dict:
+    """
+    Find the code reachable from the entry points by following the control flow.
+
+    Branches, JMP and JSR targets, JSR return addresses and the BRK vector are
+    followed (but not the address after a BRK). Indirect jumps, RTS and RTI
+    can't be followed statically, code only reached through them is left to the
+    interpreter.
+
+    Args:
+        Memory: The memory image.
+        Entries (list): Addresses to start from.
+        Ports (bytearray): The bus' port map, None without devices.
+        Counted (bool): Translate the blocks with counters (see stats.py).
+
+    Returns:
+        dict: Entry address -> (block source, address after the block).
+    """
+    Blocks = {}
+    Pending = list(Entries)
+    while Pending:
+        Address = Pending.pop()
+        if Address in Blocks:
+            continue
+        Source, End, _, Successors = blockSource(Memory, Address, f"block{Address:04X}", Ports, Counted)
+        Blocks[Address] = (Source, End)
+        Pending += [Next for Next in Successors if Next not in Blocks]
+    return Blocks
+
+
+def moduleSource(Memory, Ports=None, Counted: bool = False) -> str:
+    """
+    Source of a module holding all the blocks reachable from the reset vector
+    and the NMI and IRQ vectors that are set (not zero).
+
+    Args:
+        Memory: The memory image.
+        Ports (bytearray): The bus' port map, None without devices.
+        Counted (bool): Translate the blocks with counters.
+
+    Returns:
+        str: Module source defining the blocks and a BLOCKS table
+            (entry address -> (function, address after the block)).
+    """
+    Reset, *Interrupts = [Memory[Vector] | Memory[Vector + 1] << 8 for Vector in (0xFFFC, 0xFFFA, 0xFFFE)]
+    # an unset (zero) NMI or IRQ vector would translate the zeroed page 0 as
+    # a BRK block and every zeropage store would then invalidate code
+    Blocks = discover(Memory, [Reset] + [Vector for Vector in Interrupts if Vector], Ports, Counted)
+    Lines = [f"# generated by cpu6502aot (format {FORMAT}), do not edit", IMPORTS, ""]
+    for Address in sorted(Blocks):
+        Lines.append(Blocks[Address][0])
+    Lines.append("BLOCKS = {")
+    for Address in sorted(Blocks):
+        Lines.append(f"    0x{Address:04X}: (block{Address:04X}, 0x{Blocks[Address][1]:04X}),")
+    Lines.append("}")
+    return "\n".join(Lines) + "\n"
+
+
+def load(Memory, Ports=None, CacheDirectory: str = None, Counted: bool = False):
+    """
+    Import the recompiled module for a memory image, generating it first if the
+    cache does not have it yet.
+
+    The module is stored as <CacheDirectory>/rom_<sha256>.py, where the hash
+    covers the image, the device ports, FORMAT and whether the blocks count,
+    so changed images never reuse stale code.
+
+    Args:
+        Memory: The memory image (as loaded, before anything runs).
+        Ports (bytearray): The bus' port map, None without devices.
+        CacheDirectory (str): Where to keep the modules, CACHE_DIRECTORY if None.
+        Counted (bool): Load the variant with counters.
+
+    Returns:
+        module: The imported module.
+    """
+    if CacheDirectory is None:
+        CacheDirectory = CACHE_DIRECTORY
+    Hash = hashlib.sha256(f"{FORMAT}:{'counted:' if Counted else ''}".encode() + bytes(Memory))
+    if Ports is not None:
+        Hash.update(Ports)
+    Hash = Hash.hexdigest()
+    Name = f"rom_{Hash}"
+    Path = os.path.join(CacheDirectory, Name + ".py")
+    if not os.path.exists(Path):
+        os.makedirs(CacheDirectory, exist_ok=True)
+        # write to a temporary file first so a crash never leaves half a module
+        Temporary = f"{Path}.{os.getpid()}.tmp"
+        with open(Temporary, "w") as f:
+            f.write(moduleSource(Memory, Ports, Counted))
+        os.replace(Temporary, Path)
+    Spec = importlib.util.spec_from_file_location(Name, Path)
+    Module = importlib.util.module_from_spec(Spec)
+    Spec.loader.exec_module(Module)
+    return Module
+
+
+def _interpret(cpu, M, Watch) -> tuple:
+    """
+    Stand-in block executing a single instruction with the table interpreter.
+    """
+    cpu.Handlers[M[cpu.PC]](cpu)
+    return cpu.Cycles, 1
+
+
+class cpu6502aot(cpu6502jit):
+    """
+    A 6502 CPU running a ROM recompiled ahead of time.
+
+    All code reachable from the vectors is translated into a Python module once
+    and cached on disk keyed by the image's hash, so later runs just import it.
+    Code that was not discovered, or that the guest rewrote (which invalidates
+    the affected blocks), is executed by the interpreter. The module is made
+    for the device mapping of the bus, if the mapping changes the module for
+    the new one is loaded.
+    """
+
+    # interpreter handlers that report stores into recompiled code and devices
+    Handlers = buildHandlers(Watched=True)
+    # the counting variant, built when statistics are first enabled
+    CountedHandlers = None
+
+    def __init__(self, memory, CacheDirectory: str = None):
+        """
+        Creates a 6502 CPU and loads (or generates) the recompiled module.
+
+        Args:
+            memory (bus): The bus (or memory) holding the image.
+            CacheDirectory (str): Where the modules are cached, CACHE_DIRECTORY if None.
+        """
+        super().__init__(memory, MaxBlocks=1 << 16)
+        self.CacheDirectory = CacheDirectory
+        # the image as loaded, the modules are made from it
+        self.Image = bytes(self.Memory)
+        self.Interpreted = 0
+        self._flush()
+
+    def _flush(self):
+        """
+        Drop all blocks and install the module for the current device mapping.
+        """
+        super()._flush()
+        self.Module = load(self.Image, self.Ports, self.CacheDirectory, self.Counted)
+        for Address, (Block, End) in self.Module.BLOCKS.items():
+            self._install(Address, Block, End)
+        self.Precompiled = len(self.Module.BLOCKS)
+
+    def invalidate(self):
+        """
+        Forget everything derived from the memory, the module is made from
+        the memory as it is now.
+        """
+        self.Image = bytes(self.Memory)
+        super().invalidate()
+
+    def enableStats(self):
+        """
+        Start collecting execution statistics, loads the module with counters.
+
+        Returns:
+            stats: The counters.
+        """
+        if cpu6502aot.CountedHandlers is None:
+            cpu6502aot.CountedHandlers = buildHandlers(Watched=True, Counted=True)
+        self.Handlers = cpu6502aot.CountedHandlers
+        return super().enableStats()
+
+    def _compile(self, Address: int):
+        """
+        Code outside the recompiled blocks is interpreted one instruction at a time.
+
+        Args:
+            Address (int): The address that has no block.
+
+        Returns:
+            function: A stand-in block running one instruction.
+        """
+        self.Interpreted += 1
+        return _interpret
+
+    def statistics(self) -> dict:
+        """
+        Block counters.
+
+        Returns:
+            dict: The cpu6502jit counters plus the number of precompiled blocks
+                and of instructions that had to be interpreted.
+        """
+        Statistics = super().statistics()
+        Statistics["Precompiled"] = self.Precompiled
+        Statistics["Interpreted"] = self.Interpreted
+        return Statistics
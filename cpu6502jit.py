@@ -0,0 +1,242 @@
+from collections import OrderedDict
+
+from cpu6502 import cpu6502
+from codegen import IMPORTS, blockSource
+
+
+class cpu6502jit(cpu6502):
+    """
+    A 6502 CPU that translates basic blocks into Python functions.
+
+    Every block is translated and compiled the first time it is entered and
+    cached by its entry address. Stores into a page holding translated code
+    invalidate the blocks covering the written address, and the cache keeps at
+    most MaxBlocks blocks, evicting the least recently used one. Blocks are
+    translated for the device mapping of the bus, when it changes the cache is
+    flushed.
+    """
+
+    def __init__(self, memory, MaxBlocks: int = 4096):
+        """
+        Creates a 6502 CPU with an empty block cache.
+
+        Args:
+            memory (bus): The bus, or just a memory (see cpu6502).
+            MaxBlocks (int): Maximum number of cached blocks.
+        """
+        super().__init__(memory)
+        self.MaxBlocks = MaxBlocks
+        # entry address -> compiled block, in least recently used order
+        self.Blocks = OrderedDict()
+        # entry address -> address after the block
+        self.BlockEnds = {}
+        # page -> entry addresses of blocks with code in the page
+        self.PageBlocks = [set() for _ in range(256)]
+        # bit 0: page holds translated code, bit 1: page holds devices
+        self.Watch = bytearray(256)
+        self.Generation = None
+        # blocks are translated with counters (see enableStats())
+        self.Counted = False
+        # counters
+        self.Hits = 0
+        self.Misses = 0
+        self.Invalidations = 0
+        self.Evictions = 0
+
+    def _pages(self, Start: int, End: int) -> list:
+        """
+        Pages touched by the bytes Start .. End - 1 (End may be above 0xFFFF).
+        """
+        return [Page & 0xFF for Page in range(Start >> 8, ((End - 1) >> 8) + 1)]
+
+    def _flush(self):
+        """
+        Drop all blocks and take over the current device mapping of the bus.
+        """
+        self.Blocks.clear()
+        self.BlockEnds.clear()
+        for Page in range(256):
+            self.PageBlocks[Page].clear()
+            self.Watch[Page] = self.IO[Page] << 1
+        self.Generation = self.Bus.Generation
+
+    def _compile(self, Address: int):
+        """
+        Translate and cache the block starting at an address.
+
+        Args:
+            Address (int): Entry address.
+
+        Returns:
+            function: The compiled block.
+        """
+        Source, End, _, _ = blockSource(self.Memory, Address, f"block{Address:04X}", self.Ports, self.Counted)
+        Namespace = {}
+        exec(compile(IMPORTS + "\n" + Source, f"<block {Address:04X}>", "exec"), Namespace)
+        Block = Namespace[f"block{Address:04X}"]
+        self._install(Address, Block, End)
+        return Block
+
+    def _install(self, Address: int, Block, End: int):
+        """
+        Put a compiled block into the cache, evicting the least recently used
+        block if the cache is full.
+
+        Args:
+            Address (int): Entry address.
+            Block (function): The compiled block.
+            End (int): Address after the block.
+        """
+        if len(self.Blocks) >= self.MaxBlocks:
+            self._remove(next(iter(self.Blocks)))
+            self.Evictions += 1
+        self.Blocks[Address] = Block
+        self.BlockEnds[Address] = End
+        for Page in self._pages(Address, End):
+            self.PageBlocks[Page].add(Address)
+            self.Watch[Page] |= 1
+
+    def _remove(self, Address: int):
+        """
+        Drop a block from the cache.
+
+        Args:
+            Address (int): Entry address of the block.
+        """
+        del self.Blocks[Address]
+        End = self.BlockEnds.pop(Address)
+        for Page in self._pages(Address, End):
+            self.PageBlocks[Page].discard(Address)
+            if not self.PageBlocks[Page]:
+                self.Watch[Page] &= ~1
+
+    def _stored(self, Address: int):
+        """
+        Called by blocks after a store to a watched page, invalidates the blocks
+        containing the written byte and passes stores to ports to the bus.
+
+        Args:
+            Address (int): The written address.
+        """
+        if self.Watch[Address >> 8] & 1:
+            self._invalidate(Address)
+        if self.Ports[Address]:
+            self.Bus.write(Address)
+
+    def _invalidate(self, Address: int):
+        """
+        Remove the blocks containing a byte.
+
+        Args:
+            Address (int): The changed address.
+        """
+        for Start in list(self.PageBlocks[Address >> 8]):
+            End = self.BlockEnds[Start]
+            if Start <= Address < End or Address + 0x10000 < End:
+                self._remove(Start)
+                self.Invalidations += 1
+
+    def enableStats(self):
+        """
+        Start collecting execution statistics, the blocks are translated again
+        with counters.
+
+        Returns:
+            stats: The counters.
+        """
+        Stats = super().enableStats()
+        if not self.Counted:
+            self.Counted = True
+            self._flush()
+        return Stats
+
+    def invalidate(self):
+        """
+        Forget everything derived from the memory, the blocks are translated
+        again.
+        """
+        super().invalidate()
+        self._flush()
+
+    def _write(self, Address: int, Value: int):
+        """
+        Store a byte for step(), invalidating the blocks containing it.
+
+        Args:
+            Address (int): The address to write to.
+            Value (int): The 8-bit value.
+        """
+        super()._write(Address, Value)
+        if self.Watch[Address >> 8] & 1:
+            self._invalidate(Address)
+
+    def _push(self, Value: int):
+        """
+        Push a byte for step(), invalidating the blocks containing it.
+
+        Args:
+            Value (int): Integer to push.
+        """
+        if self.Watch[0x01] & 1:
+            self._invalidate(0x100 + self.SP)
+        super()._push(Value)
+
+    def _batch(self, MaxInstructions: int, MaxCycles: int) -> tuple:
+        """
+        Execute compiled blocks until a budget is used up or Memory[0xFE] is 127.
+
+        The budgets are checked between blocks, so they may be overshot by up to
+        one block.
+
+        Args:
+            MaxInstructions (int): Maximum number of instructions.
+            MaxCycles (int): Maximum number of cycles.
+
+        Returns:
+            tuple: (instructions executed, cycles taken).
+        """
+        if self.Calls is not None:
+            # calls are traced by the batch interpreter, which doesn't keep
+            # the blocks up to date, so they are all dropped afterwards
+            self.Generation = None
+            return cpu6502._batch(self, MaxInstructions, MaxCycles)
+        if self.Generation != self.Bus.Generation:
+            self._flush()
+        M = self.Memory
+        Watch = self.Watch
+        Blocks = self.Blocks
+        n = 0
+        total = 0
+        hits = 0
+        # interrupts are taken by run() between blocks
+        while n < MaxInstructions and total < MaxCycles and M[0xFE] != 127:
+            if self.Pending and (self.NMIPending or not self.I):
+                break
+            PC = self.PC
+            Block = Blocks.get(PC)
+            if Block is None:
+                Block = self._compile(PC)
+                self.Misses += 1
+            else:
+                Blocks.move_to_end(PC)
+                hits += 1
+            Cycles, Count = Block(self, M, Watch)
+            total += Cycles
+            n += Count
+        self.Hits += hits
+        return n, total
+
+    def statistics(self) -> dict:
+        """
+        Block cache counters.
+
+        Returns:
+            dict: Hits, misses, invalidations, evictions and cached blocks.
+        """
+        return {
+            "Hits": self.Hits,
+            "Misses": self.Misses,
+            "Invalidations": self.Invalidations,
+            "Evictions": self.Evictions,
+            "Blocks": len(self.Blocks),
+        }
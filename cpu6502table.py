@@ -0,0 +1,37 @@
+from cpu6502 import cpu6502
+from codegen import buildHandlers
+
+
+class cpu6502table(cpu6502):
+    """
+    A 6502 CPU dispatching through a 256-entry handler table.
+
+    Behaves exactly like cpu6502 (whose step() stays the reference), but instead
+    of matching the opcode against every case it indexes a table of specialized
+    handlers generated once from the declarative description in opcodes.py.
+    """
+
+    # built once for all instances
+    Handlers = buildHandlers()
+    # the counting variant, built when statistics are first enabled
+    CountedHandlers = None
+    # the counting handlers count step() as well
+    StepCounted = True
+
+    def step(self):
+        """
+        Fetch and execute a single instruction.
+        """
+        self.Handlers[self.Memory[self.PC]](self)
+
+    def enableStats(self):
+        """
+        Start collecting execution statistics, step() counts as well.
+
+        Returns:
+            stats: The counters.
+        """
+        if cpu6502table.CountedHandlers is None:
+            cpu6502table.CountedHandlers = buildHandlers(Counted=True)
+        self.Handlers = cpu6502table.CountedHandlers
+        return super().enableStats()
@@ -0,0 +1,588 @@
+"""
+Many independent 6502s stepped in lockstep with NumPy.
+
+For fuzzing and parameter sweeps the instances mostly run the same code on
+different data. cpu6502vector keeps the registers of N instances as NumPy
+arrays and their memories as an N x 65536 uint8 matrix. Each step fetches the
+opcode every active instance is about to execute, groups the instances by it
+and runs the handler of that opcode once for the whole group, so the Python
+overhead of an instruction is paid once per group instead of once per
+instance. When the instances agree on the opcode (the usual case) there is a
+single group and no sorting at all.
+
+The handlers are built from the opcode table like the other engines and do
+what the generated ones do (see codegen.py), operand fetches wrap at 0xFFFF.
+The printer port is built in: storing 1 to 0xFE appends the character at 0xFF
+to the instance's Output and clears 0xFE, storing 127 halts the instance, which
+then drops out of the active mask. Other devices are not supported, their
+ports are plain memory.
+
+NumPy is needed by this module only, the other engines run without it.
+"""
+import numpy
+
+from flags import FLAGS_NZ, NZ_FROM_P, OVERFLOW
+from memory import SIZE
+from opcodes import MODES, decode
+
+_FLAGS_NZ = numpy.array(FLAGS_NZ, dtype=numpy.int64)
+_NZ_FROM_P = numpy.array(NZ_FROM_P, dtype=numpy.int64)
+_OVERFLOW = numpy.array(OVERFLOW, dtype=numpy.int64)
+
+# branch -> taken mask of the rows
+_BRANCHES = {
+    "BCC": lambda Cpu, R, B: Cpu.C[R] == 0,
+    "BCS": lambda Cpu, R, B: Cpu.C[R] != 0,
+    "BEQ": lambda Cpu, R, B: Cpu.NZ[R] & 0xFF == 0,
+    "BNE": lambda Cpu, R, B: Cpu.NZ[R] & 0xFF != 0,
+    "BMI": lambda Cpu, R, B: Cpu.NZ[R] & 0x180 != 0,
+    "BPL": lambda Cpu, R, B: Cpu.NZ[R] & 0x180 == 0,
+    "BVC": lambda Cpu, R, B: Cpu.V[R] == 0,
+    "BVS": lambda Cpu, R, B: Cpu.V[R] != 0,
+}
+
+
+def _status(Cpu, R, B):
+    """
+    The status register with B and bit 5 set, as pushed by PHP and BRK.
+    """
+    return _FLAGS_NZ[Cpu.NZ[R]] | Cpu.V[R] << 6 | 0x30 | Cpu.D[R] << 3 | Cpu.I[R] << 2 | Cpu.C[R]
+
+
+def _unpack(Cpu, R, B, Value):
+    """
+    Load the flags from a pulled status byte (B is ignored like in step()).
+    """
+    Cpu.C[R] = Value & 1
+    Cpu.NZ[R] = _NZ_FROM_P[Value]
+    Cpu.I[R] = (Value >> 2) & 1
+    Cpu.D[R] = (Value >> 3) & 1
+    Cpu.V[R] = (Value >> 6) & 1
+
+
+def _push(Cpu, R, B, Value):
+    SP = Cpu.SP[R]
+    Cpu.Flat[B + (0x100 | SP)] = Value
+    Cpu.SP[R] = (SP - 1) & 0xFF
+
+
+def _pull(Cpu, R, B):
+    SP = (Cpu.SP[R] + 1) & 0xFF
+    Cpu.SP[R] = SP
+    return _read(Cpu, B, 0x100 | SP)
+
+
+def _read(Cpu, B, Address):
+    return Cpu.Flat[B + Address].astype(numpy.int64)
+
+
+def _address(Mode: str, Penalty: bool):
+    """
+    The effective address function of an addressing mode.
+
+    Returns:
+        function: (cpu, rows, PC) -> (addresses, extra cycles).
+    """
+    def zp(Cpu, R, B, PC):
+        return _read(Cpu, B, (PC + 1) & 0xFFFF), 0
+
+    def indexedZp(Cpu, R, B, PC):
+        Index = Cpu.X[R] if Mode == "zpx" else Cpu.Y[R]
+        return (_read(Cpu, B, (PC + 1) & 0xFFFF) + Index) & 0xFF, 0
+
+    def absolute(Cpu, R, B, PC):
+        return _read(Cpu, B, (PC + 1) & 0xFFFF) | _read(Cpu, B, (PC + 2) & 0xFFFF) << 8, 0
+
+    def indexed(Cpu, R, B, PC):
+        Lo = _read(Cpu, B, (PC + 1) & 0xFFFF)
+        Index = Cpu.X[R] if Mode == "abx" else Cpu.Y[R]
+        Address = ((Lo | _read(Cpu, B, (PC + 2) & 0xFFFF) << 8) + Index) & 0xFFFF
+        # the high byte changes exactly when the low byte overflows
+        return Address, ((Lo + Index) >> 8) if Penalty else 0
+
+    def indexedIndirect(Cpu, R, B, PC):
+        Z = (_read(Cpu, B, (PC + 1) & 0xFFFF) + Cpu.X[R]) & 0xFF
+        return _read(Cpu, B, Z) | _read(Cpu, B, (Z + 1) & 0xFF) << 8, 0
+
+    def indirectIndexed(Cpu, R, B, PC):
+        Z = _read(Cpu, B, (PC + 1) & 0xFFFF)
+        # izy16 (STA) does not wrap the pointer in the zeropage
+        Next = (Z + 1) & (0xFFFF if Mode == "izy16" else 0xFF)
+        Base = _read(Cpu, B, Z) | _read(Cpu, B, Next) << 8
+        Y = Cpu.Y[R]
+        return (Base + Y) & 0xFFFF, (((Base & 0xFF) + Y) >> 8) if Penalty else 0
+
+    return {
+        "zp": zp,
+        "zpx": indexedZp,
+        "zpy": indexedZp,
+        "abs": absolute,
+        "abx": indexed,
+        "aby": indexed,
+        "izx": indexedIndirect,
+        "izy": indirectIndexed,
+        "izy16": indirectIndexed,
+    }[Mode]
+
+
+def _adc(Cpu, R, B, v):
+    A = Cpu.A[R]
+    r = A + v + Cpu.C[R]
+    Cpu.V[R] = _OVERFLOW[(A ^ v ^ r) & 0x1FF]
+    Cpu.C[R] = r >> 8
+    Cpu.A[R] = Cpu.NZ[R] = r & 0xFF
+
+
+def _sbc(Cpu, R, B, v):
+    # subtraction is addition of the inverted operand
+    _adc(Cpu, R, B, v ^ 0xFF)
+
+
+def _compare(Register: str):
+    def compare(Cpu, R, B, v):
+        r = getattr(Cpu, Register)[R] - v + 0x100
+        Cpu.C[R] = r >> 8
+        Cpu.NZ[R] = r & 0xFF
+
+    return compare
+
+
+def _logic(Function):
+    def logic(Cpu, R, B, v):
+        Cpu.A[R] = Cpu.NZ[R] = Function(Cpu.A[R], v)
+
+    return logic
+
+
+def _load(Register: str):
+    def load(Cpu, R, B, v):
+        getattr(Cpu, Register)[R] = Cpu.NZ[R] = v
+
+    return load
+
+
+def _bit(Cpu, R, B, v):
+    # Z from v & A, N from bit 7 of v kept in bit 8
+    Cpu.V[R] = (v >> 6) & 1
+    Cpu.NZ[R] = (v & Cpu.A[R]) | (v & 0x80) << 1
+
+
+# operations reading an operand
+_READS = {
+    "ADC": _adc,
+    "SBC": _sbc,
+    "AND": _logic(numpy.bitwise_and),
+    "ORA": _logic(numpy.bitwise_or),
+    "EOR": _logic(numpy.bitwise_xor),
+    "CMP": _compare("A"),
+    "CPX": _compare("X"),
+    "CPY": _compare("Y"),
+    "BIT": _bit,
+    "LDA": _load("A"),
+    "LDX": _load("X"),
+    "LDY": _load("Y"),
+}
+
+# operations storing a register
+_STORES = {"STA": "A", "STX": "X", "STY": "Y"}
+
+
+def _asl(Cpu, R, B, v):
+    r = v << 1
+    Cpu.C[R] = r >> 8
+    return r & 0xFF
+
+
+def _lsr(Cpu, R, B, v):
+    Cpu.C[R] = v & 1
+    return v >> 1
+
+
+def _rol(Cpu, R, B, v):
+    r = v << 1 | Cpu.C[R]
+    Cpu.C[R] = r >> 8
+    return r & 0xFF
+
+
+def _ror(Cpu, R, B, v):
+    r = v >> 1 | Cpu.C[R] << 7
+    Cpu.C[R] = v & 1
+    return r
+
+
+# read-modify-write operations, return the result (N and Z are set from it)
+_MODIFIES = {
+    "ASL": _asl,
+    "LSR": _lsr,
+    "ROL": _rol,
+    "ROR": _ror,
+    "INC": lambda Cpu, R, B, v: (v + 1) & 0xFF,
+    "DEC": lambda Cpu, R, B, v: (v - 1) & 0xFF,
+}
+
+
+def _flag(Name: str, Value: int):
+    def flag(Cpu, R, B):
+        getattr(Cpu, Name)[R] = Value
+
+    return flag
+
+
+def _transfer(Source: str, Target: str, Flags: bool = True):
+    def transfer(Cpu, R, B):
+        Value = getattr(Cpu, Source)[R]
+        getattr(Cpu, Target)[R] = Value
+        if Flags:
+            Cpu.NZ[R] = Value
+
+    return transfer
+
+
+def _count(Register: str, Step: int):
+    def count(Cpu, R, B):
+        Value = (getattr(Cpu, Register)[R] + Step) & 0xFF
+        getattr(Cpu, Register)[R] = Cpu.NZ[R] = Value
+
+    return count
+
+
+def _pla(Cpu, R, B):
+    Cpu.A[R] = Cpu.NZ[R] = _pull(Cpu, R, B)
+
+
+# implied operations that just fall through to the next instruction
+_IMPLIED = {
+    "CLC": _flag("C", 0),
+    "CLD": _flag("D", 0),
+    "CLI": _flag("I", 0),
+    "CLV": _flag("V", 0),
+    "SEC": _flag("C", 1),
+    "SED": _flag("D", 1),
+    "SEI": _flag("I", 1),
+    "DEX": _count("X", -1),
+    "DEY": _count("Y", -1),
+    "INX": _count("X", 1),
+    "INY": _count("Y", 1),
+    "TAX": _transfer("A", "X"),
+    "TAY": _transfer("A", "Y"),
+    "TSX": _transfer("SP", "X"),
+    "TXA": _transfer("X", "A"),
+    "TXS": _transfer("X", "SP", Flags=False),
+    "TYA": _transfer("Y", "A"),
+    "NOP": lambda Cpu, R, B: None,
+    "PHA": lambda Cpu, R, B: _push(Cpu, R, B, Cpu.A[R]),
+    "PHP": lambda Cpu, R, B: _push(Cpu, R, B, _status(Cpu, R, B)),
+    "PLA": _pla,
+    "PLP": lambda Cpu, R, B: _unpack(Cpu, R, B, _pull(Cpu, R, B)),
+}
+
+
+def _handler(Opcode: int):
+    """
+    Build the handler of an opcode: (cpu, rows) executes it for the rows.
+    """
+    Operation, Mode, Base, Penalty = decode(Opcode)
+    Length = MODES[Mode]
+
+    if Operation in _IMPLIED:
+        Implied = _IMPLIED[Operation]
+
+        def implied(Cpu, R, B):
+            Implied(Cpu, R, B)
+            Cpu.PC[R] = (Cpu.PC[R] + Length) & 0xFFFF
+            Cpu.Cycles[R] += Base
+
+        return implied
+
+    if Operation in _BRANCHES:
+        Taken = _BRANCHES[Operation]
+
+        def branch(Cpu, R, B):
+            PC = Cpu.PC[R]
+            Target = PC + 2 + ((_read(Cpu, B, (PC + 1) & 0xFFFF) ^ 0x80) - 0x80)
+            Take = Taken(Cpu, R, B)
+            Extra = numpy.where(Take, numpy.where((PC ^ Target) & 0xFF00, 2, 1), 0)
+            Cpu.PC[R] = numpy.where(Take, Target & 0xFFFF, (PC + 2) & 0xFFFF)
+            Cpu.Cycles[R] += Base + Extra
+
+        return branch
+
+    match Operation:
+        case "JMP" if Mode == "abs":
+            Absolute = _address("abs", False)
+
+            def jump(Cpu, R, B):
+                Cpu.PC[R] = Absolute(Cpu, R, B, Cpu.PC[R])[0]
+                Cpu.Cycles[R] += Base
+
+            return jump
+        case "JMP":
+
+            def jumpIndirect(Cpu, R, B):
+                PC = Cpu.PC[R]
+                l = _read(Cpu, B, (PC + 1) & 0xFFFF)
+                h = _read(Cpu, B, (PC + 2) & 0xFFFF) << 8
+                # the pointer does not cross a page (6502 bug)
+                Cpu.PC[R] = _read(Cpu, B, l | h) | _read(Cpu, B, ((l + 1) & 0xFF) | h) << 8
+                Cpu.Cycles[R] += Base
+
+            return jumpIndirect
+        case "JSR":
+            Absolute = _address("abs", False)
+
+            def call(Cpu, R, B):
+                PC = Cpu.PC[R]
+                Return = PC + 2
+                _push(Cpu, R, B, (Return >> 8) & 0xFF)
+                _push(Cpu, R, B, Return & 0xFF)
+                Cpu.PC[R] = Absolute(Cpu, R, B, PC)[0]
+                Cpu.Cycles[R] += Base
+
+            return call
+        case "RTS":
+
+            def ret(Cpu, R, B):
+                l = _pull(Cpu, R, B)
+                h = _pull(Cpu, R, B)
+                Cpu.PC[R] = ((l | h << 8) + 1) & 0xFFFF
+                Cpu.Cycles[R] += Base
+
+            return ret
+        case "RTI":
+
+            def retInterrupt(Cpu, R, B):
+                _unpack(Cpu, R, B, _pull(Cpu, R, B))
+                l = _pull(Cpu, R, B)
+                h = _pull(Cpu, R, B)
+                Cpu.PC[R] = l | h << 8
+                Cpu.Cycles[R] += Base
+
+            return retInterrupt
+        case "BRK":
+
+            def interrupt(Cpu, R, B):
+                Return = Cpu.PC[R] + 2
+                _push(Cpu, R, B, (Return >> 8) & 0xFF)
+                _push(Cpu, R, B, Return & 0xFF)
+                _push(Cpu, R, B, _status(Cpu, R, B))
+                Cpu.I[R] = 1
+                Cpu.PC[R] = _read(Cpu, B, 0xFFFE) | _read(Cpu, B, 0xFFFF) << 8
+                Cpu.Cycles[R] += Base
+
+            return interrupt
+
+    if Operation in _READS:
+        Read = _READS[Operation]
+        if Mode == "imm":
+
+            def readImmediate(Cpu, R, B):
+                PC = Cpu.PC[R]
+                Read(Cpu, R, B, _read(Cpu, B, (PC + 1) & 0xFFFF))
+                Cpu.PC[R] = (PC + Length) & 0xFFFF
+                Cpu.Cycles[R] += Base
+
+            return readImmediate
+        Address = _address(Mode, Penalty)
+
+        def read(Cpu, R, B):
+            PC = Cpu.PC[R]
+            Where, Extra = Address(Cpu, R, B, PC)
+            Read(Cpu, R, B, _read(Cpu, B, Where))
+            Cpu.PC[R] = (PC + Length) & 0xFFFF
+            Cpu.Cycles[R] += Base + Extra
+
+        return read
+
+    if Operation in _STORES:
+        Register = _STORES[Operation]
+        Address = _address(Mode, Penalty)
+
+        def store(Cpu, R, B):
+            PC = Cpu.PC[R]
+            Where, Extra = Address(Cpu, R, B, PC)
+            Cpu._store(B, Where, getattr(Cpu, Register)[R])
+            Cpu.PC[R] = (PC + Length) & 0xFFFF
+            Cpu.Cycles[R] += Base + Extra
+
+        return store
+
+    if Operation in _MODIFIES:
+        Modify = _MODIFIES[Operation]
+        if Mode == "acc":
+
+            def modifyAccumulator(Cpu, R, B):
+                Cpu.A[R] = Cpu.NZ[R] = Modify(Cpu, R, B, Cpu.A[R])
+                Cpu.PC[R] = (Cpu.PC[R] + Length) & 0xFFFF
+                Cpu.Cycles[R] += Base
+
+            return modifyAccumulator
+        Address = _address(Mode, Penalty)
+
+        def modify(Cpu, R, B):
+            PC = Cpu.PC[R]
+            Where, Extra = Address(Cpu, R, B, PC)
+            Result = Modify(Cpu, R, B, _read(Cpu, B, Where))
+            Cpu.NZ[R] = Result
+            Cpu._store(B, Where, Result)
+            Cpu.PC[R] = (PC + Length) & 0xFFFF
+            Cpu.Cycles[R] += Base + Extra
+
+        return modify
+
+    raise ValueError(f"unknown operation {Operation}")
+
+
+class cpu6502vector:
+    """
+    N 6502s stepped together.
+
+    Attributes:
+        Count (int): Number of instances.
+        M (numpy.ndarray): N x 65536 uint8, the memories.
+        Flat (numpy.ndarray): M as one array, instance i's byte a at
+            i << 16 | a. The handlers index it, a two dimensional fancy index
+            costs several times more.
+        PC, A, X, Y, SP, NZ, V, D, I, C (numpy.ndarray): The registers and
+            flags of every instance (int64, NZ as in flags.py).
+        Cycles (numpy.ndarray): Cycles every instance ran in total.
+        Instructions (numpy.ndarray): Instructions every instance ran.
+        Active (numpy.ndarray): bool, False once an instance halted (or
+            when cleared to leave an instance out).
+        Output (list): bytearray of printer output per instance.
+    """
+
+    # opcode -> handler, built once for all instances
+    Handlers = [_handler(Opcode) for Opcode in range(256)]
+
+    def __init__(self, Images, Count: int = None):
+        """
+        Creates the instances, every one starting at its reset vector.
+
+        Args:
+            Images: One 64 KiB image for all instances (Count of them), a list
+                of images or an N x 65536 array.
+            Count (int): Number of instances sharing a single image.
+        """
+        if Count is not None:
+            self.M = numpy.tile(numpy.frombuffer(bytes(Images), dtype=numpy.uint8), (Count, 1))
+        else:
+            self.M = numpy.array([numpy.frombuffer(bytes(Image), dtype=numpy.uint8) for Image in Images])
+        if self.M.ndim != 2 or self.M.shape[1] != SIZE:
+            raise ValueError(f"images have to be {SIZE} bytes")
+        self.Count = len(self.M)
+        self.Flat = self.M.reshape(-1)
+        self._Indices = numpy.arange(self.Count, dtype=numpy.int64)
+        # offset of every instance's memory in Flat
+        self._Bases = self._Indices << 16
+        Zeros = lambda: numpy.zeros(self.Count, dtype=numpy.int64)
+        self.PC = self.M[:, 0xFFFC].astype(numpy.int64) | self.M[:, 0xFFFD].astype(numpy.int64) << 8
+        self.A, self.X, self.Y = Zeros(), Zeros(), Zeros()
+        self.SP = Zeros() + 0xFF
+        self.NZ = Zeros() + 1
+        self.V, self.D, self.I, self.C = Zeros(), Zeros(), Zeros(), Zeros()
+        self.Cycles = Zeros()
+        self.Instructions = Zeros()
+        self.Active = self.M[:, 0xFE] != 127
+        self.Output = [bytearray() for _ in range(self.Count)]
+
+    def _store(self, B, Address, Value):
+        """
+        Store bytes for the rows at offsets B, handling the printer port at 0xFE.
+        """
+        self.Flat[B + Address] = Value
+        Port = Address == 0xFE
+        if not Port.any():
+            return
+        for Base, Stored in zip(B[Port].tolist(), Value[Port].tolist()):
+            if Stored == 1:
+                self.Output[Base >> 16].append(self.Flat[Base | 0xFF])
+                self.Flat[Base | 0xFE] = 0
+            elif Stored == 127:
+                self.Active[Base >> 16] = False
+
+    def _active(self) -> numpy.ndarray:
+        """
+        Indices of the active instances.
+        """
+        return self._Indices if self.Active.all() else numpy.flatnonzero(self.Active)
+
+    def step(self, Rows=None):
+        """
+        Execute one instruction on every active instance (or the given rows).
+
+        Args:
+            Rows (numpy.ndarray): Indices of the instances to step, all active
+                ones if None.
+        """
+        if Rows is None:
+            Rows = self._active()
+        if not len(Rows):
+            return
+        if len(Rows) == self.Count:
+            # all of them: slices index the registers without a copy
+            R, B = slice(None), self._Bases
+        else:
+            R, B = Rows, Rows << 16
+        Opcodes = self.Flat[B + self.PC[R]]
+        First = Opcodes[0]
+        if (Opcodes == First).all():
+            self.Handlers[First](self, R, B)
+        else:
+            Order = numpy.argsort(Opcodes, kind="stable")
+            Sorted = Opcodes[Order]
+            for Group in numpy.split(Order, numpy.flatnonzero(Sorted[1:] != Sorted[:-1]) + 1):
+                self.Handlers[Opcodes[Group[0]]](self, Rows[Group], B[Group])
+        self.Instructions[R] += 1
+
+    def run(self, MaxInstructions: int = None, MaxCycles: int = None) -> int:
+        """
+        Step the instances until all halted or used up their budgets.
+
+        Args:
+            MaxInstructions (int): Instructions per instance, None for no limit.
+            MaxCycles (int): Cycles per instance (the last instruction may
+                overshoot it), None for no limit.
+
+        Returns:
+            int: Steps taken.
+        """
+        Limit = None if MaxCycles is None else self.Cycles + MaxCycles
+        Steps = 0
+        while MaxInstructions is None or Steps < MaxInstructions:
+            R = self._active()
+            if Limit is not None:
+                R = R[self.Cycles[R] < Limit[R]]
+            if not len(R):
+                break
+            self.step(R)
+            Steps += 1
+        return Steps
+
+    @property
+    def P(self) -> numpy.ndarray:
+        """
+        The packed status registers NV1BDIZC (B clear).
+        """
+        return _FLAGS_NZ[self.NZ] | self.V << 6 | 0x20 | self.D << 3 | self.I << 2 | self.C
+
+    def registers(self, Index: int) -> dict:
+        """
+        The registers of one instance.
+
+        Args:
+            Index (int): The instance.
+
+        Returns:
+            dict: PC, A, X, Y, SP, P, Cycles and Instructions.
+        """
+        Registers = {Name: int(getattr(self, Name)[Index]) for Name in ("PC", "A", "X", "Y", "SP")}
+        Registers["P"] = int(self.P[Index])
+        Registers["Cycles"] = int(self.Cycles[Index])
+        Registers["Instructions"] = int(self.Instructions[Index])
+        return Registers
+
+    def output(self, Index: int) -> str:
+        """
+        What an instance printed.
+        """
+        return self.Output[Index].decode("latin-1")
@@ -0,0 +1,152 @@
+"""
+Running the CPU in a process of its own.
+
+The guest memory is a multiprocessing.shared_memory block, the CPU process
+attaches to it and the display in the parent reads it in place. The printer
+lives in the CPU process so the guest never waits on the parent. The parent
+stops the CPU with an event (window closed), the CPU process ends by itself
+when the program halts (0xFE == 127), which the parent sees in the memory.
+"""
+import multiprocessing
+import sys
+
+from bus import bus
+from engines import create
+from governor import governor
+from memory import memory
+from printer import printer
+import snapshot
+
+
+def _main(
+    Name: str,
+    Engine: str,
+    Output: str,
+    Batch: int,
+    Frequency,
+    Stats: bool,
+    Snapshot,
+    SaveSnapshot,
+    Stop,
+    Turbo,
+    Instructions,
+    Cycles,
+):
+    """
+    Body of the CPU process.
+    """
+    Memory = memory("shared", Name=Name)
+    Bus = bus(Memory)
+    Printer = printer(Bus, Buffered=True, Output=open(Output, "w") if Output else None)
+    Cpu = create(Engine, Bus)
+    if Snapshot is not None:
+        snapshot.restore(Cpu, Snapshot)
+    if Stats:
+        Cpu.enableStats()
+    Governor = governor(Frequency)
+    M = Cpu.Memory
+    while M[0xFE] != 127 and not Stop.is_set():
+        Governor.setTurbo(bool(Turbo.value))
+        n, c = Cpu.run(MaxInstructions=Batch, MaxCycles=Governor.budget())
+        Instructions.value += n
+        Cycles.value += c
+        Printer.update()
+        Governor.account(c)
+        if Governor.Turbo and Cpu.Spin is not None:
+            # unthrottled the spin loop was fast-forwarded, block until it's over
+            Cpu.wait(Governor.Slice)
+    Printer.flush()
+    if Output:
+        Printer.Output.close()
+    if SaveSnapshot:
+        Counted = (0, 0) if Snapshot is None else (Snapshot["Instructions"], Snapshot["Clock"])
+        snapshot.save(SaveSnapshot, Cpu, Counted[0] + Instructions.value, Counted[1] + Cycles.value)
+    if Stats:
+        print(Cpu.Stats.report(), file=sys.stderr)
+    del Cpu, Bus, M
+    Memory.close()
+
+
+class cpuprocess:
+    """
+    A CPU running in a child process on a shared memory.
+
+    Attributes:
+        Instructions: Shared count of executed instructions (.value).
+        Cycles: Shared count of cycles (.value).
+        Turbo: Shared flag (.value), set to run unthrottled.
+    """
+
+    def __init__(
+        self,
+        Memory,
+        Engine: str = "table",
+        Output: str = None,
+        Batch: int = 10000,
+        Frequency: float = None,
+        Stats: bool = False,
+        Snapshot: dict = None,
+        SaveSnapshot: str = None,
+    ):
+        """
+        Prepare the process, start() starts it.
+
+        Args:
+            Memory (memory): A memory on the "shared" backend holding the image.
+            Engine (str): The engine to run (see engines.py).
+            Output (str): File for the printer output, stdout if None.
+            Batch (int): Instructions per run() call, the stop event is checked
+                between them.
+            Frequency (float): Target clock rate in Hz (see governor.py), None
+                to run unthrottled.
+            Stats (bool): Collect execution statistics (see stats.py), the
+                process prints the report to stderr when it ends.
+            Snapshot (dict): Save state to start from (see snapshot.load()),
+                its image already in Memory.
+            SaveSnapshot (str): File the process writes a save state to when
+                it ends.
+        """
+        # forked, main.py is a script a spawned process would run again, so
+        # start() has to come before pygame is initialized
+        Context = multiprocessing.get_context("fork")
+        self.Stop = Context.Event()
+        self.Instructions = Context.Value("q", 0, lock=False)
+        self.Cycles = Context.Value("q", 0, lock=False)
+        self.Turbo = Context.Value("b", Frequency is None, lock=False)
+        self.Process = Context.Process(
+            target=_main,
+            args=(
+                Memory.Shared.name,
+                Engine,
+                Output,
+                Batch,
+                Frequency,
+                Stats,
+                Snapshot,
+                SaveSnapshot,
+                self.Stop,
+                self.Turbo,
+                self.Instructions,
+                self.Cycles,
+            ),
+            daemon=True,
+        )
+
+    def start(self):
+        """
+        Start the CPU process.
+        """
+        self.Process.start()
+
+    def alive(self) -> bool:
+        """
+        Whether the CPU process is still running.
+        """
+        return self.Process.is_alive()
+
+    def stop(self):
+        """
+        Ask the CPU process to stop after its current batch and wait for it.
+        """
+        self.Stop.set()
+        self.Process.join()
@@ -0,0 +1,406 @@
+"""
+Lockstep differential testing of the engines against the reference step().
+
+Two CPUs run side by side on copies of the same image, each on its own bus
+with a printer writing into a string. The candidate advances by one unit, a
+single instruction for the step() engines and the batch interpreter, a whole
+block for the JIT and AOT engines, and the reference steps as many
+instructions. After every unit the registers, the packed flags, the cycles
+and the whole memory must agree.
+
+The first divergence is shrunk to a minimal reproducer: the state right
+before the diverging unit, with as much of the memory zeroed and as many
+registers reset as possible while the engines still disagree.
+
+    python difftest.py example3/main.bin --candidate jit --instructions 1000000
+    python difftest.py --random 500 --length 200 --candidate run jit aot
+    python difftest.py --replay reproducer.json --candidate jit
+"""
+import argparse
+import io
+import json
+import random
+import sys
+import tempfile
+
+from bus import bus
+from memory import memory
+from opcodes import disassemble
+from printer import printer
+
+# "step" and "table" are stepped, the others run(), "run" is the batch
+# interpreter of the table engine
+DIFF_ENGINES = ("step", "table", "run", "jit", "aot")
+# engines advancing exactly one instruction per unit, usable as reference
+STEPPED = ("step", "table", "run")
+# compared after every unit, P is the packed status register
+REGISTERS = ("PC", "A", "X", "Y", "SP", "P")
+# what the shrinker resets the registers to
+_DEFAULTS = {"A": 0, "X": 0, "Y": 0, "SP": 0xFF, "P": 0x20}
+
+
+def machine(Engine: str, Image: bytes, Registers: dict = None, CacheDirectory: str = None):
+    """
+    A CPU of an engine on its own copy of an image, spin detection off.
+
+    Args:
+        Engine (str): One of DIFF_ENGINES.
+        Image (bytes): 64 KiB image.
+        Registers (dict): Register name (REGISTERS) -> value, the reset state
+            if None.
+        CacheDirectory (str): Module cache of the AOT engine.
+
+    Returns:
+        cpu6502: The CPU.
+    """
+    Memory = memory("bytearray")
+    Memory.load(Image)
+    Bus = bus(Memory)
+    printer(Bus, Output=io.StringIO())
+    match Engine:
+        case "step":
+            from cpu6502 import cpu6502
+
+            Cpu = cpu6502(Bus)
+        case "table" | "run":
+            from cpu6502table import cpu6502table
+
+            Cpu = cpu6502table(Bus)
+        case "jit":
+            from cpu6502jit import cpu6502jit
+
+            Cpu = cpu6502jit(Bus)
+        case "aot":
+            from cpu6502aot import cpu6502aot
+
+            Cpu = cpu6502aot(Bus, CacheDirectory=CacheDirectory)
+        case _:
+            raise ValueError(f"unknown engine {Engine}")
+    Cpu.SpinDetection = False
+    for Name, Value in (Registers or {}).items():
+        setattr(Cpu, Name, Value)
+    return Cpu
+
+
+def state(Cpu) -> dict:
+    """
+    The compared registers of a CPU.
+    """
+    return {Name: getattr(Cpu, Name) for Name in REGISTERS}
+
+
+def _advance(Engine: str, Cpu) -> tuple:
+    """
+    Advance a CPU by one unit.
+
+    Returns:
+        tuple: (instructions, cycles).
+    """
+    if Engine in ("step", "table"):
+        Cpu.step()
+        return 1, Cpu.Cycles
+    return Cpu.run(MaxInstructions=1)
+
+
+def _describe(Name: str, Value) -> str:
+    if not isinstance(Value, int) or Name == "Cycles":
+        return str(Value)
+    return f"${Value:04X}" if Name == "PC" else f"${Value:02X}"
+
+
+class lockstep:
+    """
+    A reference and a candidate CPU run in lockstep.
+
+    Attributes:
+        Instructions (int): Instructions both executed so far.
+        Cycles (int): Cycles both took so far.
+    """
+
+    def __init__(
+        self,
+        Image: bytes,
+        Registers: dict = None,
+        Candidate: str = "jit",
+        Reference: str = "step",
+        CacheDirectory: str = None,
+    ):
+        """
+        Args:
+            Image (bytes): 64 KiB image both start from.
+            Registers (dict): Initial registers, the reset state if None.
+            Candidate (str): Engine under test, one of DIFF_ENGINES.
+            Reference (str): Engine it is checked against, one of STEPPED.
+            CacheDirectory (str): Module cache of the AOT engine.
+        """
+        if Reference not in STEPPED:
+            raise ValueError(f"the reference has to step single instructions, one of {STEPPED}")
+        self.Candidate = Candidate
+        self.Reference = Reference
+        self.CacheDirectory = CacheDirectory
+        self.Ref = machine(Reference, Image, Registers, CacheDirectory)
+        self.Cand = machine(Candidate, Image, Registers, CacheDirectory)
+        self.Instructions = 0
+        self.Cycles = 0
+
+    def step(self):
+        """
+        Advance both CPUs by one unit of the candidate.
+
+        Returns:
+            dict: The divergence (see check()), None if they agree.
+        """
+        Registers, Image = state(self.Ref), bytes(self.Ref.Memory)
+        try:
+            n, Cycles = _advance(self.Candidate, self.Cand)
+        except Exception as Error:
+            n, Cycles = 1, f"{type(Error).__name__}: {Error}"
+        RefCycles = 0
+        try:
+            for _ in range(max(n, 1) if isinstance(Cycles, int) else 1):
+                RefCycles += _advance(self.Reference, self.Ref)[1]
+        except Exception as Error:
+            RefCycles = f"{type(Error).__name__}: {Error}"
+        Divergence = check(self.Ref, self.Cand, RefCycles, Cycles)
+        if Divergence is not None:
+            Divergence.update(Instruction=self.Instructions, Units=n, Registers=Registers, Image=Image)
+            return Divergence
+        self.Instructions += n
+        self.Cycles += Cycles
+        return None
+
+    def run(self, MaxInstructions: int) -> dict:
+        """
+        Run until the CPUs diverge, the program halts or the budget is used.
+
+        Args:
+            MaxInstructions (int): Instructions to run at most.
+
+        Returns:
+            dict: The first divergence (see check()), None if there was none.
+        """
+        M = self.Ref.Memory
+        while self.Instructions < MaxInstructions and M[0xFE] != 127:
+            Divergence = self.step()
+            if Divergence is not None:
+                return Divergence
+        return None
+
+
+def check(Ref, Cand, RefCycles, CandCycles) -> dict:
+    """
+    Compare two CPUs after a unit.
+
+    Args:
+        Ref (cpu6502): The reference CPU.
+        Cand (cpu6502): The candidate CPU.
+        RefCycles: Cycles the reference took, or the error it raised.
+        CandCycles: Cycles the candidate took, or the error it raised.
+
+    Returns:
+        dict: None if they agree, else Reference and Candidate (registers and
+            cycles of each) and Memory ((address, reference value, candidate
+            value) of the first 16 bytes that differ).
+    """
+    RefState, CandState = state(Ref), state(Cand)
+    RefState["Cycles"], CandState["Cycles"] = RefCycles, CandCycles
+    if RefState == CandState and Ref.Memory == Cand.Memory:
+        return None
+    Differences = []
+    if Ref.Memory != Cand.Memory:
+        for Address in range(0x10000):
+            if Ref.Memory[Address] != Cand.Memory[Address]:
+                Differences.append((Address, Ref.Memory[Address], Cand.Memory[Address]))
+                if len(Differences) == 16:
+                    break
+    return {"Reference": RefState, "Candidate": CandState, "Memory": Differences}
+
+
+def diverges(Image: bytes, Registers: dict, Candidate: str, Reference: str = "step", CacheDirectory: str = None):
+    """
+    Whether the engines disagree on the first unit from a state.
+
+    Returns:
+        dict: The divergence, None if they agree.
+    """
+    return lockstep(Image, Registers, Candidate, Reference, CacheDirectory).step()
+
+
+def shrink(Divergence: dict, Candidate: str, Reference: str = "step", CacheDirectory: str = None) -> dict:
+    """
+    Shrink a divergence to a minimal reproducer: starting from the state
+    before the diverging unit, zero memory in halving chunks down to single
+    bytes and reset registers as long as the engines still disagree.
+
+    Args:
+        Divergence (dict): As returned by lockstep.run().
+        Candidate (str): The candidate engine.
+        Reference (str): The reference engine.
+        CacheDirectory (str): Module cache of the AOT engine.
+
+    Returns:
+        dict: Registers, Memory (address -> value of the non-zero bytes) and
+            the divergence the reproducer shows.
+    """
+    Image = bytearray(Divergence["Image"])
+    Registers = dict(Divergence["Registers"])
+    Last = diverges(bytes(Image), Registers, Candidate, Reference, CacheDirectory)
+    if Last is None:
+        # depends on more than the state before the unit (devices, caches)
+        Last = Divergence
+    Size = 0x1000
+    while Size:
+        for Start in range(0, 0x10000, Size):
+            if not any(Image[Start : Start + Size]):
+                continue
+            Trial = bytearray(Image)
+            Trial[Start : Start + Size] = bytes(Size)
+            Result = diverges(bytes(Trial), Registers, Candidate, Reference, CacheDirectory)
+            if Result is not None:
+                Image, Last = Trial, Result
+        Size //= 2
+    for Name, Default in _DEFAULTS.items():
+        Values = [Default]
+        if Name == "P":
+            # or just one flag less
+            Values += [Registers["P"] & ~Bit for Bit in (0x80, 0x40, 0x10, 0x08, 0x04, 0x02, 0x01)]
+        for Value in Values:
+            if Registers[Name] == Value:
+                continue
+            Trial = dict(Registers, **{Name: Value})
+            Result = diverges(bytes(Image), Trial, Candidate, Reference, CacheDirectory)
+            if Result is not None:
+                Registers, Last = Trial, Result
+    return {
+        "Candidate": Candidate,
+        "Reference": Reference,
+        "Registers": Registers,
+        "Memory": {Address: Value for Address, Value in enumerate(Image) if Value},
+        "Divergence": {Key: Last[Key] for Key in ("Reference", "Candidate", "Memory")},
+    }
+
+
+def image(Reproducer: dict) -> bytes:
+    """
+    The 64 KiB image of a reproducer.
+    """
+    Image = bytearray(0x10000)
+    for Address, Value in Reproducer["Memory"].items():
+        Image[int(Address)] = Value
+    return bytes(Image)
+
+
+def report(Reproducer: dict) -> str:
+    """
+    Human readable description of a reproducer.
+    """
+    Registers = Reproducer["Registers"]
+    Image = image(Reproducer)
+    Divergence = Reproducer["Divergence"]
+    Lines = [
+        f"{Reproducer['Candidate']} diverges from {Reproducer['Reference']}"
+        f" at ${Registers['PC']:04X}: {disassemble(Image, Registers['PC'])}",
+        "registers " + " ".join(f"{Name}=${Registers[Name]:02X}" for Name in REGISTERS),
+        f"memory ({len(Reproducer['Memory'])} non-zero bytes) "
+        + " ".join(f"${int(Address):04X}=${Value:02X}" for Address, Value in sorted(Reproducer["Memory"].items(), key=lambda Item: int(Item[0]))[:32]),
+    ]
+    for Side in ("Reference", "Candidate"):
+        Lines.append(f"{Side.lower():9} " + " ".join(f"{Name}={_describe(Name, Value)}" for Name, Value in Divergence[Side].items()))
+    for Address, Expected, Got in Divergence["Memory"]:
+        Lines.append(f"memory ${Address:04X} reference ${Expected:02X} candidate ${Got:02X}")
+    return "\n".join(Lines)
+
+
+def randomState(Random: random.Random) -> tuple:
+    """
+    A random image and register state, the reset vector points at the PC so
+    the AOT engine compiles from there.
+
+    Args:
+        Random (random.Random): The generator.
+
+    Returns:
+        tuple: (image, registers).
+    """
+    Image = bytearray(Random.randbytes(0x10000))
+    PC = Random.randrange(0x10000)
+    # not halted
+    Image[0xFE] = 0
+    Image[0xFFFC], Image[0xFFFD] = PC & 0xFF, PC >> 8
+    Registers = {"PC": PC, "A": Random.randrange(256), "X": Random.randrange(256), "Y": Random.randrange(256)}
+    Registers.update(SP=Random.randrange(256), P=Random.randrange(256))
+    return bytes(Image), Registers
+
+
+def fuzz(Trials: int, Length: int, Candidate: str, Reference: str = "step", Seed: int = 0, CacheDirectory: str = None):
+    """
+    Run random instruction streams from random states in lockstep.
+
+    Args:
+        Trials (int): Number of random states.
+        Length (int): Instructions run from each.
+        Candidate (str): Engine under test.
+        Reference (str): Reference engine.
+        Seed (int): Seed of the generator, trial i uses Seed + i.
+        CacheDirectory (str): Module cache of the AOT engine.
+
+    Returns:
+        tuple: (seed of the trial, divergence) of the first divergence, None
+            if all trials agreed.
+    """
+    for Trial in range(Trials):
+        Image, Registers = randomState(random.Random(Seed + Trial))
+        Divergence = lockstep(Image, Registers, Candidate, Reference, CacheDirectory).run(Length)
+        if Divergence is not None:
+            return Seed + Trial, Divergence
+    return None
+
+
+def _main():
+    Parser = argparse.ArgumentParser(description="Run engines in lockstep against the reference step().")
+    Parser.add_argument("binary", nargs="?", help="64 KiB memory image to run from its reset vector")
+    Parser.add_argument("--candidate", nargs="+", choices=DIFF_ENGINES, default=["jit"], help="engines under test")
+    Parser.add_argument("--reference", choices=STEPPED, default="step", help="engine they are checked against")
+    Parser.add_argument("--instructions", type=int, default=1000000, help="instructions to run the image")
+    Parser.add_argument("--random", type=int, metavar="TRIALS", help="run random states instead of an image")
+    Parser.add_argument("--length", type=int, default=100, help="instructions per random state")
+    Parser.add_argument("--seed", type=int, default=0, help="seed of the first random state")
+    Parser.add_argument("--replay", help="check a reproducer JSON file again")
+    Parser.add_argument("--reproducer", help="write the shrunk reproducer to this JSON file")
+    Args = Parser.parse_args()
+    if not (Args.binary or Args.random or Args.replay):
+        Parser.error("give an image, --random or --replay")
+    Failed = False
+    with tempfile.TemporaryDirectory() as CacheDirectory:
+        for Candidate in Args.candidate:
+            if Args.replay:
+                with open(Args.replay) as f:
+                    Reproducer = json.load(f)
+                Divergence = diverges(image(Reproducer), Reproducer["Registers"], Candidate, Args.reference, CacheDirectory)
+                print(f"{Candidate}: " + ("still diverges" if Divergence else "agrees"))
+                Failed |= Divergence is not None
+                continue
+            if Args.random:
+                Found = fuzz(Args.random, Args.length, Candidate, Args.reference, Args.seed, CacheDirectory)
+                Where = f"random state {Found[0]}" if Found else f"{Args.random} random states"
+                Divergence = Found and Found[1]
+            else:
+                with open(Args.binary, "rb") as f:
+                    Lockstep = lockstep(f.read(), None, Candidate, Args.reference, CacheDirectory)
+                Divergence = Lockstep.run(Args.instructions)
+                Where = f"{Lockstep.Instructions} instructions, {Lockstep.Cycles} cycles"
+            if Divergence is None:
+                print(f"{Candidate}: agrees with {Args.reference} over {Where}")
+                continue
+            Failed = True
+            print(f"{Candidate}: diverges after {Divergence['Instruction']} instructions ({Where}), shrinking")
+            Reproducer = shrink(Divergence, Candidate, Args.reference, CacheDirectory)
+            print(report(Reproducer))
+            if Args.reproducer:
+                with open(Args.reproducer, "w") as f:
+                    json.dump(Reproducer, f, indent=2)
+    sys.exit(1 if Failed else 0)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,32 @@
+"""
+Creating a CPU engine by name.
+"""
+from cpu6502table import cpu6502table
+
+# engine names accepted by create()
+ENGINES = ("table", "jit", "aot")
+
+
+def create(Engine: str, Bus):
+    """
+    Create a CPU, after all devices are on the bus.
+
+    Args:
+        Engine (str): One of ENGINES.
+        Bus (bus): The bus (or memory) the CPU runs on.
+
+    Returns:
+        cpu6502: The CPU.
+    """
+    match Engine:
+        case "table":
+            return cpu6502table(Bus)
+        case "jit":
+            from cpu6502jit import cpu6502jit
+
+            return cpu6502jit(Bus)
+        case "aot":
+            from cpu6502aot import cpu6502aot
+
+            return cpu6502aot(Bus)
+    raise ValueError(f"unknown engine {Engine}")
@@ -0,0 +1,22 @@
+"""
+Precomputed flag tables.
+
+N and Z are not stored as flags but kept lazily as NZ, the last result:
+    Z is set when NZ & 0xFF == 0
+    N is set when NZ & 0x180 != 0
+Normal results are 8-bit so N is just bit 7, bit 8 lets BIT and PLP set N
+independently of Z.
+"""
+
+# NZ (0 - 0x1FF) -> N and Z bits of the status register
+FLAGS_NZ = [(0x80 if NZ & 0x180 else 0) | (0 if NZ & 0xFF else 0x02) for NZ in range(0x200)]
+
+# status register -> NZ value with the same N and Z
+NZ_FROM_P = [(P & 0x80) << 1 | (0 if P & 0x02 else 1) for P in range(0x100)]
+
+# 9-bit sum -> carry
+CARRY = [Result >> 8 for Result in range(0x200)]
+
+# A ^ Operand ^ Result of an addition -> overflow
+# bit 7 is the carry into bit 7, bit 8 the carry out of it, V is set when they differ
+OVERFLOW = [((Value >> 7) ^ (Value >> 8)) & 1 for Value in range(0x200)]
@@ -0,0 +1,115 @@
+"""
+The 32x32 framebuffer at 0x200 - 0x5FF without pygame.
+
+Colors are 8-bit RRRGGGBB values. The palette is shared with the monitor, the
+image writers here are what the headless mode uses to dump frames as PPM or
+PNG files (standard library only).
+"""
+import struct
+import zlib
+
+# the framebuffer in memory and its size in cells
+START = 0x200
+WIDTH = 32
+HEIGHT = 32
+
+
+def _8bitTo24bitColor(Color: int) -> tuple:
+    """
+    Convert an 8-bit color value to a 24-bit RGB tuple.
+
+    The 8-bit color format:
+    - Top 3 bits: red (0-7)
+    - Middle 3 bits: green (0-7)
+    - Bottom 2 bits: blue (0-3)
+
+    Args:
+        Color (int): An 8-bit packed color value.
+
+    Returns:
+        tuple: A (R, G, B) tuple scaled to 8-bit color channels (0-255).
+    """
+    r = (Color >> 5) & 0x7
+    g = (Color >> 2) & 0x7
+    b = Color & 0x3
+    # r / 7 normalize -> scale to 8 bit
+    r = round((r / 7) * 255)
+    g = round((g / 7) * 255)
+    b = round((b / 3) * 255)
+    return (r, g, b)
+
+
+# RRRGGGBB -> (R, G, B)
+PALETTE = [_8bitTo24bitColor(Color) for Color in range(256)]
+
+# RRRGGGBB -> 3 bytes of RGB
+_RGB = [bytes(Color) for Color in PALETTE]
+
+
+def rows(Memory, Scale: int = 1) -> list:
+    """
+    The framebuffer as rows of RGB bytes.
+
+    Args:
+        Memory: The memory (anything sliceable by address).
+        Scale (int): Pixels per cell in each direction.
+
+    Returns:
+        list: HEIGHT * Scale rows of WIDTH * Scale * 3 bytes.
+    """
+    Frame = bytes(Memory[START : START + WIDTH * HEIGHT])
+    Rows = []
+    for y in range(0, WIDTH * HEIGHT, WIDTH):
+        Row = b"".join(_RGB[Color] * Scale for Color in Frame[y : y + WIDTH])
+        Rows += [Row] * Scale
+    return Rows
+
+
+def ppm(Memory, Path: str, Scale: int = 1):
+    """
+    Write the framebuffer as a binary PPM (P6) image.
+
+    Args:
+        Memory: The memory.
+        Path (str): The image file.
+        Scale (int): Pixels per cell in each direction.
+    """
+    with open(Path, "wb") as f:
+        f.write(f"P6\n{WIDTH * Scale} {HEIGHT * Scale}\n255\n".encode())
+        f.write(b"".join(rows(Memory, Scale)))
+
+
+def _chunk(Type: bytes, Data: bytes) -> bytes:
+    return struct.pack(">I", len(Data)) + Type + Data + struct.pack(">I", zlib.crc32(Type + Data))
+
+
+def png(Memory, Path: str, Scale: int = 1):
+    """
+    Write the framebuffer as an 8-bit RGB PNG image.
+
+    Args:
+        Memory: The memory.
+        Path (str): The image file.
+        Scale (int): Pixels per cell in each direction.
+    """
+    # every row starts with filter type 0 (none)
+    Data = zlib.compress(b"".join(b"\x00" + Row for Row in rows(Memory, Scale)))
+    Header = struct.pack(">IIBBBBB", WIDTH * Scale, HEIGHT * Scale, 8, 2, 0, 0, 0)
+    with open(Path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_chunk(b"IHDR", Header) + _chunk(b"IDAT", Data) + _chunk(b"IEND", b""))
+
+
+def save(Memory, Path: str, Scale: int = 1):
+    """
+    Write the framebuffer as PNG if the path ends with .png, PPM otherwise.
+
+    Args:
+        Memory: The memory.
+        Path (str): The image file.
+        Scale (int): Pixels per cell in each direction.
+    """
+    if Path.lower().endswith(".png"):
+        png(Memory, Path, Scale)
+    else:
+        ppm(Memory, Path, Scale)
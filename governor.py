@@ -0,0 +1,100 @@
+"""
+Running the CPU at a target clock rate.
+"""
+import time
+
+
+class governor:
+    """
+    Paces a CPU to a target clock rate.
+
+    The CPU runs in budgets of one slice (a display frame by default) worth of
+    cycles, after each batch the governor sleeps until the wall clock catches
+    up with the guest time of the cycles executed. In turbo mode (or without a
+    target) nothing is throttled. When the host can't keep up it does not try
+    to catch up later but starts counting again from the current time.
+
+    Typical loop:
+        Cycles = Cpu.run(MaxInstructions=10000, MaxCycles=Governor.budget())[1]
+        Governor.account(Cycles)
+    """
+
+    # falling behind by more than this many seconds resets the guest clock
+    MAX_LAG = 0.25
+
+    def __init__(self, Frequency: float = None, Slice: float = 1 / 60):
+        """
+        Args:
+            Frequency (float): Target clock rate in Hz, None to run unthrottled.
+            Slice (float): Seconds of guest time per budget.
+        """
+        self.Frequency = Frequency
+        self.Slice = Slice
+        self.Turbo = Frequency is None
+        # total cycles and seconds spent sleeping
+        self.Cycles = 0
+        self.Slept = 0.0
+        self.Start = time.perf_counter()
+        # wall time and cycle count the guest clock counts from
+        self.Epoch = self.Start
+        self.EpochCycles = 0
+
+    def setTurbo(self, Turbo: bool):
+        """
+        Switch the throttling off (turbo) or back on.
+
+        Args:
+            Turbo (bool): Run unthrottled.
+        """
+        if self.Frequency is None or Turbo == self.Turbo:
+            return
+        self.Turbo = Turbo
+        self.Epoch = time.perf_counter()
+        self.EpochCycles = self.Cycles
+
+    def budget(self):
+        """
+        Cycles the next batch may take.
+
+        Returns:
+            int: One slice worth of cycles, None in turbo mode.
+        """
+        if self.Turbo:
+            return None
+        return max(1, round(self.Frequency * self.Slice))
+
+    def account(self, Cycles: int):
+        """
+        Count the cycles of a batch and sleep off the time they are ahead of
+        the wall clock.
+
+        Args:
+            Cycles (int): Cycles the batch took.
+        """
+        self.Cycles += Cycles
+        if self.Turbo:
+            return
+        Deadline = self.Epoch + (self.Cycles - self.EpochCycles) / self.Frequency
+        Now = time.perf_counter()
+        if Deadline > Now:
+            time.sleep(Deadline - Now)
+            self.Slept += Deadline - Now
+        elif Now - Deadline > self.MAX_LAG:
+            self.Epoch = Now
+            self.EpochCycles = self.Cycles
+
+    def statistics(self) -> dict:
+        """
+        Achieved against target clock rate.
+
+        Returns:
+            dict: Target and achieved MHz (target None when unthrottled), total
+                cycles and the fraction of the time spent sleeping.
+        """
+        Seconds = time.perf_counter() - self.Start
+        return {
+            "TargetMHz": None if self.Frequency is None else self.Frequency / 1e6,
+            "AchievedMHz": self.Cycles / Seconds / 1e6 if Seconds else 0.0,
+            "Cycles": self.Cycles,
+            "Sleeping": self.Slept / Seconds if Seconds else 0.0,
+        }
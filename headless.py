@@ -0,0 +1,105 @@
+"""
+Running a program without a window (and without importing pygame).
+"""
+import time
+
+from framebuffer import save
+
+# instructions per run() call, limits and frame dumps are checked between calls
+BATCH = 100000
+# seconds to block at most while the program spins without limits to reach
+SPIN_WAIT = 0.1
+
+
+def run(
+    Cpu,
+    Printer=None,
+    MaxInstructions: int = None,
+    MaxCycles: int = None,
+    TimeLimit: float = None,
+    Frames: str = None,
+    FrameEvery: int = None,
+    FrameScale: int = 1,
+    Governor=None,
+    Profiler=None,
+) -> dict:
+    """
+    Run the CPU until the program halts (0xFE == 127) or a limit is reached.
+
+    Args:
+        Cpu (cpu6502): The CPU, with the printer (if any) on its bus.
+        Printer (printer): Buffered printer to flush between batches.
+        MaxInstructions (int): Instruction limit, None for no limit.
+        MaxCycles (int): Cycle limit, None for no limit.
+        TimeLimit (float): Wall clock limit in seconds, None for no limit.
+        Frames (str): Path of the framebuffer dumps, "{cycles}" in it is
+            replaced by the cycle count, .png writes PNG and anything else PPM.
+            A frame is always written when the run ends.
+        FrameEvery (int): Also write a frame every this many cycles.
+        FrameScale (int): Pixels per framebuffer cell in the dumps.
+        Governor (governor): Paces the CPU to its clock rate, None to run
+            unthrottled.
+        Profiler (profiler): Runs the CPU while sampling it, None to run it
+            directly.
+
+    Spin loops are fast-forwarded (see cpu6502.run()), when the program spins
+    without an instruction or cycle limit to reach, the run blocks until the
+    loop ends or the time limit passes.
+
+    Returns:
+        dict: Instructions, cycles, seconds, whether the program halted and
+            the frame files written.
+    """
+    M = Cpu.Memory
+    Run = Cpu.run if Profiler is None else Profiler.run
+    Instructions = 0
+    Cycles = 0
+    Written = []
+    NextFrame = FrameEvery if Frames and FrameEvery else None
+    Start = time.perf_counter()
+    while M[0xFE] != 127:
+        Budget = BATCH
+        if MaxInstructions is not None:
+            Budget = min(Budget, MaxInstructions - Instructions)
+        CycleBudget = None if MaxCycles is None else MaxCycles - Cycles
+        for Limit in (
+            None if NextFrame is None else NextFrame - Cycles,
+            None if Governor is None else Governor.budget(),
+        ):
+            if Limit is not None:
+                CycleBudget = Limit if CycleBudget is None else min(CycleBudget, Limit)
+        if Budget <= 0 or (CycleBudget is not None and CycleBudget <= 0):
+            break
+        n, c = Run(MaxInstructions=Budget, MaxCycles=CycleBudget)
+        Instructions += n
+        Cycles += c
+        if Governor is not None:
+            Governor.account(c)
+        if Printer is not None:
+            Printer.update()
+        if NextFrame is not None and Cycles >= NextFrame:
+            Written.append(Frames.format(cycles=Cycles))
+            save(M, Written[-1], FrameScale)
+            while NextFrame <= Cycles:
+                NextFrame += FrameEvery
+        if TimeLimit is not None and time.perf_counter() - Start >= TimeLimit:
+            break
+        if Cpu.Spin is not None and MaxInstructions is None and MaxCycles is None and NextFrame is None:
+            if Governor is None or Governor.Turbo:
+                Timeout = SPIN_WAIT
+                if TimeLimit is not None:
+                    Timeout = min(Timeout, Start + TimeLimit - time.perf_counter())
+                Cpu.wait(Timeout)
+    Seconds = time.perf_counter() - Start
+    if Printer is not None:
+        Printer.flush()
+    if Frames and Frames.format(cycles=Cycles) not in Written[-1:]:
+        Written.append(Frames.format(cycles=Cycles))
+        save(M, Written[-1], FrameScale)
+    return {
+        "Instructions": Instructions,
+        "Cycles": Cycles,
+        "Seconds": Seconds,
+        "Halted": M[0xFE] == 127,
+        "Frames": Written,
+    }
@@ -0,0 +1,231 @@
+"""
+Loading programs into memory.
+
+Formats, told apart by the extension unless given:
+    bin     raw bytes loaded at an address (0 by default), a full 64 KiB image
+            or a partial one like a ROM
+    prg     C64 style, the first two bytes are the load address
+    hex     Intel HEX (.hex, .ihx), data and start address records
+    cfg     an ld65 linker configuration: every MEMORY area is loaded at its
+            start from the file ld65 wrote it to (file = "..." or the -o
+            output for %O, main.bin next to the configuration by default)
+
+Raw bytes are read with a single readinto() straight into the memory's
+backing store, no copy through a bytes object and no Python loop.
+
+The CPU starts at the reset vector (0xFFFC). When none of the loaded images
+covers it, boot() points it at the start address of a HEX file or at the
+first byte loaded, unless the caller overrides it.
+"""
+import os
+import re
+
+from memory import SIZE, memory
+
+FORMATS = ("bin", "prg", "hex", "cfg")
+# the reset vector
+RESET = 0xFFFC
+
+_EXTENSIONS = {".prg": "prg", ".hex": "hex", ".ihx": "hex", ".cfg": "cfg"}
+_MEMORY = re.compile(r"MEMORY\s*\{(.*?)\}", re.DOTALL)
+_ATTRIBUTE = re.compile(r'(\w+)\s*=\s*("[^"]*"|[^,;]+)')
+
+
+def number(Text: str) -> int:
+    """
+    A number in ca65/ld65 syntax ($FF, 0xFF, %1010 or decimal).
+    """
+    Text = Text.strip()
+    if Text.startswith("$"):
+        return int(Text[1:], 16)
+    if Text.startswith("%"):
+        return int(Text[1:], 2)
+    return int(Text, 0)
+
+
+def detect(Path: str) -> str:
+    """
+    The format of a file by its extension.
+
+    Args:
+        Path (str): The file.
+
+    Returns:
+        str: One of FORMATS, "bin" for anything unknown.
+    """
+    return _EXTENSIONS.get(os.path.splitext(Path)[1].lower(), "bin")
+
+
+def _view(Memory):
+    """
+    A writable byte view of the backing store, None for stores without one.
+    """
+    Memory = getattr(Memory, "Memory", Memory)
+    if isinstance(Memory, memory):
+        return Memory.View
+    if isinstance(Memory, (bytearray, memoryview)):
+        return memoryview(Memory)
+    return None
+
+
+def _read(Memory, f, Address: int, Size: int = None) -> tuple:
+    """
+    Read the rest of a file (or Size bytes of it) into memory at an address.
+
+    Returns:
+        tuple: (start, end) of the bytes loaded.
+    """
+    if Size is None:
+        Size = os.fstat(f.fileno()).st_size - f.tell()
+    if Address + Size > SIZE:
+        raise ValueError(f"{Size} bytes do not fit at 0x{Address:04X}")
+    View = _view(Memory)
+    if View is not None:
+        Read = f.readinto(View[Address : Address + Size])
+    else:
+        Data = f.read(Size)
+        Read = len(Data)
+        Memory[Address : Address + Read] = Data
+    if Read != Size:
+        raise ValueError(f"{f.name} ends after {Read} of {Size} bytes")
+    return Address, Address + Size
+
+
+def _hex(Memory, Path: str) -> tuple:
+    """
+    Load an Intel HEX file.
+
+    Returns:
+        tuple: (ranges loaded, start address or None).
+    """
+    Ranges, Start, Base = [], None, 0
+    with open(Path) as f:
+        for Number, Line in enumerate(f, 1):
+            Line = Line.strip()
+            if not Line:
+                continue
+            if not Line.startswith(":"):
+                raise ValueError(f"{Path}:{Number}: not an Intel HEX record")
+            Record = bytes.fromhex(Line[1:])
+            if len(Record) < 5 or len(Record) != Record[0] + 5 or sum(Record) & 0xFF:
+                raise ValueError(f"{Path}:{Number}: bad length or checksum")
+            Data, Offset, Type = Record[4:-1], Record[1] << 8 | Record[2], Record[3]
+            match Type:
+                case 0x00:
+                    Address = Base + Offset
+                    if Address + len(Data) > SIZE:
+                        raise ValueError(f"{Path}:{Number}: data above 0xFFFF")
+                    Memory[Address : Address + len(Data)] = Data
+                    Ranges.append((Address, Address + len(Data)))
+                case 0x01:
+                    break
+                case 0x02:
+                    Base = int.from_bytes(Data, "big") << 4
+                case 0x04:
+                    Base = int.from_bytes(Data, "big") << 16
+                case 0x03:
+                    Start = ((Data[0] << 8 | Data[1]) << 4) + (Data[2] << 8 | Data[3])
+                case 0x05:
+                    Start = int.from_bytes(Data, "big")
+    return Ranges, Start
+
+
+def _config(Memory, Path: str, Output: str = None) -> list:
+    """
+    Load the memory areas of an ld65 configuration from the files ld65 wrote.
+
+    Returns:
+        list: Ranges loaded.
+    """
+    Directory = os.path.dirname(Path)
+    with open(Path) as f:
+        Text = re.sub(r"#.*", "", f.read())
+    Block = _MEMORY.search(Text)
+    if Block is None:
+        raise ValueError(f"{Path} has no MEMORY block")
+    # output file -> areas written to it, in order
+    Files = {}
+    for Entry in Block.group(1).split(";"):
+        Name, _, Attributes = Entry.partition(":")
+        Attributes = {Key: Value.strip().strip('"') for Key, Value in _ATTRIBUTE.findall(Attributes)}
+        if "start" not in Attributes:
+            continue
+        File = Attributes.get("file", "%O")
+        if not File:
+            continue
+        if File == "%O":
+            File = Output or os.path.join(Directory, "main.bin")
+        elif not os.path.isabs(File):
+            File = os.path.join(Directory, File)
+        Size = number(Attributes["size"]) if Attributes.get("fill") == "yes" else None
+        Files.setdefault(File, []).append((Name.strip(), number(Attributes["start"]), Size))
+    Ranges = []
+    for File, Areas in Files.items():
+        with open(File, "rb") as f:
+            for i, (Name, Start, Size) in enumerate(Areas):
+                if Size is None and i < len(Areas) - 1:
+                    # only the last area's length follows from the file size
+                    raise ValueError(f"{Path}: area {Name} is not filled, where the next one starts in {File} is unknown")
+                Ranges.append(_read(Memory, f, Start, Size))
+    return Ranges
+
+
+def load(Memory, Path: str, Address: int = None, Format: str = None, Output: str = None) -> tuple:
+    """
+    Load a program (or part of one) into memory.
+
+    Args:
+        Memory: The memory, a bus or any store taking slices.
+        Path (str): The file.
+        Address (int): Load address of raw bytes (0 if None), overrides the
+            one in a .prg header.
+        Format (str): One of FORMATS, by the extension if None.
+        Output (str): The -o output of ld65 for a configuration.
+
+    Returns:
+        tuple: (list of (start, end) ranges loaded, start address from the
+            file or None).
+    """
+    Format = Format or detect(Path)
+    match Format:
+        case "bin":
+            with open(Path, "rb") as f:
+                return [_read(Memory, f, Address or 0)], None
+        case "prg":
+            with open(Path, "rb") as f:
+                Header = f.read(2)
+                if len(Header) != 2:
+                    raise ValueError(f"{Path} has no load address")
+                return [_read(Memory, f, Header[0] | Header[1] << 8 if Address is None else Address)], None
+        case "hex":
+            return _hex(Memory, Path)
+        case "cfg":
+            return _config(Memory, Path, Output), None
+    raise ValueError(f"unknown format {Format}")
+
+
+def boot(Memory, Images: list, Reset: int = None) -> int:
+    """
+    Load programs and set the reset vector.
+
+    Args:
+        Memory: The memory, a bus or any store taking slices.
+        Images (list): (path, load address or None) pairs, loaded in order.
+        Reset (int): Reset vector to set, None to keep the loaded one, or if
+            no image covers it the start address of a HEX file, else the
+            first byte loaded.
+
+    Returns:
+        int: The reset vector.
+    """
+    Ranges, Start = [], None
+    for Path, Address in Images:
+        Loaded, Entry = load(Memory, Path, Address)
+        Ranges += Loaded
+        Start = Entry if Start is None else Start
+    if Reset is None and not any(Begin <= RESET and RESET + 2 <= End for Begin, End in Ranges):
+        Reset = Start if Start is not None else next((Begin for Begin, End in Ranges if End > Begin), None)
+    if Reset is not None:
+        Memory[RESET] = Reset & 0xFF
+        Memory[RESET + 1] = (Reset >> 8) & 0xFF
+    return Memory[RESET] | Memory[RESET + 1] << 8
@@ -1,57 +1,296 @@
-from cpu6502 import cpu6502
-from monitor import monitor
+from bus import bus
+from engines import ENGINES, create
+from governor import governor
+from loader import boot, number
+from memory import BACKENDS, memory
 from printer import printer
+import argparse
+import sys
+import threading
+import time
+
+Parser = argparse.ArgumentParser(description="Run a 6502 binary.")
+Parser.add_argument("binary", nargs="?", help="program: 64 KiB image or partial raw image, .prg, Intel .hex or ld65 linker .cfg")
+Parser.add_argument("--address", type=number, help="load address of a raw image (0 by default), overrides a .prg header")
+Parser.add_argument("--load", action="append", default=[], metavar="FILE[@ADDRESS]", help="also load this file (raw ld65 segment outputs and the like, repeatable)")
+Parser.add_argument("--reset", type=number, help="set the reset vector to this address ($8000, 0x8000)")
+Parser.add_argument("--snapshot", help="start from this save state instead of the image and its reset vector")
+Parser.add_argument("--save-snapshot", metavar="PATH", help="write a save state to this file when the run ends")
+Parser.add_argument("--headless", action="store_true", help="run without a window (pygame is not imported)")
+Parser.add_argument("--engine", choices=ENGINES, default="table", help="CPU engine")
+Parser.add_argument("--memory", choices=BACKENDS, help="memory backend (bytearray by default, shared only with --process)")
+Parser.add_argument("--process", action="store_true", help="run the CPU in its own process on shared memory instead of a thread")
+Parser.add_argument("--vblank-nmi", action="store_true", help="raise an NMI after every frame of the window, for programs drawing in their NMI handler")
+Parser.add_argument("--mhz", type=float, help="target clock rate in MHz, unthrottled if not given (Tab toggles turbo in the window)")
+Parser.add_argument("--max-instructions", type=int, help="headless: stop after this many instructions")
+Parser.add_argument("--max-cycles", type=int, help="headless: stop after this many cycles")
+Parser.add_argument("--time-limit", type=float, help="stop after this many seconds")
+Parser.add_argument("--output", help="write the printer output to this file instead of stdout")
+Parser.add_argument("--frames", help="headless: dump the framebuffer to this .png/.ppm path ({cycles} is replaced) when the run ends")
+Parser.add_argument("--frame-every", type=int, help="headless: also dump a frame every this many cycles")
+Parser.add_argument("--frame-scale", type=int, default=1, help="headless: pixels per framebuffer cell")
+Parser.add_argument("--stats", action="store_true", help="count instructions, cycles and opcodes and print a report to stderr at exit")
+Parser.add_argument("--profile", metavar="STACKS", help="sample the PC, print the hot spots to stderr at exit and write the collapsed call stacks to this file")
+Parser.add_argument("--profile-every", type=int, default=1000, help="instructions (or cycles) between two samples")
+Parser.add_argument("--profile-cycles", action="store_true", help="sample every --profile-every cycles instead of instructions")
+Parser.add_argument("--calls", metavar="STACKS", help="trace calls and returns, print the call graph cycles to stderr at exit and write the collapsed call stacks to this file")
+Parser.add_argument("--symbols", action="append", default=[], help="ld65 map file, --dbgfile output or linker.cfg naming the profiled addresses (repeatable)")
+Args = Parser.parse_args()
+if (Args.binary is None) == (Args.snapshot is None):
+    Parser.error("give either an image or --snapshot")
+if Args.profile and Args.process and not Args.headless:
+    Parser.error("--profile needs the CPU in this process, it can't be used with --process")
+if Args.calls and Args.process and not Args.headless:
+    Parser.error("--calls needs the CPU in this process, it can't be used with --process")
+if Args.process and not Args.headless and Args.memory not in (None, "shared"):
+    Parser.error(f"--process runs the CPU on shared memory, it can't be used with --memory {Args.memory}")
+if Args.memory == "shared" and not (Args.process and not Args.headless):
+    # only the CPU process maps the block, and it is released when it ends
+    Parser.error("--memory shared is the memory of the CPU process, it needs --process (without --headless)")
+if Args.vblank_nmi and (Args.process or Args.headless):
+    Parser.error("--vblank-nmi needs the window and the CPU in this process, it can't be used with --process or --headless")
+
+# Create memory (64 KiB bytearray by default, see memory.py), the CPU process
+# needs memory it can share
+Memory = memory("shared" if Args.process and not Args.headless else Args.memory or "bytearray")
+
+# Load file into memory, or the save state with the registers to restore
+# once the CPU exists
+Snapshot = None
+if Args.snapshot:
+    import snapshot
+    Snapshot = snapshot.load(Args.snapshot, Memory)
+else:
+    boot(
+        Memory,
+        [(Args.binary, Args.address)]
+        + [(Path, number(Address) if Address else None) for Path, _, Address in (Load.partition("@") for Load in Args.load)],
+        Args.reset,
+    )
+# Create objects, the monitor and printer are devices on the bus
+Bus = bus(Memory)
+
+
+def saveSnapshot(Cpu, Instructions: int, Cycles: int):
+    """
+    Write the save state of --save-snapshot, counting on from the snapshot
+    the run started from.
+    """
+    import snapshot
+    if Snapshot is not None:
+        Instructions += Snapshot["Instructions"]
+        Cycles += Snapshot["Clock"]
+    snapshot.save(Args.save_snapshot, Cpu, Instructions, Cycles)
+
+
+def profile(Cpu):
+    """
+    A profiler for the CPU if --profile was given, else None.
+    """
+    if not Args.profile:
+        return None
+    from profiler import profiler
+    return profiler(Cpu, Args.profile_every, Args.profile_cycles)
+
+
+def names():
+    """
+    The symbols of --symbols, None if none were given.
+    """
+    from symbols import symbols
+    return symbols(*Args.symbols) if Args.symbols else None
+
+
+def profileReport(Profiler):
+    """
+    Print the hot spots and write the collapsed stacks.
+    """
+    Symbols = names()
+    print(Profiler.report(Symbols), file=sys.stderr)
+    Profiler.collapsed(Args.profile, Symbols)
+
+
+def callsReport(Calls):
+    """
+    Print the call graph cycles and write the collapsed stacks.
+    """
+    Symbols = names()
+    print(Calls.report(Symbols), file=sys.stderr)
+    Calls.collapsed(Args.calls, Symbols)
+
+
+if Args.headless:
+    import headless
+    # buffered, the characters are written out between batches
+    Printer = printer(Bus, Buffered=True, Output=open(Args.output, "w") if Args.output else None)
+    Cpu = create(Args.engine, Bus)
+    if Snapshot is not None:
+        snapshot.restore(Cpu, Snapshot)
+    if Args.stats:
+        Cpu.enableStats()
+    if Args.calls:
+        Cpu.enableCalls()
+    Profiler = profile(Cpu)
+    Result = headless.run(
+        Cpu,
+        Printer,
+        MaxInstructions=Args.max_instructions,
+        MaxCycles=Args.max_cycles,
+        TimeLimit=Args.time_limit,
+        Frames=Args.frames,
+        FrameEvery=Args.frame_every,
+        FrameScale=Args.frame_scale,
+        Governor=governor(None if Args.mhz is None else Args.mhz * 1e6),
+        Profiler=Profiler,
+    )
+    if Args.output:
+        Printer.Output.close()
+    Seconds = Result["Seconds"]
+    print(
+        f"{Result['Instructions']} instructions, {Result['Cycles']} cycles in {Seconds:.3f} s"
+        f" ({Result['Instructions'] / Seconds / 1e6:.2f} MIPS, {Result['Cycles'] / Seconds / 1e6:.2f} MHz)"
+        + (", halted" if Result["Halted"] else ""),
+        file=sys.stderr,
+    )
+    if Args.stats:
+        # the totals were printed just above
+        print(Cpu.Stats.report(Totals=False), file=sys.stderr)
+    if Profiler is not None:
+        profileReport(Profiler)
+    if Args.calls:
+        callsReport(Cpu.Calls)
+    if Args.save_snapshot:
+        saveSnapshot(Cpu, Result["Instructions"], Result["Cycles"])
+    sys.exit(0)
+
+if Args.process:
+    # started before pygame is imported, the process is forked from this one
+    from cpuprocess import cpuprocess
+    Worker = cpuprocess(
+        Memory,
+        Args.engine,
+        Args.output,
+        Frequency=None if Args.mhz is None else Args.mhz * 1e6,
+        Stats=Args.stats,
+        Snapshot=Snapshot,
+        SaveSnapshot=Args.save_snapshot,
+    )
+    Worker.start()
+
+# the window needs pygame, imported only here to keep the headless mode free of it
+from monitor import monitor
 import pygame
 import pygame.locals
-import threading
-from sys import argv
-# Create memory
-Memory = [0]*(1<<16)
-
-# Load file into memory
-with open(argv[1], "rb") as f:
-    i = 0
-    while(byte := f.read(1)):
-        Memory[i] = int.from_bytes(byte)
-        i+=1
-# Create objects
-Cpu = cpu6502(Memory)
-Monitor = monitor(Memory,Scale=2)
-Printer = printer(Memory)
+Monitor = monitor(Bus,Scale=2)
 
 
 # Multithreading
 killThread2 = 0
+Instructions = 0
+# runs the CPU in per-frame cycle budgets at the target clock rate
+Governor = governor(None if Args.mhz is None else Args.mhz * 1e6)
 def cpuLoop():
     """
         A function to offload the 6502cpu to another thread
     """
+    global Instructions
     while(killThread2 == 0):
         # if this address is set to 127 than the program ends
         if(Memory[0xFE] == 127):
             break
-        # using step function instead of cycle to speed up the cpu
-        Cpu.step()
-        
-thread2 = threading.Thread(target=cpuLoop, daemon=True)
-thread2.start()
+        # run a whole batch of instructions per call instead of step() to
+        # avoid the call overhead, run() stops by itself when 0xFE is 127
+        n, c = Run(MaxInstructions=10000, MaxCycles=Governor.budget())
+        Instructions += n
+        # sleeps off the time the batch is ahead of the target clock
+        Governor.account(c)
+        if Governor.Turbo and Cpu.Spin is not None:
+            # unthrottled the spin loop was fast-forwarded, block until it's over
+            Cpu.wait(Governor.Slice)
+
+if not Args.process:
+    # buffered, the characters are written out by Printer.update() below
+    Printer = printer(Bus, Buffered=True, Output=open(Args.output, "w") if Args.output else None)
+    Cpu = create(Args.engine, Bus)
+    if Snapshot is not None:
+        snapshot.restore(Cpu, Snapshot)
+    if Args.stats:
+        Cpu.enableStats()
+    if Args.calls:
+        Cpu.enableCalls()
+    Profiler = profile(Cpu)
+    Run = Cpu.run if Profiler is None else Profiler.run
+    if Args.vblank_nmi:
+        # the program's NMI handler runs once per frame
+        Monitor.VBlank = Cpu.nmi
+    thread2 = threading.Thread(target=cpuLoop, daemon=True)
+    thread2.start()
 
 
-# Main loop
+# Main loop, frames that don't change are not presented so vsync no longer
+# paces the loop, the clock does
+Clock = pygame.time.Clock()
+Start = time.perf_counter()
+Frames = 0
+if Args.process:
+    # the CPU process started before the window opened
+    Counted = (Worker.Instructions.value, Worker.Cycles.value)
 while(Monitor.WindowOpen):
     # if this address is set to 127 than the program ends
     if(Memory[0xFE] == 127):
         break
+    if Args.process and not Worker.alive():
+        break
+    if Args.time_limit is not None and time.perf_counter() - Start >= Args.time_limit:
+        break
     # pygame wants events in main thread
     for event in pygame.event.get():
         if event.type == pygame.locals.QUIT:
             Monitor.WindowOpen = 0
+        if event.type == pygame.locals.KEYDOWN and event.key == pygame.locals.K_TAB:
+            Turbo = not (Worker.Turbo.value if Args.process else Governor.Turbo)
+            if Args.process:
+                Worker.Turbo.value = Turbo
+            else:
+                Governor.setTurbo(Turbo)
 
-    # monitors 0x200 - 0x5FF and displays colors
+    if Args.process:
+        # the stores happen in the other process, update() finds the changes
+        Monitor.Changed = 1
+    # redraws 0x200 - 0x5FF if the program wrote to it
     Monitor.update()
-    # monitors 0xFF for character and if 0xFE == 1 then print character
-    Printer.update()
+    if not Args.process:
+        # writes out the characters the program printed (see printer.py)
+        Printer.update()
+    Clock.tick(60)
+    Frames += 1
 
 
-killThread2 = 1
-thread2.join()
\ No newline at end of file
+Seconds = time.perf_counter() - Start
+if Args.process:
+    Instructions = Worker.Instructions.value - Counted[0]
+    Cycles = Worker.Cycles.value - Counted[1]
+    Worker.stop()
+else:
+    killThread2 = 1
+    thread2.join()
+    Printer.flush()
+    if Args.output:
+        Printer.Output.close()
+    Cycles = Governor.Cycles
+print(
+    f"{Instructions / Seconds / 1e6:.2f} MIPS, {Cycles / Seconds / 1e6:.2f} MHz"
+    + ("" if Args.mhz is None else f" (target {Args.mhz:g} MHz)")
+    + f", {Frames / Seconds:.1f} frames/s",
+    file=sys.stderr,
+)
+if Args.stats and not Args.process:
+    print(Cpu.Stats.report(), file=sys.stderr)
+if Args.profile and not Args.process:
+    profileReport(Profiler)
+if Args.calls and not Args.process:
+    callsReport(Cpu.Calls)
+if Args.save_snapshot and not Args.process:
+    saveSnapshot(Cpu, Instructions, Cycles)
+if Args.process:
+    Memory.close()
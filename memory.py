@@ -0,0 +1,346 @@
+"""
+The 64 KiB address space on a compact, pluggable backing store.
+
+A memory keeps one byte per address in a bytearray, an array('B'), a NumPy
+uint8 array, an mmap (anonymous or backed by a file) or a
+multiprocessing.shared_memory block (shared with other processes) instead of a
+list of 65536 Python ints. The list is still available as a backend, CPython indexes
+lists faster than any of the byte stores, but it has no zero-copy view.
+
+Indexing a memory wraps the address to 16 bits and the value to 8 bits, which
+is the only place the wrapping is enforced for devices, loaders and tools. The
+CPU engines index Data directly, they already compute wrapped addresses and
+8-bit values.
+
+pagedmemory is for fleets of machines running one image: the pages of the
+image are shared read-only and an instance gets a private copy of a 256-byte
+page on its first write to it, so an instance costs the pages it writes.
+
+Running this module benchmarks every backend under the CPU hot loop and for
+bulk copies through the memoryview.
+"""
+import array
+import mmap
+import sys
+
+# size of the address space
+SIZE = 1 << 16
+
+# available backing stores
+BACKENDS = ("bytearray", "array", "numpy", "mmap", "shared", "list")
+# page size of pagedmemory
+PAGE = 0x100
+
+
+class memory:
+    """
+    64 KiB of 6502 memory.
+
+    Attributes:
+        Backend (str): Name of the backing store.
+        Store: The backing store itself.
+        Data: What the engines index, int in and int out (the store, or a
+            memoryview of it for NumPy whose items are not Python ints and
+            for shared memory).
+        View (memoryview): Zero-copy byte view of the whole address space for
+            slicing (display, snapshots, loaders), None for the list backend
+            whose slices are copies.
+    """
+
+    def __init__(self, Backend: str = "bytearray", Path: str = None, Name: str = None):
+        """
+        Allocate the memory, zeroed (or with the content of the mapped file or
+        shared block).
+
+        Args:
+            Backend (str): One of BACKENDS.
+            Path (str): File to map for the "mmap" backend, anonymous memory if None.
+                The file is created or resized to 64 KiB.
+            Name (str): Shared memory block to attach to for the "shared"
+                backend, a new block (see Shared.name) is created if None.
+        """
+        self.Backend = Backend
+        self.Shared = None
+        match Backend:
+            case "bytearray":
+                self.Store = bytearray(SIZE)
+            case "array":
+                self.Store = array.array("B", bytes(SIZE))
+            case "numpy":
+                import numpy
+
+                self.Store = numpy.zeros(SIZE, dtype=numpy.uint8)
+            case "mmap":
+                if Path is None:
+                    self.Store = mmap.mmap(-1, SIZE)
+                else:
+                    with open(Path, "a+b") as f:
+                        f.truncate(SIZE)
+                        self.Store = mmap.mmap(f.fileno(), SIZE)
+            case "shared":
+                from multiprocessing import shared_memory
+
+                self.Shared = shared_memory.SharedMemory(Name, create=Name is None, size=SIZE)
+                self.Owner = Name is None
+                self.Store = self.Shared.buf
+            case "list":
+                self.Store = [0] * SIZE
+            case _:
+                raise ValueError(f"unknown memory backend {Backend}")
+        self.View = None if Backend == "list" else memoryview(self.Store).cast("B")
+        self.Data = self.View if Backend in ("numpy", "shared") else self.Store
+
+    def __getitem__(self, Address):
+        if isinstance(Address, slice):
+            return self.Store[Address] if self.View is None else self.View[Address]
+        return self.Data[Address & 0xFFFF]
+
+    def __setitem__(self, Address, Value):
+        if isinstance(Address, slice):
+            if self.View is None:
+                self.Store[Address] = memoryview(Value).cast("B")
+            else:
+                self.View[Address] = Value
+        else:
+            self.Data[Address & 0xFFFF] = Value & 0xFF
+
+    def __len__(self) -> int:
+        return SIZE
+
+    def __iter__(self):
+        return iter(self.Store if self.View is None else self.View)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.Store) if self.View is None else self.View.tobytes()
+
+    def load(self, Data, Address: int = 0):
+        """
+        Copy bytes into memory in one slice assignment.
+
+        Args:
+            Data: Bytes (or anything supporting the buffer protocol).
+            Address (int): Where the first byte goes.
+        """
+        Data = memoryview(Data).cast("B")
+        if Address + len(Data) > SIZE:
+            raise ValueError(f"{len(Data)} bytes do not fit at 0x{Address:04X}")
+        self[Address : Address + len(Data)] = Data
+
+    def close(self):
+        """
+        Release the view and unmap an mmap or shared memory, a shared block is
+        freed by the memory that created it.
+        """
+        if self.View is not None:
+            self.View.release()
+        if self.Backend == "mmap":
+            self.Store.close()
+        elif self.Backend == "shared":
+            self.Store = self.Data = None
+            self.Shared.close()
+            if self.Owner:
+                self.Shared.unlink()
+
+
+def pages(Image=None) -> tuple:
+    """
+    Split an image into the read-only pages shared by paged memories.
+
+    Args:
+        Image: 64 KiB (anything supporting the buffer protocol), zeroes if None.
+
+    Returns:
+        tuple: 256 bytes objects of PAGE bytes, equal pages are one object.
+    """
+    Image = bytes(SIZE) if Image is None else memoryview(Image).cast("B").tobytes()
+    if len(Image) != SIZE:
+        raise ValueError(f"an image has {SIZE} bytes, not {len(Image)}")
+    # equal pages (the zeroed ones most of all) are shared among themselves too
+    Unique = {}
+    return tuple(Unique.setdefault(Page, Page) for Page in (Image[i : i + PAGE] for i in range(0, SIZE, PAGE)))
+
+
+class pagedmemory:
+    """
+    64 KiB of 6502 memory sharing unwritten pages with other instances.
+
+    Every page is either a page of the base (an immutable bytes object shared
+    by all instances created from it) or a private bytearray. Storing into a
+    base page fails with TypeError, which is when the page is copied, so reads
+    and stores into private pages take no check at all. Indexing wraps
+    addresses and values like memory does and the instance itself is what the
+    engines index.
+
+    Attributes:
+        Backend (str): "paged".
+        Base (tuple): The shared pages (see pages()).
+        Table (list): The 256 current pages, shared or private.
+        Dirty (set): Numbers of the pages copied so far.
+        View: None, there is no contiguous store to view.
+    """
+
+    Backend = "paged"
+    View = None
+
+    def __init__(self, Base=None):
+        """
+        Creates an instance, which costs the list of 256 page references.
+
+        Args:
+            Base: The shared pages (from pages(), shared by passing the same
+                tuple to every instance), an image to split, or None for zeroes.
+        """
+        self.Base = Base if isinstance(Base, tuple) else pages(Base)
+        self.Table = list(self.Base)
+        self.Dirty = set()
+        self.Data = self
+
+    def _copy(self, Page: int) -> bytearray:
+        """
+        Make a page private, returns it.
+        """
+        Private = self.Table[Page]
+        if Page not in self.Dirty:
+            Private = self.Table[Page] = bytearray(Private)
+            self.Dirty.add(Page)
+        return Private
+
+    def __getitem__(self, Address):
+        try:
+            return self.Table[Address >> 8][Address & 0xFF]
+        except (IndexError, TypeError):
+            if isinstance(Address, slice):
+                Start, Stop, Step = Address.indices(SIZE)
+                if Step != 1 or Start >= Stop:
+                    return bytes(self)[Address]
+                # just the pages the slice covers
+                First = Start & ~0xFF
+                return b"".join(self.Table[First >> 8 : ((Stop - 1) >> 8) + 1])[Start - First : Stop - First]
+            return self.Table[(Address >> 8) & 0xFF][Address & 0xFF]
+
+    def __setitem__(self, Address, Value):
+        try:
+            self.Table[Address >> 8][Address & 0xFF] = Value
+        except (IndexError, TypeError, ValueError):
+            if isinstance(Address, slice):
+                self._store(Address, Value)
+            else:
+                self._copy((Address >> 8) & 0xFF)[Address & 0xFF] = Value & 0xFF
+
+    def _store(self, Range: slice, Value):
+        """
+        Slice assignment, page by page. A whole page written with the content
+        of its base page goes back to being shared.
+        """
+        Start, Stop, Step = Range.indices(SIZE)
+        Data = memoryview(Value).cast("B")
+        if Step != 1 or len(Data) != max(Stop - Start, 0):
+            raise ValueError("only contiguous slices of the same length can be assigned")
+        Offset = 0
+        while Start < Stop:
+            Page, First = divmod(Start, PAGE)
+            Count = min(PAGE - First, Stop - Start)
+            Chunk = Data[Offset : Offset + Count]
+            if Count == PAGE and Chunk == self.Base[Page]:
+                self.Table[Page] = self.Base[Page]
+                self.Dirty.discard(Page)
+            else:
+                self._copy(Page)[First : First + Count] = Chunk
+            Start += Count
+            Offset += Count
+
+    def __len__(self) -> int:
+        return SIZE
+
+    def __iter__(self):
+        return iter(bytes(self))
+
+    def __bytes__(self) -> bytes:
+        return b"".join(self.Table)
+
+    def load(self, Data, Address: int = 0):
+        """
+        Copy bytes into memory, see memory.load().
+        """
+        Data = memoryview(Data).cast("B")
+        if Address + len(Data) > SIZE:
+            raise ValueError(f"{len(Data)} bytes do not fit at 0x{Address:04X}")
+        self[Address : Address + len(Data)] = Data
+
+    def reset(self):
+        """
+        Drop the private pages, back to the base image.
+        """
+        self.Table = list(self.Base)
+        self.Dirty.clear()
+
+    def footprint(self) -> int:
+        """
+        Bytes this instance holds on its own: the private pages and the table.
+        """
+        return len(self.Dirty) * PAGE + sys.getsizeof(self.Table)
+
+    def close(self):
+        """
+        Nothing to release, for the interface of memory.
+        """
+
+
+def store(Memory):
+    """
+    The object the CPU engines index.
+
+    Args:
+        Memory: A memory, or any indexable store (like the old list of ints).
+
+    Returns:
+        Data of a memory, anything else unchanged.
+    """
+    return Memory.Data if isinstance(Memory, memory) else Memory
+
+
+def _benchmark():
+    """
+    Instructions per second of the CPU engines and bulk copy speed per backend.
+    """
+    import timeit
+
+    from cpu6502 import cpu6502
+    from cpu6502table import cpu6502table
+
+    # copy a page and count in a loop:
+    #   loop: LDY #0 / next: LDA $1000,Y / STA $2000,Y / INC $3000 / INY / BNE next / JMP loop
+    Program = bytes.fromhex("A000 B90010 990020 EE0030 C8 D0F4 4C0002")
+    print(f"{'backend':10} {'step()':>12} {'table':>12} {'run()':>12} {'0x200-0x5FF':>12} {'64 KiB':>12}")
+    for Backend in BACKENDS:
+        try:
+            Memory = memory(Backend)
+        except ImportError:
+            print(f"{Backend:10} not available")
+            continue
+        Memory[0x200 : 0x200 + len(Program)] = Program
+        Memory[0xFFFC], Memory[0xFFFD] = 0x00, 0x02
+        Rates = []
+        for Engine in (cpu6502, cpu6502table):
+            Cpu = Engine(Memory)
+            Count = 200000
+            Time = timeit.timeit(lambda: [Cpu.step() for _ in range(Count)], number=1)
+            Rates.append(Count / Time)
+        Cpu = cpu6502(Memory)
+        Count = 2000000
+        Time = timeit.timeit(lambda: Cpu.run(MaxInstructions=Count), number=1)
+        Rates.append(Count / Time)
+        # bulk copies: the display area and the whole address space
+        Copies = [
+            timeit.timeit(lambda: bytes(Memory[0x200:0x600]), number=10000) / 10000,
+            timeit.timeit(lambda: bytes(Memory[0:SIZE]), number=1000) / 1000,
+        ]
+        print(
+            f"{Backend:10}"
+            + "".join(f" {Rate / 1e6:10.2f} M" for Rate in Rates)
+            + "".join(f" {Copy * 1e6:9.1f} us" for Copy in Copies)
+        )
+
+
+if __name__ == "__main__":
+    _benchmark()
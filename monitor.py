@@ -1,17 +1,25 @@
 import pygame
 import pygame.locals
 
+from framebuffer import PALETTE
+
 
 class monitor:
-    def __init__(self, Memory: list, Scale: int = 1):
+    def __init__(self, Bus, Scale: int = 1, VBlank=None):
         """
-        Initialize the monitor with a reference to the memory and a scale factor.
+        Initialize the monitor, attach it to the bus and set a scale factor.
         Displays values in memory 0x200 - 0x5FF with a 8-bit RGB value (RRRGGGBB).
         Args:
-            Memory (list): The shared memory array to read from.
+            Bus (bus): The system bus, the monitor owns 0x200 - 0x5FF.
             Scale (int): Scale factor for enlarging the display window.
+            VBlank (callable): Called after every frame, presented or not, like
+                cpu.nmi to give the program a vertical blank interrupt.
         """
-        self.Memory = Memory
+        self.Memory = Bus.Data
+        self.VBlank = VBlank
+        # set by stores to the video memory, the next update() redraws
+        self.Changed = 1
+        Bus.attach(self, 0x200, 0x600)
         self.Scale = Scale
         self.WindowOpen = 1
         pygame.init()
@@ -19,51 +27,116 @@ class monitor:
         self.Width = 320 * Scale
         self.Height = 320 * Scale
         self.Display = pygame.display.set_mode((self.Width, self.Height), vsync=1)
+        # RRRGGGBB -> RGB computed once (framebuffer.py), the video memory is
+        # copied as is into an 8-bit paletted 32x32 frame scaled to the window
+        self.Palette = PALETTE
+        self.Frame = pygame.Surface((32, 32), depth=8)
+        self.Frame.set_palette(self.Palette)
+        self.Scaled = pygame.Surface((self.Width, self.Height), depth=8)
+        self.Scaled.set_palette(self.Palette)
+        # video memory as last presented, only the cells that differ are redrawn
+        self.Shown = None
+        self.Cell = 10 * Scale
+        # counters
+        self.FramesPresented = 0
+        self.FramesSkipped = 0
+        self.CellsRedrawn = 0
 
-    def _8bitTo24bitColor(self, Color: int):
+    def write(self, Address: int, Value: int):
         """
-        Convert an 8-bit color value to a 24-bit RGB tuple.
-
-        The 8-bit color format:
-        - Top 3 bits: red (0-7)
-        - Middle 3 bits: green (0-7)
-        - Bottom 2 bits: blue (0-3)
+        Handle a store to the video memory.
 
         Args:
-            Color (int): An 8-bit packed color value.
-
-        Returns:
-            tuple: A (R, G, B) tuple scaled to 8-bit color channels (0-255).
+            Address (int): The written address.
+            Value (int): The stored color.
         """
-        r = (Color >> 5) & 0x7
-        g = (Color >> 2) & 0x7
-        b = Color & 0x3
-        # r / 7 normalize -> scale to 8 bit
-        r = round((r / 7) * 255)
-        g = round((g / 7) * 255)
-        b = round((b / 3) * 255)
-        return (r, g, b)
+        self.Changed = 1
 
     # read memory 0x200 - 0x5FF
     def update(self):
         """
-        Update the monitor display.
+        Update the monitor display, then signal the vertical blank.
+        """
+        self._present()
+        if self.VBlank is not None:
+            self.VBlank()
+
+    def _present(self):
+        """
+        Draw and present the frame.
+
+        Nothing is drawn or presented unless the video memory (0x0200 to
+        0x05FF, 32x32 grid) was written since the last update. Cells whose
+        color changed since the last present are filled and only their
+        rectangles are updated on the screen, when more than a quarter of them
+        changed the whole paletted frame is scaled to the window and blitted.
+        """
+        if not self.Changed:
+            self.FramesSkipped += 1
+            return
+        self.Changed = 0
+        Frame = bytes(self.Memory[0x200:0x600])
+        Shown = self.Shown
+        if Shown is None:
+            Cells = range(1024)
+        else:
+            # compare whole rows first, most of them don't change
+            Cells = [
+                Cell
+                for Row in range(0, 1024, 32)
+                if Frame[Row : Row + 32] != Shown[Row : Row + 32]
+                for Cell in range(Row, Row + 32)
+                if Frame[Cell] != Shown[Cell]
+            ]
+        if not Cells:
+            self.FramesSkipped += 1
+            return
+        self.Shown = Frame
+        self.FramesPresented += 1
+        self.CellsRedrawn += len(Cells)
+        if len(Cells) > 256:
+            self.Frame.get_buffer().write(Frame)
+            pygame.transform.scale(self.Frame, (self.Width, self.Height), self.Scaled)
+            self.Display.blit(self.Scaled, (0, 0))
+            pygame.display.update()
+            return
+        Size = self.Cell
+        Rects = []
+        for Cell in Cells:
+            Rect = ((Cell & 31) * Size, (Cell >> 5) * Size, Size, Size)
+            self.Display.fill(self.Palette[Frame[Cell]], Rect)
+            Rects.append(Rect)
+        pygame.display.update(Rects)
+
+    def snapshot(self) -> dict:
+        """
+        State for a save state (see snapshot.py), the picture is in memory.
 
-        Reads from memory range 0x0200 to 0x05FF (32x32 grid), converts the
-        color values, and draws them as rectangles on the screen.
+        Returns:
+            dict: Nothing.
+        """
+        return {}
+
+    def restore(self, State: dict):
+        """
+        Redraw the whole picture from the restored video memory.
+
+        Args:
+            State (dict): As returned by snapshot().
+        """
+        self.Shown = None
+        self.Changed = 1
+
+    def statistics(self) -> dict:
+        """
+        Rendering counters.
+
+        Returns:
+            dict: Frames presented, frames skipped because nothing changed and
+                cells redrawn.
         """
-        for x in range(32):
-            for y in range(32):
-                M = self.Memory[0x200 + (y * 32) + x]
-                C = self._8bitTo24bitColor(M)
-                pygame.draw.rect(
-                    self.Display,
-                    C,
-                    (
-                        10 * x * self.Scale,
-                        10 * y * self.Scale,
-                        32 * self.Scale,
-                        32 * self.Scale,
-                    ),
-                )
-        pygame.display.update()
+        return {
+            "FramesPresented": self.FramesPresented,
+            "FramesSkipped": self.FramesSkipped,
+            "CellsRedrawn": self.CellsRedrawn,
+        }
@@ -0,0 +1,290 @@
+"""
+Declarative description of the 6502 instruction set as implemented by cpu6502.step().
+
+Every opcode is described as an operation x addressing mode pair together with
+its base cycle count and whether the addressing mode adds a cycle on a page
+crossing. The engines in codegen.py generate their handlers from this table,
+so it has to stay in sync with the reference cpu6502.step().
+"""
+
+# addressing mode -> instruction length in bytes
+MODES = {
+    "imp": 1,  # implied
+    "acc": 1,  # accumulator
+    "imm": 2,  # immediate
+    "zp": 2,  # zeropage
+    "zpx": 2,  # zeropage,X
+    "zpy": 2,  # zeropage,Y
+    "abs": 3,  # absolute
+    "abx": 3,  # absolute,X
+    "aby": 3,  # absolute,Y
+    "ind": 3,  # (indirect) only JMP
+    "izx": 2,  # (indirect,X)
+    "izy": 2,  # (indirect),Y
+    "izy16": 2,  # (indirect),Y without the zeropage wrap (STA in step())
+    "rel": 2,  # relative (branches)
+}
+
+# opcode -> (operation, addressing mode, base cycles, page crossing adds a cycle)
+OPCODES = {
+    # ADC
+    0x69: ("ADC", "imm", 2, False),
+    0x65: ("ADC", "zp", 3, False),
+    0x75: ("ADC", "zpx", 4, False),
+    0x6D: ("ADC", "abs", 4, False),
+    0x7D: ("ADC", "abx", 4, True),
+    0x79: ("ADC", "aby", 4, True),
+    0x61: ("ADC", "izx", 6, False),
+    0x71: ("ADC", "izy", 5, True),
+    # AND
+    0x29: ("AND", "imm", 2, False),
+    0x25: ("AND", "zp", 3, False),
+    0x35: ("AND", "zpx", 4, False),
+    0x2D: ("AND", "abs", 4, False),
+    0x3D: ("AND", "abx", 4, True),
+    0x39: ("AND", "aby", 4, True),
+    0x21: ("AND", "izx", 6, False),
+    0x31: ("AND", "izy", 5, True),
+    # ASL
+    0x0A: ("ASL", "acc", 2, False),
+    0x06: ("ASL", "zp", 5, False),
+    0x16: ("ASL", "zpx", 6, False),
+    0x0E: ("ASL", "abs", 6, False),
+    0x1E: ("ASL", "abx", 7, True),
+    # branches
+    0x90: ("BCC", "rel", 2, False),
+    0xB0: ("BCS", "rel", 2, False),
+    0xF0: ("BEQ", "rel", 2, False),
+    0x30: ("BMI", "rel", 2, False),
+    0xD0: ("BNE", "rel", 2, False),
+    0x10: ("BPL", "rel", 2, False),
+    0x50: ("BVC", "rel", 2, False),
+    0x70: ("BVS", "rel", 2, False),
+    # BIT
+    0x24: ("BIT", "zp", 3, False),
+    0x2C: ("BIT", "abs", 4, False),
+    # BRK
+    0x00: ("BRK", "imp", 7, False),
+    # flag clear
+    0x18: ("CLC", "imp", 2, False),
+    0xD8: ("CLD", "imp", 2, False),
+    0x58: ("CLI", "imp", 2, False),
+    0xB8: ("CLV", "imp", 2, False),
+    # CMP
+    0xC9: ("CMP", "imm", 2, False),
+    0xC5: ("CMP", "zp", 3, False),
+    0xD5: ("CMP", "zpx", 4, False),
+    0xCD: ("CMP", "abs", 4, False),
+    0xDD: ("CMP", "abx", 4, True),
+    0xD9: ("CMP", "aby", 4, True),
+    0xC1: ("CMP", "izx", 6, False),
+    0xD1: ("CMP", "izy", 5, True),
+    # CPX
+    0xE0: ("CPX", "imm", 2, False),
+    0xE4: ("CPX", "zp", 3, False),
+    0xEC: ("CPX", "abs", 4, False),
+    # CPY
+    0xC0: ("CPY", "imm", 2, False),
+    0xC4: ("CPY", "zp", 3, False),
+    0xCC: ("CPY", "abs", 4, False),
+    # DEC
+    0xC6: ("DEC", "zp", 5, False),
+    0xD6: ("DEC", "zpx", 6, False),
+    0xCE: ("DEC", "abs", 6, False),
+    0xDE: ("DEC", "abx", 7, False),
+    0xCA: ("DEX", "imp", 2, False),
+    0x88: ("DEY", "imp", 2, False),
+    # EOR
+    0x49: ("EOR", "imm", 2, False),
+    0x45: ("EOR", "zp", 3, False),
+    0x55: ("EOR", "zpx", 4, False),
+    0x4D: ("EOR", "abs", 4, False),
+    0x5D: ("EOR", "abx", 4, True),
+    0x59: ("EOR", "aby", 4, True),
+    0x41: ("EOR", "izx", 6, False),
+    0x51: ("EOR", "izy", 5, True),
+    # INC
+    0xE6: ("INC", "zp", 5, False),
+    0xF6: ("INC", "zpx", 6, False),
+    0xEE: ("INC", "abs", 6, False),
+    0xFE: ("INC", "abx", 7, False),
+    0xE8: ("INX", "imp", 2, False),
+    0xC8: ("INY", "imp", 2, False),
+    # jumps
+    0x4C: ("JMP", "abs", 3, False),
+    0x6C: ("JMP", "ind", 5, False),
+    0x20: ("JSR", "abs", 6, False),
+    # LDA
+    0xA9: ("LDA", "imm", 2, False),
+    0xA5: ("LDA", "zp", 3, False),
+    0xB5: ("LDA", "zpx", 4, False),
+    0xAD: ("LDA", "abs", 4, False),
+    0xBD: ("LDA", "abx", 4, True),
+    0xB9: ("LDA", "aby", 4, True),
+    0xA1: ("LDA", "izx", 6, False),
+    0xB1: ("LDA", "izy", 5, True),
+    # LDX
+    0xA2: ("LDX", "imm", 2, False),
+    0xA6: ("LDX", "zp", 3, False),
+    0xB6: ("LDX", "zpy", 4, False),
+    0xAE: ("LDX", "abs", 4, False),
+    0xBE: ("LDX", "aby", 4, True),
+    # LDY
+    0xA0: ("LDY", "imm", 2, False),
+    0xA4: ("LDY", "zp", 3, False),
+    0xB4: ("LDY", "zpx", 4, False),
+    0xAC: ("LDY", "abs", 4, False),
+    0xBC: ("LDY", "abx", 4, True),
+    # LSR
+    0x4A: ("LSR", "acc", 2, False),
+    0x46: ("LSR", "zp", 5, False),
+    0x56: ("LSR", "zpx", 6, False),
+    0x4E: ("LSR", "abs", 6, False),
+    0x5E: ("LSR", "abx", 7, False),
+    # NOP
+    0xEA: ("NOP", "imp", 2, False),
+    # ORA
+    0x09: ("ORA", "imm", 2, False),
+    0x05: ("ORA", "zp", 3, False),
+    0x15: ("ORA", "zpx", 4, False),
+    0x0D: ("ORA", "abs", 4, False),
+    0x1D: ("ORA", "abx", 4, True),
+    0x19: ("ORA", "aby", 4, True),
+    0x01: ("ORA", "izx", 6, False),
+    0x11: ("ORA", "izy", 5, True),
+    # stack
+    0x48: ("PHA", "imp", 3, False),
+    0x08: ("PHP", "imp", 3, False),
+    0x68: ("PLA", "imp", 4, False),
+    0x28: ("PLP", "imp", 4, False),
+    # ROL
+    0x2A: ("ROL", "acc", 2, False),
+    0x26: ("ROL", "zp", 5, False),
+    0x36: ("ROL", "zpx", 6, False),
+    0x2E: ("ROL", "abs", 6, False),
+    0x3E: ("ROL", "abx", 7, False),
+    # ROR
+    0x6A: ("ROR", "acc", 2, False),
+    0x66: ("ROR", "zp", 5, False),
+    0x76: ("ROR", "zpx", 6, False),
+    0x6E: ("ROR", "abs", 6, False),
+    0x7E: ("ROR", "abx", 7, False),
+    # returns
+    0x40: ("RTI", "imp", 6, False),
+    0x60: ("RTS", "imp", 6, False),
+    # SBC
+    0xE9: ("SBC", "imm", 2, False),
+    0xE5: ("SBC", "zp", 3, False),
+    0xF5: ("SBC", "zpx", 4, False),
+    0xED: ("SBC", "abs", 4, False),
+    0xFD: ("SBC", "abx", 4, True),
+    0xF9: ("SBC", "aby", 4, True),
+    0xE1: ("SBC", "izx", 6, False),
+    0xF1: ("SBC", "izy", 5, True),
+    # flag set
+    0x38: ("SEC", "imp", 2, False),
+    0xF8: ("SED", "imp", 2, False),
+    0x78: ("SEI", "imp", 2, False),
+    # STA
+    0x85: ("STA", "zp", 3, False),
+    0x95: ("STA", "zpx", 4, False),
+    0x8D: ("STA", "abs", 4, False),
+    0x9D: ("STA", "abx", 5, False),
+    0x99: ("STA", "aby", 5, False),
+    0x81: ("STA", "izx", 6, False),
+    0x91: ("STA", "izy16", 6, False),
+    # STX
+    0x86: ("STX", "zp", 3, False),
+    0x96: ("STX", "zpy", 4, False),
+    0x8E: ("STX", "abs", 4, False),
+    # STY
+    0x84: ("STY", "zp", 3, False),
+    0x94: ("STY", "zpx", 4, False),
+    0x8C: ("STY", "abs", 4, False),
+    # transfers
+    0xAA: ("TAX", "imp", 2, False),
+    0xA8: ("TAY", "imp", 2, False),
+    0xBA: ("TSX", "imp", 2, False),
+    0x8A: ("TXA", "imp", 2, False),
+    0x9A: ("TXS", "imp", 2, False),
+    0x98: ("TYA", "imp", 2, False),
+}
+
+# step() treats every other opcode as a 2 cycle, 1 byte NOP
+UNKNOWN = ("NOP", "imp", 2, False)
+
+# operations that end a basic block because they (may) change PC
+CONTROL = {
+    "BCC", "BCS", "BEQ", "BMI", "BNE", "BPL", "BVC", "BVS",
+    "BRK", "JMP", "JSR", "RTI", "RTS",
+}
+
+
+def decode(Opcode: int) -> tuple:
+    """
+    Look up an opcode.
+
+    Args:
+        Opcode (int): The opcode byte.
+
+    Returns:
+        tuple: (operation, addressing mode, base cycles, page crossing penalty).
+    """
+    return OPCODES.get(Opcode, UNKNOWN)
+
+
+def length(Opcode: int) -> int:
+    """
+    Length of an instruction in bytes.
+
+    Args:
+        Opcode (int): The opcode byte.
+
+    Returns:
+        int: 1, 2 or 3.
+    """
+    return MODES[decode(Opcode)[1]]
+
+
+def disassemble(Memory, Address: int) -> str:
+    """
+    Disassemble the instruction at an address.
+
+    Args:
+        Memory: The memory to read from.
+        Address (int): Address of the opcode.
+
+    Returns:
+        str: Instruction in the usual assembler syntax.
+    """
+    Operation, Mode, _, _ = decode(Memory[Address])
+    lo = Memory[(Address + 1) & 0xFFFF]
+    word = lo + (Memory[(Address + 2) & 0xFFFF] << 8)
+    match Mode:
+        case "imp":
+            return Operation
+        case "acc":
+            return f"{Operation} A"
+        case "imm":
+            return f"{Operation} #${lo:02X}"
+        case "zp":
+            return f"{Operation} ${lo:02X}"
+        case "zpx":
+            return f"{Operation} ${lo:02X},X"
+        case "zpy":
+            return f"{Operation} ${lo:02X},Y"
+        case "abs":
+            return f"{Operation} ${word:04X}"
+        case "abx":
+            return f"{Operation} ${word:04X},X"
+        case "aby":
+            return f"{Operation} ${word:04X},Y"
+        case "ind":
+            return f"{Operation} (${word:04X})"
+        case "izx":
+            return f"{Operation} (${lo:02X},X)"
+        case "izy" | "izy16":
+            return f"{Operation} (${lo:02X}),Y"
+        case "rel":
+            Target = (Address + 2 + (lo - 256 if lo & 0x80 else lo)) & 0xFFFF
+            return f"{Operation} ${Target:04X}"
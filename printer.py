@@ -1,28 +1,157 @@
+import sys
+import threading
+import time
+
+
 class printer:
     """
     A simple memory-mapped printer emulator.
 
-    This device reads from memory location 0xFF when triggered by 0xFE,
-    simulating character output (e.g., console print).
+    This device owns 0xFE and 0xFF on the bus. Storing 1 to 0xFE prints the
+    character at 0xFF (e.g., console print) and clears 0xFE the moment the guest
+    writes it, so the guest never waits for the host.
+
+    In buffered mode the characters go into a ring buffer instead and the host
+    writes them out in large chunks from update(), once FlushSize characters
+    are waiting or FlushInterval seconds passed. If the guest fills the whole
+    buffer before that, the CPU thread flushes it itself.
     """
 
-    def __init__(self, Memory: list):
+    def __init__(
+        self,
+        Bus,
+        Buffered: bool = False,
+        BufferSize: int = 1 << 16,
+        FlushSize: int = 4096,
+        FlushInterval: float = 0.1,
+        Output=None,
+    ):
+        """
+        Initialize the printer and attach it to the bus.
+
+        Args:
+            Bus (bus): The system bus.
+            Buffered (bool): Collect the characters in a ring buffer.
+            BufferSize (int): Capacity of the ring buffer in characters.
+            FlushSize (int): Characters waiting that make update() flush.
+            FlushInterval (float): Seconds after which update() flushes anyway.
+            Output: Text stream to print to, sys.stdout if None.
+        """
+        self.Memory = Bus.Data
+        self.Buffered = Buffered
+        self.Output = sys.stdout if Output is None else Output
+        self.FlushSize = FlushSize
+        self.FlushInterval = FlushInterval
+        # ring buffer, Head and Tail count all characters ever put and flushed
+        self.Buffer = bytearray(BufferSize)
+        self.Head = 0
+        self.Tail = 0
+        self.LastFlush = time.perf_counter()
+        # the CPU thread flushes a full buffer, the host everything else
+        self._Lock = threading.Lock()
+        # statistics
+        self.Characters = 0
+        self.Flushes = 0
+        self.HighWater = 0
+        self.First = None
+        self.Last = None
+        Bus.attach(self, 0xFE, 0x100)
+
+    def write(self, Address: int, Value: int):
         """
-        Initialize the printer with a reference to the shared memory.
+        Handle a store to one of the printer's ports.
+
+        If 1 is stored to 0xFE, the printer reads Memory[0xFF], interprets it
+        as an ASCII character, prints (or buffers) it, and resets the trigger
+        flag to 0.
 
         Args:
-            Memory (list): A list representing system memory.
+            Address (int): The written port.
+            Value (int): The stored value.
         """
-        self.Memory = Memory
+        if Address != 0xFE or Value != 1:
+            return
+        self.Last = time.perf_counter()
+        if self.First is None:
+            self.First = self.Last
+        self.Characters += 1
+        if not self.Buffered:
+            print(chr(self.Memory[0xFF]), end="", file=self.Output, flush=True)
+        else:
+            if self.Head - self.Tail == len(self.Buffer):
+                self.flush()
+            self.Buffer[self.Head % len(self.Buffer)] = self.Memory[0xFF]
+            self.Head += 1
+            self.HighWater = max(self.HighWater, self.Head - self.Tail)
+        self.Memory[0xFE] = 0
 
     def update(self):
         """
-        Check the memory-mapped output trigger and print a character.
+        Flush the buffer if enough characters are waiting or the flush interval
+        passed, called periodically by the host.
+        """
+        Waiting = self.Head - self.Tail
+        if Waiting >= self.FlushSize or (
+            Waiting and time.perf_counter() - self.LastFlush >= self.FlushInterval
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered characters to the output in one write.
+        """
+        with self._Lock:
+            Head = self.Head
+            if Head == self.Tail:
+                return
+            Size = len(self.Buffer)
+            Start, End = self.Tail % Size, Head % Size
+            if Start < End:
+                Text = self.Buffer[Start:End]
+            else:
+                Text = self.Buffer[Start:] + self.Buffer[:End]
+            self.Output.write(Text.decode("latin-1"))
+            self.Output.flush()
+            self.Tail = Head
+            self.Flushes += 1
+            self.LastFlush = time.perf_counter()
+
+    def snapshot(self) -> dict:
+        """
+        State for a save state (see snapshot.py), the characters still
+        buffered are written out first.
+
+        Returns:
+            dict: The printer counters.
+        """
+        self.flush()
+        return {"Characters": self.Characters, "Flushes": self.Flushes, "HighWater": self.HighWater}
+
+    def restore(self, State: dict):
+        """
+        Take over the state of a save state.
+
+        Args:
+            State (dict): As returned by snapshot().
+        """
+        self.Characters = State["Characters"]
+        self.Flushes = State["Flushes"]
+        self.HighWater = State["HighWater"]
+
+    def statistics(self) -> dict:
+        """
+        Printer counters.
 
-        If Memory[0xFE] is set to 1, the printer reads Memory[0xFF],
-        interprets it as an ASCII character, prints it to the console,
-        and resets the trigger flag to 0.
+        Returns:
+            dict: Characters printed, characters per second between the first
+                and the last one, flushes, the highest number of characters
+                that were waiting in the buffer and the number waiting now.
         """
-        if self.Memory[0xFE] == 1:
-            print(chr(self.Memory[0xFF]), end="", flush=True)
-            self.Memory[0xFE] = 0
+        Elapsed = 0 if self.First is None else self.Last - self.First
+        return {
+            "Characters": self.Characters,
+            "CharactersPerSecond": self.Characters / Elapsed if Elapsed else 0.0,
+            "Flushes": self.Flushes,
+            "HighWater": self.HighWater,
+            "Waiting": self.Head - self.Tail,
+        }
@@ -0,0 +1,216 @@
+"""
+Sampling profiler for the guest program.
+
+Instead of the engines being instrumented, the profiler splits the budgets of
+run() into slices of Every instructions (or cycles) and samples the PC between
+them into a 64 Ki-entry histogram, the engines run at full speed in between.
+With the JIT and AOT engines the slices end at block boundaries, so the
+samples land on block entries.
+
+For flame graphs every sample also records the call stack, found by walking
+the hardware stack page for return addresses that point right behind a JSR.
+Names come from a symbols object (see symbols.py).
+"""
+from opcodes import disassemble
+from symbols import describe
+
+# JSR absolute
+_JSR = 0x20
+
+
+class profiler:
+    """
+    Samples the PC of a CPU.
+
+    Use run() in place of Cpu.run(), it has the same budgets and results.
+
+    Attributes:
+        Histogram (list): Address -> samples.
+        Stacks (dict): (call site addresses outermost first..., PC) -> samples.
+        Samples (int): Samples taken.
+    """
+
+    def __init__(self, Cpu, Every: int = 1000, Cycles: bool = False, Stacks: bool = True):
+        """
+        Args:
+            Cpu (cpu6502): The CPU to sample.
+            Every (int): Instructions (or cycles) between two samples.
+            Cycles (bool): Count Every in cycles instead of instructions.
+            Stacks (bool): Also record the call stacks.
+        """
+        self.Cpu = Cpu
+        self.Every = Every
+        self.Cycles = Cycles
+        self.Histogram = [0] * 0x10000
+        self.Stacks = {} if Stacks else None
+        self.Samples = 0
+        # instructions (or cycles) left until the next sample
+        self._Left = Every
+
+    def run(self, MaxInstructions: int = None, MaxCycles: int = None) -> tuple:
+        """
+        Cpu.run() taking a sample every Every instructions (or cycles).
+
+        Args:
+            MaxInstructions (int): Maximum number of instructions, None for no limit.
+            MaxCycles (int): Maximum number of cycles, None for no limit.
+
+        Returns:
+            tuple: (instructions executed, cycles taken).
+        """
+        if MaxInstructions is None:
+            MaxInstructions = 1 << 62
+        if MaxCycles is None:
+            MaxCycles = 1 << 62
+        Cpu = self.Cpu
+        n = c = 0
+        while n < MaxInstructions and c < MaxCycles:
+            if self.Cycles:
+                i, k = Cpu.run(MaxInstructions - n, min(MaxCycles - c, self._Left))
+                self._Left -= k
+            else:
+                i, k = Cpu.run(min(MaxInstructions - n, self._Left), MaxCycles - c)
+                self._Left -= i
+            n += i
+            c += k
+            if self._Left <= 0:
+                self.sample()
+                while self._Left <= 0:
+                    self._Left += self.Every
+            if not i or Cpu.Memory[0xFE] == 127:
+                break
+        return n, c
+
+    def sample(self):
+        """
+        Record the current PC (and call stack).
+        """
+        PC = self.Cpu.PC
+        self.Histogram[PC] += 1
+        self.Samples += 1
+        if self.Stacks is not None:
+            Stack = (*self.callers(), PC)
+            self.Stacks[Stack] = self.Stacks.get(Stack, 0) + 1
+
+    def callers(self) -> list:
+        """
+        The JSR instructions the current code was called from, found in the
+        hardware stack. Pushed data that happens to look like a return address
+        shows up as an extra caller.
+
+        Returns:
+            list: Addresses of the JSRs, outermost first.
+        """
+        M = self.Cpu.Memory
+        Callers = []
+        Address = 0x100 + self.Cpu.SP + 1
+        while Address < 0x1FF:
+            # JSR pushes the address of its last byte, high byte first
+            Call = ((M[Address] | M[Address + 1] << 8) - 2) & 0xFFFF
+            if M[Call] == _JSR:
+                Callers.append(Call)
+                Address += 2
+            else:
+                Address += 1
+        Callers.reverse()
+        return Callers
+
+    def hotspots(self, Symbols=None) -> list:
+        """
+        Samples per symbol.
+
+        Args:
+            Symbols (symbols): Names of the addresses, None for addresses only.
+                With the call stacks recorded, code without a label is named
+                after the function it was called at (see collapsed()).
+
+        Returns:
+            list: (name, samples) tuples, most sampled first.
+        """
+        Totals = {}
+        if Symbols is not None and self.Stacks is not None:
+            for Stack, Count in self.Stacks.items():
+                Name = self._frames(Stack, Symbols)[-1]
+                Totals[Name] = Totals.get(Name, 0) + Count
+        else:
+            for Address, Count in enumerate(self.Histogram):
+                if Count:
+                    Name = describe(Symbols, Address, Offset=False)
+                    Totals[Name] = Totals.get(Name, 0) + Count
+        return sorted(Totals.items(), key=lambda Item: Item[1], reverse=True)
+
+    def report(self, Symbols=None, Top: int = 20) -> str:
+        """
+        Hot spot report: samples per symbol, per segment and the most sampled
+        instructions.
+
+        Args:
+            Symbols (symbols): Names of the addresses, None for addresses only.
+            Top (int): Number of rows per table.
+
+        Returns:
+            str: The report.
+        """
+        Total = self.Samples or 1
+        Unit = "cycles" if self.Cycles else "instructions"
+        Lines = [f"{self.Samples} samples, one every {self.Every} {Unit}"]
+        if Symbols is not None:
+            Lines += ["", f"{'symbol':32} {'samples':>10} {'%':>6}"]
+            for Name, Count in self.hotspots(Symbols)[:Top]:
+                Lines.append(f"{Name:32} {Count:10} {Count / Total:6.1%}")
+            Segments = {}
+            for Address, Count in enumerate(self.Histogram):
+                if Count:
+                    Segment = Symbols.segment(Address) or "?"
+                    Segments[Segment] = Segments.get(Segment, 0) + Count
+            Lines += ["", f"{'segment':32} {'samples':>10} {'%':>6}"]
+            for Name, Count in sorted(Segments.items(), key=lambda Item: Item[1], reverse=True):
+                Lines.append(f"{Name:32} {Count:10} {Count / Total:6.1%}")
+        Lines += ["", f"{'address':7} {'instruction':16} {'symbol':24} {'samples':>10} {'%':>6}"]
+        Addresses = sorted(range(0x10000), key=lambda Address: self.Histogram[Address], reverse=True)
+        for Address in Addresses[:Top]:
+            Count = self.Histogram[Address]
+            if not Count:
+                break
+            Name = Symbols.name(Address, Offset=True) if Symbols is not None else ""
+            Lines.append(
+                f"${Address:04X}   {disassemble(self.Cpu.Memory, Address):16} {Name:24} {Count:10} {Count / Total:6.1%}"
+            )
+        return "\n".join(Lines)
+
+    def _frames(self, Stack: tuple, Symbols) -> list:
+        """
+        Names of the frames of a sampled call stack, outermost first (see
+        collapsed()).
+        """
+        M = self.Cpu.Memory
+        Entries = [None] + [M[(Call + 1) & 0xFFFF] | M[(Call + 2) & 0xFFFF] << 8 for Call in Stack[:-1]]
+        Frames = []
+        for Address, Entry in zip(Stack, Entries):
+            if Symbols is not None and Symbols.symbol(Address) is not None:
+                Frames.append(describe(Symbols, Address, Offset=False))
+            else:
+                Frames.append("root" if Entry is None else describe(Symbols, Entry))
+        return Frames
+
+    def collapsed(self, Path: str, Symbols=None):
+        """
+        Write the sampled call stacks in the collapsed format of flamegraph.pl
+        and similar tools: one "outer;...;inner samples" line per stack.
+
+        Every frame is named after the label holding its call site (the
+        innermost after the one holding the PC), without one after the address
+        the JSR called (see symbols.describe()), the outermost frame after
+        "root" then.
+
+        Args:
+            Path (str): The output file.
+            Symbols (symbols): Names of the addresses.
+        """
+        Collapsed = {}
+        for Stack, Count in self.Stacks.items():
+            Line = ";".join(self._frames(Stack, Symbols))
+            Collapsed[Line] = Collapsed.get(Line, 0) + Count
+        with open(Path, "w") as f:
+            for Line in sorted(Collapsed):
+                f.write(f"{Line} {Collapsed[Line]}\n")
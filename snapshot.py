@@ -0,0 +1,148 @@
+"""
+Save states: the CPU, its memory and its devices in one binary file.
+
+Layout (little endian), version 2:
+    0       header (_HEADER): magic, version, PC, A, X, Y, SP, P, B, pending
+            interrupt requests (bit 0 IRQ, bit 1 NMI), the remaining cycles
+            of the current instruction, the length of the device state,
+            instructions and cycles run before the snapshot
+    64      the 64 KiB memory image
+    65600   device state, JSON object class name -> state of every device
+            on the bus that has snapshot() and restore(State) methods
+
+Version 1 snapshots (the same without the interrupt requests, a zero byte
+there) still load.
+
+Saving writes the image straight from the memory's view, loading maps the
+file and copies the image into the memory in one slice assignment, so both
+take about a millisecond and neither touches single bytes in Python.
+"""
+import json
+import mmap
+import struct
+
+from memory import SIZE, memory
+
+MAGIC = b"6502SNAP"
+VERSION = 2
+# magic, version, PC, A, X, Y, SP, P, B, interrupt requests, Cycles, device
+# state length, instructions, clock
+_HEADER = struct.Struct("<8sHH6BBxIIQQ")
+# bits of the interrupt requests
+_IRQ = 1
+_NMI = 2
+# where the image starts
+IMAGE_OFFSET = 64
+
+
+def save(Path: str, Cpu, Instructions: int = 0, Clock: int = 0):
+    """
+    Write a snapshot of a CPU, its memory and the devices on its bus.
+
+    Args:
+        Path (str): The snapshot file.
+        Cpu (cpu6502): The CPU, stopped between instructions.
+        Instructions (int): Instructions run so far, kept for the resumed run.
+        Clock (int): Cycles run so far.
+    """
+    Devices = {}
+    for Device in Cpu.Bus.Devices:
+        if hasattr(Device, "snapshot"):
+            Devices[type(Device).__name__] = Device.snapshot()
+    State = json.dumps(Devices).encode()
+    Memory = Cpu.Bus.Memory
+    Image = Memory.View if isinstance(Memory, memory) and Memory.View is not None else bytes(Memory)
+    Header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        Cpu.PC,
+        Cpu.A,
+        Cpu.X,
+        Cpu.Y,
+        Cpu.SP,
+        Cpu.P,
+        Cpu.B,
+        (_IRQ if Cpu.IRQPending else 0) | (_NMI if Cpu.NMIPending else 0),
+        Cpu.Cycles,
+        len(State),
+        Instructions,
+        Clock,
+    )
+    with open(Path, "wb") as f:
+        f.write(Header.ljust(IMAGE_OFFSET, b"\0"))
+        f.write(Image)
+        f.write(State)
+
+
+def load(Path: str, Memory) -> dict:
+    """
+    Load the image of a snapshot into a memory and read the rest of it.
+
+    Args:
+        Path (str): The snapshot file.
+        Memory: The memory (or a bus, or any store taking a slice of ints).
+
+    Returns:
+        dict: Registers (PC, A, X, Y, SP, P, B), Interrupts (IRQPending and
+            NMIPending), Cycles, Instructions, Clock and Devices (class name
+            -> state), for restore().
+    """
+    with open(Path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as Map:
+        if len(Map) < IMAGE_OFFSET + SIZE or Map[:8] != MAGIC:
+            raise ValueError(f"{Path} is not a snapshot")
+        Magic, Version, *Registers, Requests, Cycles, Length, Instructions, Clock = _HEADER.unpack_from(Map)
+        if Version not in (1, VERSION):
+            raise ValueError(f"{Path} is a version {Version} snapshot, only versions 1 and {VERSION} are supported")
+        Memory = getattr(Memory, "Memory", Memory)
+        with memoryview(Map)[IMAGE_OFFSET : IMAGE_OFFSET + SIZE] as Image:
+            if isinstance(Memory, memory):
+                Memory.load(Image)
+            else:
+                Memory[0:SIZE] = Image
+        Devices = json.loads(Map[IMAGE_OFFSET + SIZE : IMAGE_OFFSET + SIZE + Length] or b"{}")
+    return {
+        "Registers": dict(zip(("PC", "A", "X", "Y", "SP", "P", "B"), Registers)),
+        "Interrupts": {"IRQPending": bool(Requests & _IRQ), "NMIPending": bool(Requests & _NMI)},
+        "Cycles": Cycles,
+        "Instructions": Instructions,
+        "Clock": Clock,
+        "Devices": Devices,
+    }
+
+
+def restore(Cpu, State: dict):
+    """
+    Put a CPU and its devices into the state of a loaded snapshot, its memory
+    already holds the image (see load()).
+
+    Args:
+        Cpu (cpu6502): The CPU.
+        State (dict): As returned by load().
+    """
+    for Name, Value in State["Registers"].items():
+        setattr(Cpu, Name, Value)
+    Cpu.IRQPending = State["Interrupts"]["IRQPending"]
+    Cpu.NMIPending = State["Interrupts"]["NMIPending"]
+    Cpu.Pending = Cpu.IRQPending or Cpu.NMIPending
+    Cpu.Cycles = State["Cycles"]
+    for Device in Cpu.Bus.Devices:
+        Name = type(Device).__name__
+        if Name in State["Devices"] and hasattr(Device, "restore"):
+            Device.restore(State["Devices"][Name])
+    Cpu.invalidate()
+
+
+def resume(Path: str, Cpu) -> dict:
+    """
+    Load a snapshot into a running CPU: its memory, registers and devices.
+
+    Args:
+        Path (str): The snapshot file.
+        Cpu (cpu6502): The CPU.
+
+    Returns:
+        dict: The snapshot state (see load()).
+    """
+    State = load(Path, Cpu.Bus.Memory)
+    restore(Cpu, State)
+    return State
@@ -0,0 +1,147 @@
+"""
+Execution statistics of a CPU.
+
+The engines generate counted variants of their code when statistics are
+enabled (see cpu6502.enableStats()), every executed instruction increments one
+cell of a histogram indexed by opcode << 2 | extra cycles (0 - 2 above the
+base count: page crossings, taken branches). Everything else is derived from
+it when the report is made, so counting costs a single list increment per
+instruction, and nothing at all while statistics are off. (A flat list, an
+array.array would be more compact but is about three times slower to
+increment.)
+"""
+from codegen import BRANCHES
+from opcodes import decode
+
+
+class stats:
+    """
+    Counters of a CPU.
+
+    Attributes:
+        Counts (list): Opcode << 2 | extra cycles -> executed instructions.
+        Instructions (int): Instructions run() accounted, including skipped
+            spin loop iterations.
+        Cycles (int): Cycles run() accounted.
+        Seconds (float): Host time spent in run().
+    """
+
+    def __init__(self):
+        self.Counts = [0] * (256 * 4)
+        self.Instructions = 0
+        self.Cycles = 0
+        self.Seconds = 0.0
+
+    def opcodes(self) -> list:
+        """
+        Per-opcode counters of the executed instructions.
+
+        Returns:
+            list: One dict per opcode that ran (Opcode, Operation, Mode, Count,
+                Cycles, Penalties (page crossing cycles), Taken and NotTaken
+                for branches), most executed first.
+        """
+        Rows = []
+        for Opcode in range(256):
+            Histogram = self.Counts[Opcode << 2 : (Opcode << 2) + 4]
+            Count = sum(Histogram)
+            if not Count:
+                continue
+            Operation, Mode, Base, _ = decode(Opcode)
+            Extra = Histogram[1] + 2 * Histogram[2]
+            Row = {
+                "Opcode": Opcode,
+                "Operation": Operation,
+                "Mode": Mode,
+                "Count": Count,
+                "Cycles": Count * Base + Extra,
+                "Penalties": Extra,
+                "Taken": 0,
+                "NotTaken": 0,
+            }
+            if Operation in BRANCHES:
+                # a taken branch costs 1 cycle, 2 into another page
+                Row["Taken"] = Histogram[1] + Histogram[2]
+                Row["NotTaken"] = Histogram[0]
+                Row["Penalties"] = Histogram[2]
+            Rows.append(Row)
+        Rows.sort(key=lambda Row: Row["Count"], reverse=True)
+        return Rows
+
+    def modes(self) -> list:
+        """
+        Executed instructions and cycles per addressing mode.
+
+        Returns:
+            list: (mode, instructions, cycles) tuples, most executed first.
+        """
+        Modes = {}
+        for Row in self.opcodes():
+            Count, Cycles = Modes.get(Row["Mode"], (0, 0))
+            Modes[Row["Mode"]] = (Count + Row["Count"], Cycles + Row["Cycles"])
+        return sorted(((Mode, *Totals) for Mode, Totals in Modes.items()), key=lambda Row: Row[1], reverse=True)
+
+    def summary(self) -> dict:
+        """
+        Totals.
+
+        Returns:
+            dict: Instructions, cycles and seconds of run(), instructions and
+                cycles the engine executed (without skipped spin loops), page
+                crossing penalty cycles, taken and not taken branches, MIPS and
+                MHz of the host.
+        """
+        Rows = self.opcodes()
+        Branches = [Row for Row in Rows if Row["Operation"] in BRANCHES]
+        return {
+            "Instructions": self.Instructions,
+            "Cycles": self.Cycles,
+            "Seconds": self.Seconds,
+            "Executed": sum(Row["Count"] for Row in Rows),
+            "ExecutedCycles": sum(Row["Cycles"] for Row in Rows),
+            "PageCrossings": sum(Row["Penalties"] for Row in Rows),
+            "Taken": sum(Row["Taken"] for Row in Branches),
+            "NotTaken": sum(Row["NotTaken"] for Row in Branches),
+            "MIPS": self.Instructions / self.Seconds / 1e6 if self.Seconds else 0.0,
+            "MHz": self.Cycles / self.Seconds / 1e6 if self.Seconds else 0.0,
+        }
+
+    def report(self, Top: int = 20, Totals: bool = True) -> str:
+        """
+        Human readable report of the totals, the most executed opcodes and the
+        addressing modes.
+
+        Args:
+            Top (int): Number of opcodes listed.
+            Totals (bool): Start with the instructions, cycles and time of the
+                run, False when the caller already printed them.
+
+        Returns:
+            str: The report.
+        """
+        Summary = self.summary()
+        Executed = Summary["Executed"] or 1
+        Lines = []
+        if Totals:
+            Lines.append(
+                f"{Summary['Instructions']} instructions, {Summary['Cycles']} cycles in {Summary['Seconds']:.3f} s"
+                f" ({Summary['MIPS']:.2f} MIPS, {Summary['MHz']:.2f} MHz)"
+            )
+        Lines += [
+            f"executed {Summary['Executed']} instructions, {Summary['ExecutedCycles']} cycles"
+            f" ({Summary['ExecutedCycles'] / Executed:.2f} cycles per instruction)",
+            f"page crossing penalties {Summary['PageCrossings']} cycles,"
+            f" branches taken {Summary['Taken']}, not taken {Summary['NotTaken']}",
+            "",
+            f"{'opcode':8} {'instruction':12} {'count':>12} {'%':>6} {'cycles':>12} {'penalty':>9} {'taken':>9}",
+        ]
+        for Row in self.opcodes()[:Top]:
+            Taken = f"{Row['Taken'] / (Row['Taken'] + Row['NotTaken']):.0%}" if Row["Operation"] in BRANCHES else ""
+            Lines.append(
+                f"0x{Row['Opcode']:02X}     {Row['Operation'] + ' ' + Row['Mode']:12} {Row['Count']:12}"
+                f" {Row['Count'] / Executed:6.1%} {Row['Cycles']:12} {Row['Penalties']:9} {Taken:>9}"
+            )
+        Lines += ["", f"{'mode':8} {'count':>12} {'%':>6} {'cycles':>12}"]
+        for Mode, Count, Cycles in self.modes():
+            Lines.append(f"{Mode:8} {Count:12} {Count / Executed:6.1%} {Cycles:12}")
+        return "\n".join(Lines)
@@ -0,0 +1,215 @@
+"""
+Guest symbols and segments from the cc65 tool chain.
+
+Three sources are understood:
+    ld65 map file (ld65 -m main.map)        segments and exported symbols
+    ld65 debug file (ld65 --dbgfile main.dbg, objects assembled with -g)
+                                            segments, all file level labels
+                                            and the sizes of the C functions
+    linker configuration (linker.cfg)       segments with a fixed start only,
+                                            they are assumed to reach up to
+                                            the next one
+"""
+import bisect
+import re
+
+from loader import number
+
+_SEGMENT_ROW = re.compile(r"^(\S+)\s+([0-9A-Fa-f]{6})\s+([0-9A-Fa-f]{6})\s+([0-9A-Fa-f]{6})\s+[0-9A-Fa-f]{5}$")
+_EXPORT = re.compile(r"(\S+)\s+([0-9A-Fa-f]{6})\s+([A-Z ]?[A-Z]{2})\b")
+_FIELD = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|[^,]*)')
+_BLOCK = re.compile(r"(MEMORY|SEGMENTS)\s*\{(.*?)\}", re.DOTALL)
+_ATTRIBUTE = re.compile(r"(\w+)\s*=\s*([^,;]+)")
+
+
+def describe(Symbols, Address: int, Offset: bool = True) -> str:
+    """
+    Name of a code address in the profiler and call graph reports: its label,
+    else its address and segment, so code without labels is not lumped into
+    one entry per segment.
+
+    Args:
+        Symbols (symbols): The symbols, None for the address only.
+        Address (int): The address.
+        Offset (bool): Append +offset to the label, False to name every
+            address inside a label after it.
+
+    Returns:
+        str: The name.
+    """
+    if Symbols is None:
+        return f"${Address:04X}"
+    Symbol = Symbols.symbol(Address)
+    if Symbol is not None and not Offset:
+        return Symbol[0]
+    return Symbols.name(Address, Offset=True)
+
+
+class symbols:
+    """
+    Address -> symbol and segment lookup.
+
+    Attributes:
+        Segments (list): (start, end (exclusive), name) sorted by start.
+        Labels (list): (address, name, size or None) sorted by address.
+    """
+
+    def __init__(self, *Paths: str):
+        """
+        Args:
+            Paths (str): Files to load right away (see load()).
+        """
+        self.Segments = []
+        self.Labels = []
+        # (address, name) -> size, the labels from all files
+        self._Labels = {}
+        self._Starts = []
+        for Path in Paths:
+            self.load(Path)
+
+    def load(self, Path: str):
+        """
+        Load a map file, a debug file or a linker configuration, told apart by
+        their content.
+
+        Args:
+            Path (str): The file.
+        """
+        with open(Path) as f:
+            Text = f.read()
+        if Text.startswith("version\t"):
+            self._debug(Text)
+        elif "Segment list:" in Text or "Exports list" in Text:
+            self._map(Text)
+        elif _BLOCK.search(Text):
+            self._config(Text)
+        else:
+            raise ValueError(f"{Path} is not an ld65 map, debug or configuration file")
+        self.Segments.sort()
+        self.Labels = sorted((Address, Name, Size) for (Address, Name), Size in self._Labels.items())
+        self._Starts = [Label[0] for Label in self.Labels]
+
+    def _map(self, Text: str):
+        Section = None
+        for Line in Text.splitlines():
+            if Line.endswith(":") and not Line.startswith(" "):
+                Section = Line[:-1]
+                continue
+            if Section == "Segment list":
+                Row = _SEGMENT_ROW.match(Line.strip())
+                if Row and int(Row.group(4), 16):
+                    self._segment(int(Row.group(2), 16), int(Row.group(3), 16) + 1, Row.group(1))
+            elif Section == "Exports list by name":
+                for Name, Value, Flags in _EXPORT.findall(Line):
+                    # labels only, no equates or the linker's __NAME__ symbols
+                    if "L" in Flags and not Name.startswith("__"):
+                        self._label(int(Value, 16), Name, None)
+
+    def _debug(self, Text: str):
+        Records = {}
+        for Line in Text.splitlines():
+            Kind, _, Rest = Line.partition("\t")
+            Fields = {Key: Value.strip('"') for Key, Value in _FIELD.findall(Rest)}
+            Records.setdefault(Kind, []).append(Fields)
+        for Segment in Records.get("seg", []):
+            Start, Size = int(Segment["start"], 0), int(Segment["size"], 0)
+            if Size:
+                self._segment(Start, Start + Size, Segment["name"])
+        # the size of a symbol is the size of the scope (C function) it opens
+        Sizes = {
+            Scope["sym"]: int(Scope["size"], 0)
+            for Scope in Records.get("scope", [])
+            if "sym" in Scope and "size" in Scope
+        }
+        # labels in named scopes are local to a function
+        FileScopes = {Scope["id"] for Scope in Records.get("scope", []) if not Scope.get("name")}
+        for Symbol in Records.get("sym", []):
+            if Symbol.get("type") != "lab" or "val" not in Symbol or "parent" in Symbol:
+                continue
+            if Symbol.get("scope") in FileScopes or Symbol["id"] in Sizes:
+                self._label(int(Symbol["val"], 0), Symbol["name"], Sizes.get(Symbol["id"]))
+
+    def _config(self, Text: str):
+        Text = re.sub(r"#.*", "", Text)
+        Areas, Placed = {}, []
+        for Block, Body in _BLOCK.findall(Text):
+            for Entry in Body.split(";"):
+                Name, _, Attributes = Entry.partition(":")
+                Attributes = {Key: Value.strip() for Key, Value in _ATTRIBUTE.findall(Attributes)}
+                if Block == "MEMORY" and "start" in Attributes:
+                    Start = number(Attributes["start"])
+                    Areas[Name.strip()] = [Start, Start + number(Attributes.get("size", "0")), False]
+                elif Block == "SEGMENTS" and Attributes.get("load") in Areas:
+                    Area = Areas[Attributes["load"]]
+                    if "start" in Attributes:
+                        Placed.append((number(Attributes["start"]), Name.strip(), Area))
+                    elif not Area[2]:
+                        # the first segment of an area starts with it
+                        Placed.append((Area[0], Name.strip(), Area))
+                    Area[2] = True
+        for Start, Name, Area in Placed:
+            End = min([Other for Other, _, Same in Placed if Same is Area and Other > Start] + [Area[1]])
+            self._segment(Start, End, Name)
+
+    def _segment(self, Start: int, End: int, Name: str):
+        if (Start, End, Name) not in self.Segments:
+            self.Segments.append((Start, End, Name))
+
+    def _label(self, Address: int, Name: str, Size):
+        if self._Labels.get((Address, Name)) is None:
+            self._Labels[Address, Name] = Size
+
+    def segment(self, Address: int):
+        """
+        The segment holding an address.
+
+        Args:
+            Address (int): The address.
+
+        Returns:
+            str: Segment name, None if no segment covers it.
+        """
+        for Start, End, Name in self.Segments:
+            if Start <= Address < End:
+                return Name
+        return None
+
+    def symbol(self, Address: int) -> tuple:
+        """
+        The label an address belongs to: the closest one at or below it in the
+        same segment (and within its size, if known).
+
+        Args:
+            Address (int): The address.
+
+        Returns:
+            tuple: (name, offset from the label), or None.
+        """
+        i = bisect.bisect_right(self._Starts, Address)
+        if not i:
+            return None
+        Start, Name, Size = self.Labels[i - 1]
+        if Size is not None and Address >= Start + Size:
+            return None
+        if self.segment(Start) != self.segment(Address):
+            return None
+        return Name, Address - Start
+
+    def name(self, Address: int, Offset: bool = False) -> str:
+        """
+        Printable name of an address: its label, else its segment, else hex.
+
+        Args:
+            Address (int): The address.
+            Offset (bool): Append +offset to the label.
+
+        Returns:
+            str: The name.
+        """
+        Symbol = self.symbol(Address)
+        if Symbol is not None:
+            return f"{Symbol[0]}+{Symbol[1]}" if Offset and Symbol[1] else Symbol[0]
+        Segment = self.segment(Address)
+        if Segment is not None:
+            return f"${Address:04X} [{Segment}]" if Offset else f"[{Segment}]"
+        return f"${Address:04X}"
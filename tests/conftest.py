@@ -0,0 +1,18 @@
+import os
+import sys
+
+# the modules live flat in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def program(Code: dict, Start: int) -> bytes:
+    """
+    A 64 KiB image with code at addresses and the reset vector at Start.
+    """
+    Image = bytearray(0x10000)
+    for Address, Bytes in Code.items():
+        for i, Value in enumerate(Bytes):
+            Image[(Address + i) & 0xFFFF] = Value
+    Image[0xFFFC], Image[0xFFFD] = Start & 0xFF, Start >> 8
+    return bytes(Image)
@@ -0,0 +1,125 @@
+"""
+The engines in lockstep with the reference step(), see difftest.py.
+"""
+import glob
+import json
+import os
+import random
+
+import pytest
+
+from conftest import ROOT, program
+from difftest import DIFF_ENGINES, diverges, fuzz, image, lockstep, machine, randomState, state
+
+CANDIDATES = [Engine for Engine in DIFF_ENGINES if Engine != "step"]
+EXAMPLES = ("example1", "example2", "example3")
+# shrunk divergences written with difftest.py --reproducer
+REPRODUCERS = sorted(glob.glob(os.path.join(ROOT, "tests", "reproducers", "*.json")))
+
+
+@pytest.fixture(scope="module")
+def cache(tmp_path_factory):
+    """
+    Module cache of the AOT engine.
+    """
+    return str(tmp_path_factory.mktemp("aot"))
+
+
+@pytest.mark.parametrize("Example", EXAMPLES)
+@pytest.mark.parametrize("Candidate", CANDIDATES)
+def test_example(Example, Candidate, cache):
+    with open(os.path.join(ROOT, Example, "main.bin"), "rb") as f:
+        Lockstep = lockstep(f.read(), None, Candidate, CacheDirectory=cache)
+    assert Lockstep.run(20000) is None
+    assert Lockstep.Instructions > 0
+
+
+def test_vector():
+    pytest.importorskip("numpy")
+    from cpu6502vector import cpu6502vector
+
+    # the examples and random states, each instance stepped against its own
+    # reference step()
+    States = []
+    for Example in EXAMPLES:
+        with open(os.path.join(ROOT, Example, "main.bin"), "rb") as f:
+            States.append((f.read(), None))
+    States += [randomState(random.Random(Seed)) for Seed in range(100, 120)]
+    Vector = cpu6502vector([Image for Image, _ in States])
+    References = [machine("step", Image, Registers) for Image, Registers in States]
+    for i, Ref in enumerate(References):
+        for Name in ("PC", "A", "X", "Y", "SP", "NZ", "V", "D", "I", "C"):
+            getattr(Vector, Name)[i] = getattr(Ref, Name)
+    Cycles = [0] * len(References)
+    for Step in range(2000):
+        Active = Vector.Active.copy()
+        Vector.step()
+        for i, Ref in enumerate(References):
+            if not Active[i]:
+                continue
+            Ref.step()
+            Cycles[i] += Ref.Cycles
+            Expected = dict(state(Ref), P=Ref.P & ~0x10, Cycles=Cycles[i], Instructions=Step + 1)
+            assert Vector.registers(i) == Expected, f"instance {i} after {Step + 1} instructions"
+            assert Vector.M[i].tobytes() == bytes(Ref.Memory), f"instance {i} after {Step + 1} instructions"
+            assert Vector.Active[i] == (Ref.Memory[0xFE] != 127)
+    for i, Ref in enumerate(References):
+        assert Vector.output(i) == Ref.Bus.Devices[0].Output.getvalue()
+
+
+@pytest.mark.parametrize("Candidate", CANDIDATES)
+@pytest.mark.parametrize(
+    "Code",
+    [
+        # ADC $0000,Y, the operand wraps to $0000 and $0001
+        {0xFFFF: [0x79]},
+        # LDA #$42, the operand is at $0000
+        {0xFFFF: [0xA9], 0x0000: [0x42]},
+        # JMP $1234 straddling the end of memory
+        {0xFFFF: [0x4C], 0x0000: [0x34, 0x12]},
+    ],
+)
+def test_wrap(Candidate, Code, cache):
+    Registers = {"PC": 0xFFFF, "A": 0, "X": 0, "Y": 0, "SP": 0xFF, "P": 0x20}
+    assert diverges(program(Code, 0xFFFF), Registers, Candidate, CacheDirectory=cache) is None
+
+
+@pytest.mark.parametrize("Candidate", CANDIDATES)
+def test_random(Candidate, cache):
+    # random state 102 runs into an instruction at $FFFF
+    assert fuzz(10, 100, Candidate, Seed=100, CacheDirectory=cache) is None
+
+
+@pytest.mark.parametrize("Candidate", CANDIDATES)
+@pytest.mark.parametrize("Path", REPRODUCERS, ids=os.path.basename)
+def test_replay(Candidate, Path, cache):
+    with open(Path) as f:
+        Reproducer = json.load(f)
+    assert diverges(image(Reproducer), Reproducer["Registers"], Candidate, Reproducer["Reference"], cache) is None
+
+
+@pytest.mark.parametrize("Engine", DIFF_ENGINES)
+@pytest.mark.parametrize(
+    "Opcode, Port, Expected",
+    [
+        # INC $FE from 0 prints and clears the port, the flags are of 1
+        (0xE6, 0x00, 0x00),
+        # DEC $FE from 2 likewise
+        (0xC6, 0x02, 0x00),
+        # DEC $FE from 1 writes 0, nothing is printed
+        (0xC6, 0x01, 0x02),
+    ],
+)
+def test_port_flags(Engine, Opcode, Port, Expected, cache):
+    Image = bytearray(program({0x5A40: [Opcode, 0xFE]}, 0x5A40))
+    Image[0xFE] = Port
+    Registers = {"PC": 0x5A40, "A": 0, "X": 0, "Y": 0, "SP": 0xFF, "P": 0x20}
+    Cpu = machine(Engine, bytes(Image), Registers, cache)
+    if Engine in ("step", "table"):
+        Cpu.step()
+    else:
+        Cpu.run(MaxInstructions=1)
+    assert Cpu.PC == 0x5A42
+    assert Cpu.P & 0x82 == Expected
+    if Engine != "step":
+        assert diverges(bytes(Image), Registers, Engine, CacheDirectory=cache) is None
@@ -0,0 +1,97 @@
+"""
+IRQ and NMI requests taken by run() between instructions, see cpu6502.irq().
+"""
+import pytest
+
+from conftest import program
+from difftest import DIFF_ENGINES, machine
+
+ENGINES = [Engine for Engine in DIFF_ENGINES if Engine != "run"]
+# forever INX, JMP back; the NMI handler increments $11, the IRQ handler $12
+CODE = {
+    0x1000: [0xE8, 0x4C, 0x00, 0x10],
+    0x2000: [0xE6, 0x11, 0x40],
+    0x3000: [0xE6, 0x12, 0x40],
+    0xFFFA: [0x00, 0x20],
+    0xFFFE: [0x00, 0x30],
+}
+
+
+@pytest.fixture(scope="module")
+def cache(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("aot"))
+
+
+def cpu(Engine: str, P: int, cache: str):
+    """
+    A CPU at the start of the loop with the status register P, after a run()
+    so the block engines have translated it.
+    """
+    Cpu = machine(Engine, program(CODE, 0x1000), None, cache)
+    Cpu.run(MaxInstructions=4)
+    assert Cpu.PC == 0x1000
+    Cpu.P = P
+    return Cpu
+
+
+def entered(Cpu, Handler: int, P: int):
+    """
+    Check a CPU entered a handler from the loop start with status P.
+    """
+    M = Cpu.Memory
+    assert Cpu.PC == Handler
+    assert Cpu.I == 1
+    assert Cpu.SP == 0xFC
+    # PC high, PC low, P with B clear
+    assert (M[0x1FF], M[0x1FE]) == (0x10, 0x00)
+    assert M[0x1FD] == P & ~0x10 | 0x20
+
+
+@pytest.mark.parametrize("Engine", ENGINES)
+def test_irq(Engine, cache):
+    Cpu = cpu(Engine, 0x31, cache)
+    Cpu.irq()
+    # taken before the first instruction, without executing one
+    assert Cpu.run(MaxInstructions=0) == (0, 7)
+    entered(Cpu, 0x3000, 0x31)
+    assert not Cpu.Pending and not Cpu.IRQPending
+
+
+@pytest.mark.parametrize("Engine", ENGINES)
+def test_irq_masked(Engine, cache):
+    Cpu = cpu(Engine, 0x24, cache)
+    Cpu.irq()
+    Cpu.run(MaxInstructions=100)
+    assert Cpu.IRQPending and Cpu.Memory[0x12] == 0
+    assert 0x1000 <= Cpu.PC < 0x1004
+    # CLI, the request is still there
+    Cpu.I = 0
+    Cpu.PC = 0x1000
+    assert Cpu.run(MaxInstructions=0) == (0, 7)
+    entered(Cpu, 0x3000, 0x20)
+
+
+@pytest.mark.parametrize("Engine", ENGINES)
+def test_nmi(Engine, cache):
+    Cpu = cpu(Engine, 0xE5, cache)
+    Cpu.nmi()
+    # I doesn't mask it
+    assert Cpu.run(MaxInstructions=0) == (0, 7)
+    entered(Cpu, 0x2000, 0xE5)
+    assert not Cpu.Pending and not Cpu.NMIPending
+
+
+@pytest.mark.parametrize("SpinDetection", (False, True))
+@pytest.mark.parametrize("Engine", ENGINES)
+def test_both(Engine, SpinDetection, cache):
+    Cpu = cpu(Engine, 0x20, cache)
+    Cpu.SpinDetection = SpinDetection
+    Cpu.irq()
+    Cpu.nmi()
+    Cpu.run(MaxInstructions=100)
+    M = Cpu.Memory
+    # the NMI first, the IRQ right after its RTI, both from the loop start
+    assert (M[0x11], M[0x12]) == (1, 1)
+    assert (M[0x1FF], M[0x1FE]) == (0x10, 0x00)
+    assert Cpu.SP == 0xFF and Cpu.I == 0
+    assert not Cpu.Pending
@@ -0,0 +1,133 @@
+"""
+Program formats and the reset vector, see loader.py.
+"""
+import os
+
+import pytest
+
+from conftest import ROOT
+from loader import boot, load
+from memory import memory
+
+EXAMPLE = os.path.join(ROOT, "example3")
+BACKENDS = ("bytearray", "list")
+
+
+def record(Type: int, Offset: int, Data: bytes) -> str:
+    """
+    An Intel HEX record with its checksum.
+    """
+    Record = bytes([len(Data), Offset >> 8, Offset & 0xFF, Type]) + Data
+    return ":" + (Record + bytes([-sum(Record) & 0xFF])).hex().upper()
+
+
+def write(Path, Data) -> str:
+    if isinstance(Data, str):
+        Path.write_text(Data)
+    else:
+        Path.write_bytes(Data)
+    return str(Path)
+
+
+@pytest.mark.parametrize("Backend", BACKENDS)
+def test_bin(Backend):
+    Memory = memory(Backend)
+    Path = os.path.join(EXAMPLE, "main.bin")
+    with open(Path, "rb") as f:
+        Image = f.read()
+    assert boot(Memory, [(Path, None)]) == Image[0xFFFC] | Image[0xFFFD] << 8
+    assert bytes(Memory) == Image
+
+
+@pytest.mark.parametrize("Backend", BACKENDS)
+def test_bin_partial(Backend, tmp_path):
+    Memory = memory(Backend)
+    Path = write(tmp_path / "rom.bin", bytes([0xEA, 0x4C, 0x00, 0x90]))
+    assert load(Memory, Path, 0x9000) == ([(0x9000, 0x9004)], None)
+    # no image covers the reset vector, the first byte loaded is the start
+    assert boot(Memory, [(Path, 0x9000)]) == 0x9000
+    assert bytes(Memory[0x9000:0x9004]) == bytes([0xEA, 0x4C, 0x00, 0x90])
+    assert boot(Memory, [(Path, 0x9000)], Reset=0x9001) == 0x9001
+
+
+@pytest.mark.parametrize("Backend", BACKENDS)
+def test_prg(Backend, tmp_path):
+    Memory = memory(Backend)
+    Path = write(tmp_path / "game.prg", bytes([0x00, 0xC0, 0xA9, 0x01, 0x60]))
+    assert load(Memory, Path) == ([(0xC000, 0xC003)], None)
+    assert bytes(Memory[0xC000:0xC003]) == bytes([0xA9, 0x01, 0x60])
+    assert boot(Memory, [(Path, None)]) == 0xC000
+    # an address given overrides the header
+    assert load(Memory, Path, 0x2000) == ([(0x2000, 0x2003)], None)
+
+
+@pytest.mark.parametrize("Backend", BACKENDS)
+def test_hex(Backend, tmp_path):
+    Memory = memory(Backend)
+    Lines = [
+        record(0x00, 0x0400, bytes([0xA2, 0x00, 0xE8])),
+        # extended segment address 0, the base stays 0
+        record(0x02, 0x0000, bytes([0x00, 0x00])),
+        record(0x00, 0x0403, bytes([0x4C, 0x02, 0x04])),
+        record(0x05, 0x0000, bytes([0x00, 0x00, 0x04, 0x02])),
+        record(0x01, 0x0000, b""),
+        # after the end of file record, ignored
+        record(0x00, 0x0500, b"\xFF"),
+    ]
+    Path = write(tmp_path / "program.hex", "\n".join(Lines) + "\n")
+    assert load(Memory, Path) == ([(0x0400, 0x0403), (0x0403, 0x0406)], 0x0402)
+    assert bytes(Memory[0x0400:0x0406]) == bytes([0xA2, 0x00, 0xE8, 0x4C, 0x02, 0x04])
+    assert Memory[0x0500] == 0
+    # the start address record sets the reset vector
+    assert boot(Memory, [(Path, None)]) == 0x0402
+
+
+@pytest.mark.parametrize("Backend", BACKENDS)
+def test_cfg(Backend):
+    Memory = memory(Backend)
+    with open(os.path.join(EXAMPLE, "main.bin"), "rb") as f:
+        Image = f.read()
+    # every area is filled, one after the other in main.bin
+    assert boot(Memory, [(os.path.join(EXAMPLE, "linker.cfg"), None)]) == Image[0xFFFC] | Image[0xFFFD] << 8
+    assert bytes(Memory) == Image
+
+
+def test_cfg_files(tmp_path):
+    Memory = memory("bytearray")
+    write(tmp_path / "zp.bin", bytes(range(16)))
+    write(tmp_path / "rom.bin", bytes([0xEA] * 8) + bytes([0x00, 0xF0]))
+    Config = """
+        # two files, the second area of rom.bin is not filled
+        MEMORY {
+            ZP: start = $0000, size = $10, file = "zp.bin";
+            ROM: start = $F000, size = 8, fill = yes, file = "rom.bin";
+            VECTOR: start = $FFFC, size = 4, file = "rom.bin";
+            RAM: start = $0200, size = $100, file = "";
+        }
+    """
+    Path = write(tmp_path / "linker.cfg", Config)
+    assert load(Memory, Path) == ([(0x0000, 0x0010), (0xF000, 0xF008), (0xFFFC, 0xFFFE)], None)
+    assert boot(Memory, [(Path, None)]) == 0xF000
+    assert bytes(Memory[0:16]) == bytes(range(16))
+
+
+@pytest.mark.parametrize(
+    "Name, Data, Message",
+    [
+        ("bad.hex", record(0x00, 0x0400, b"\xEA")[:-2] + "00\n", "bad length or checksum"),
+        ("short.hex", ":0004\n", "bad length or checksum"),
+        ("text.hex", "hello\n", "not an Intel HEX record"),
+        ("high.hex", record(0x00, 0xFFFF, b"\xEA\xEA") + "\n", "data above 0xFFFF"),
+        ("empty.prg", b"", "has no load address"),
+        ("short.prg", b"\x00", "has no load address"),
+        ("big.prg", b"\x00\xFF" + bytes(0x101), "do not fit at 0xFF00"),
+        ("short.cfg", "MEMORY { ROM: start = $F000, size = $10, fill = yes, file = \"rom.bin\"; }", "ends after 4 of 16 bytes"),
+        ("gap.cfg", "MEMORY { A: start = 0, size = 4, file = \"rom.bin\"; B: start = 8, size = 4, file = \"rom.bin\"; }", "area A is not filled"),
+        ("none.cfg", "SEGMENTS { CODE: load = RAM; }", "has no MEMORY block"),
+    ],
+)
+def test_malformed(Name, Data, Message, tmp_path):
+    write(tmp_path / "rom.bin", bytes(4))
+    Path = write(tmp_path / Name, Data)
+    with pytest.raises(ValueError, match=Message):
+        load(memory("bytearray"), Path)
@@ -0,0 +1,95 @@
+"""
+Copy-on-write paged memory, see memory.pagedmemory.
+"""
+import pytest
+
+from cpu6502table import cpu6502table
+from memory import PAGE, SIZE, memory, pagedmemory, pages
+
+
+@pytest.fixture
+def Image():
+    # every page different, page 0x40 zero like the ones around it
+    Image = bytearray(i * 7 + (i >> 8) & 0xFF for i in range(SIZE))
+    Image[0x3F00:0x4200] = bytes(0x300)
+    return bytes(Image)
+
+
+def test_shared(Image):
+    Base = pages(Image)
+    assert b"".join(Base) == Image
+    # equal pages are one object
+    assert Base[0x3F] is Base[0x40] is Base[0x41]
+    Parent, Child = pagedmemory(Base), pagedmemory(Base)
+    assert all(Parent.Table[Page] is Child.Table[Page] is Base[Page] for Page in range(256))
+    assert bytes(Child) == Image
+    assert Parent.footprint() == Child.footprint()
+
+
+def test_write(Image):
+    Base = pages(Image)
+    Parent, Child = pagedmemory(Base), pagedmemory(Base)
+    Child[0x1234] = 0xAB
+    Child[0x4000] = 0x01
+    assert Child[0x1234] == 0xAB and Child[0x4000] == 0x01
+    assert Parent[0x1234] == Image[0x1234] and Parent[0x4000] == 0
+    assert bytes(Parent) == Image == b"".join(Base)
+    # just the written pages were copied
+    assert Child.Dirty == {0x12, 0x40}
+    assert all(Child.Table[Page] is Base[Page] for Page in range(256) if Page not in (0x12, 0x40))
+    assert Child.Table[0x41] is Base[0x41] and Base[0x41] == bytes(PAGE)
+    Child.reset()
+    assert bytes(Child) == Image and not Child.Dirty
+
+
+@pytest.mark.parametrize("Address", (0x00FF, 0x0100, 0x12FF, 0x1300, 0xFF00, 0xFFFF))
+def test_boundaries(Image, Address):
+    Paged = pagedmemory(pages(Image))
+    Reference = memory("bytearray")
+    Reference.load(Image)
+    for Store in (Paged, Reference):
+        # the second store goes into the now private page, values wrap
+        Store[Address] = 0x1FE
+        Store[Address] = 0x1FF
+    assert Paged[Address] == Reference[Address] == 0xFF
+    # addresses wrap as well
+    assert Paged[Address + SIZE] == 0xFF
+    Paged[Address + SIZE] = 0x42
+    Reference[Address] = 0x42
+    assert bytes(Paged) == bytes(Reference)
+    # slices across the page boundary, up to the end of memory
+    Start = max(Address - 2, 0)
+    Stop = min(Address + 3, SIZE)
+    assert Paged[Start:Stop] == bytes(Reference[Start:Stop])
+    Paged[Start:Stop] = bytes(range(Stop - Start))
+    Reference[Start:Stop] = bytes(range(Stop - Start))
+    assert bytes(Paged) == bytes(Reference)
+    assert Paged[SIZE - 3 :] == bytes(Reference)[SIZE - 3 :]
+
+
+def test_restore(Image):
+    Base = pages(Image)
+    Paged = pagedmemory(Base)
+    Paged.load(bytes(PAGE * 2), 0x2000)
+    assert Paged.Dirty == {0x20, 0x21}
+    # a whole page written back with its base content is shared again
+    Paged[0x2000:0x2100] = Base[0x20]
+    assert Paged.Dirty == {0x21} and Paged.Table[0x20] is Base[0x20]
+    with pytest.raises(ValueError):
+        Paged.load(bytes(2), 0xFFFF)
+
+
+def test_fleet():
+    # LDX #0, loop: INX, STX $1234, BNE loop; each machine runs a different
+    # number of iterations
+    Image = bytearray(SIZE)
+    Image[0x0800:0x0808] = bytes([0xA2, 0x00, 0xE8, 0x8E, 0x34, 0x12, 0xD0, 0xFA])
+    Image[0xFFFC], Image[0xFFFD] = 0x00, 0x08
+    Base = pages(Image)
+    Fleet = [cpu6502table(pagedmemory(Base)) for _ in range(3)]
+    for i, Cpu in enumerate(Fleet):
+        Cpu.SpinDetection = False
+        Cpu.run(MaxInstructions=1 + 3 * (i + 1))
+    assert [Cpu.Bus.Memory[0x1234] for Cpu in Fleet] == [1, 2, 3]
+    assert [Cpu.Bus.Memory.Dirty for Cpu in Fleet] == [{0x12}] * 3
+    assert b"".join(Base) == Image
@@ -0,0 +1,57 @@
+"""
+Names in the profiler and call graph reports with only the segments of a
+linker.cfg known, see symbols.describe().
+"""
+import os
+
+import pytest
+
+from conftest import ROOT
+from difftest import machine
+from profiler import profiler
+from symbols import describe, symbols
+
+
+@pytest.fixture(scope="module")
+def Symbols():
+    return symbols(os.path.join(ROOT, "example3", "linker.cfg"))
+
+
+@pytest.fixture(scope="module")
+def Cpu():
+    with open(os.path.join(ROOT, "example3", "main.bin"), "rb") as f:
+        return machine("table", f.read())
+
+
+def test_describe(Symbols):
+    assert describe(None, 0x8100) == "$8100"
+    assert Symbols.name(0x8100) == "[CODE]"
+    assert describe(Symbols, 0x8100) == "$8100 [CODE]"
+
+
+def test_profiler(Symbols, Cpu):
+    Profiler = profiler(Cpu, Every=997)
+    Profiler.run(MaxInstructions=300000)
+    Hotspots = dict(Profiler.hotspots(Symbols))
+    assert "[CODE]" not in Hotspots
+    assert len(Hotspots) > 1
+    assert sum(Hotspots.values()) == Profiler.Samples
+    # code without a label is named after the function it was called at
+    M = Cpu.Memory
+    for Stack in Profiler.Stacks:
+        Frames = Profiler._frames(Stack, Symbols)
+        assert Frames[0] == "root"
+        for Call, Frame in zip(Stack, Frames[1:]):
+            assert Frame == describe(Symbols, M[Call + 1] | M[Call + 2] << 8)
+
+
+def test_calls(Symbols, tmp_path):
+    with open(os.path.join(ROOT, "example3", "main.bin"), "rb") as f:
+        Cpu = machine("table", f.read())
+    Calls = Cpu.enableCalls()
+    Cpu.run(MaxInstructions=300000)
+    Path = tmp_path / "calls.txt"
+    Calls.collapsed(str(Path), Symbols)
+    Frames = {Frame for Line in Path.read_text().splitlines() for Frame in Line.rsplit(" ", 1)[0].split(";")}
+    assert "[CODE]" not in Frames
+    assert {describe(Symbols, Callee) for Callee in Calls.Calls} <= Frames
@@ -0,0 +1,80 @@
+"""
+Save states taken mid-run and resumed on a fresh CPU, see snapshot.py.
+"""
+import io
+
+import pytest
+
+import snapshot
+from bus import bus
+from conftest import program
+from cpu6502aot import cpu6502aot
+from engines import ENGINES, create
+from memory import memory
+from printer import printer
+
+# CLI, then forever INC $10 and print "@" + ($10 & $3F); the NMI handler
+# increments $11, the IRQ handler $12
+CODE = {
+    0x1000: [0x58, 0xE6, 0x10, 0xA5, 0x10, 0x29, 0x3F, 0x09, 0x40, 0x85, 0xFF, 0xA9, 0x01, 0x85, 0xFE, 0x4C, 0x01, 0x10],
+    0x2000: [0xE6, 0x11, 0x40],
+    0x3000: [0xE6, 0x12, 0x40],
+    0xFFFA: [0x00, 0x20],
+    0xFFFE: [0x00, 0x30],
+}
+
+
+def machine(Engine: str, Backend: str, Cache: str):
+    """
+    A CPU of an engine on a memory backend with a printer writing into a
+    string, in the reset state of the program.
+    """
+    Memory = memory(Backend)
+    Memory.load(program(CODE, 0x1000))
+    Bus = bus(Memory)
+    printer(Bus, Output=io.StringIO())
+    return cpu6502aot(Bus, CacheDirectory=Cache) if Engine == "aot" else create(Engine, Bus)
+
+
+def observed(Cpu) -> dict:
+    """
+    Everything a resumed run has to reproduce.
+    """
+    Printer = Cpu.Bus.Devices[0]
+    return {
+        "Registers": {Name: getattr(Cpu, Name) for Name in ("PC", "A", "X", "Y", "SP", "P")},
+        "Pending": (Cpu.IRQPending, Cpu.NMIPending),
+        "Memory": bytes(Cpu.Bus.Memory),
+        "Printer": Printer.snapshot(),
+    }
+
+
+@pytest.mark.parametrize("Backend", ("list", "bytearray"))
+@pytest.mark.parametrize("Engine", ENGINES)
+def test_resume(Engine, Backend, tmp_path):
+    Cache = str(tmp_path)
+    Path = str(tmp_path / "state.snap")
+    Cpu = machine(Engine, Backend, Cache)
+    n, c = Cpu.run(MaxInstructions=1000)
+    # requested right before the snapshot, taken by the next run()
+    Cpu.irq()
+    Cpu.nmi()
+    snapshot.save(Path, Cpu, n, c)
+    Saved = observed(Cpu)
+    Cycles = Cpu.Cycles
+    Text = Cpu.Bus.Devices[0].Output.getvalue()
+    # the run totals are compared, the block engines don't keep Cycles
+    Uninterrupted = Cpu.run(MaxInstructions=1000)
+
+    Resumed = machine(Engine, Backend, Cache)
+    Resumed.Bus.Memory[0:0x10000] = bytes(0x10000)
+    State = snapshot.resume(Path, Resumed)
+    assert (State["Instructions"], State["Clock"]) == (n, c)
+    assert observed(Resumed) == Saved
+    assert Resumed.Cycles == Cycles
+    assert Resumed.run(MaxInstructions=1000) == Uninterrupted
+    assert observed(Resumed) == observed(Cpu)
+    # both interrupt handlers ran once
+    assert Resumed.Bus.Memory[0x11] == Resumed.Bus.Memory[0x12] == 1
+    Output = Resumed.Bus.Devices[0].Output.getvalue()
+    assert Output and Cpu.Bus.Devices[0].Output.getvalue() == Text + Output
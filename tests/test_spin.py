@@ -0,0 +1,61 @@
+"""
+Spin loop detection in cpu6502.run(), see cpu6502._spin().
+"""
+import pytest
+
+from conftest import program
+from difftest import machine
+
+ENGINES = ("step", "table", "jit", "aot")
+# JSR $1010, JMP $1000 and at $1010 INC $20, RTS: no spin loop, the probe
+# steps one iteration and misses
+CALLING = {0x1000: [0x20, 0x10, 0x10, 0x4C, 0x00, 0x10], 0x1010: [0xE6, 0x20, 0x60]}
+# LDA $20, BEQ to itself, spins from the start with A 0 and Z set
+SPINNING = {0x1000: [0xA5, 0x20, 0xF0, 0xFC]}
+
+
+def spinning(Engine: str, Code: dict, cache: str):
+    Cpu = machine(Engine, program(Code, 0x1000), {"PC": 0x1000, "A": 0, "P": 0x22}, cache)
+    Cpu.SpinDetection = True
+    return Cpu
+
+
+@pytest.fixture(scope="module")
+def cache(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("aot"))
+
+
+@pytest.mark.parametrize("Engine", ENGINES)
+def test_calls(Engine, cache):
+    Cpu = spinning(Engine, CALLING, cache)
+    Calls = Cpu.enableCalls()
+    n = 0
+    while n < 20000:
+        n += Cpu.run(MaxInstructions=20000 - n)[0]
+    assert Calls.Calls[0x1010] == 5000
+    assert Cpu.Memory[0x20] == 5000 & 0xFF
+
+
+@pytest.mark.parametrize("Engine", ENGINES)
+def test_stats(Engine, cache):
+    Cpu = spinning(Engine, CALLING, cache)
+    Stats = Cpu.enableStats()
+    n = 0
+    while n < 20000:
+        n += Cpu.run(MaxInstructions=20000 - n)[0]
+    Summary = Stats.summary()
+    assert Summary["Instructions"] == Summary["Executed"] == 20000
+    assert Summary["Cycles"] == Summary["ExecutedCycles"] == 5000 * (6 + 5 + 6 + 3)
+
+
+@pytest.mark.parametrize("Engine", ENGINES)
+def test_skipped(Engine, cache):
+    Cpu = spinning(Engine, SPINNING, cache)
+    Stats = Cpu.enableStats()
+    assert Cpu.run(MaxInstructions=1000) == (1000, 500 * (3 + 3))
+    assert Cpu.Spin is not None
+    Summary = Stats.summary()
+    # only the probed iteration was executed
+    assert Summary["Instructions"] == 1000
+    assert Summary["Executed"] == 2
+    assert Cpu.SpinCycles == Summary["Cycles"] - Summary["ExecutedCycles"]